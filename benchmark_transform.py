@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+KG-Oversight - Banc de performance de transform_to_kuzu.py
+Génère des exports synthétiques (nodes.csv, relations.csv, kqi.csv) à
+l'échelle voulue puis mesure chaque étape : débit et pic mémoire, en JSON
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import transform_to_kuzu as transform
+
+SAMPLE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Type de relation brut de l'export pour chaque table routée par process_relations()
+RAW_REL_TYPES = {
+    'QE_CONCERNE_ST': 'CONCERNE_ST',
+    'EVT_CONCERNE_ST': 'CONCERNE_ST',
+    'SURVENU_DANS_ETUDE': 'SURVENU_DANS',
+    'INSPECTION_GENERE_FINDING': 'GENERE_FINDING',
+    'QE_DECLENCHE_ALERTE': 'DECLENCHE_ALERTE',
+    'AUDIT_DECLENCHE_ALERTE': 'DECLENCHE_ALERTE',
+    'QA_A_VERSION_SUIVANTE': 'A_VERSION_SUIVANTE',
+    'DECISION_JUSTIFIEE_PAR_AUDIT': 'EST_JUSTIFIE_PAR',
+    'DECISION_JUSTIFIEE_PAR_QE': 'EST_JUSTIFIE_PAR',
+    'DECISION_JUSTIFIEE_PAR_INSPECTION': 'EST_JUSTIFIE_PAR',
+    'DECISION_JUSTIFIEE_PAR_FINDING': 'EST_JUSTIFIE_PAR',
+}
+
+# Étapes de run_all(), dans son ordre, et entrée dont les lignes donnent le débit
+STAGES = [
+    ('find_versions', 'relations'),
+    ('process_nodes', 'nodes'),
+    ('process_relations', 'relations'),
+    ('process_kqi', 'kqi'),
+    ('write_exposure', 'relations'),
+]
+
+def parse_scale(text):
+    """'10k', '2.5M' ou '10000' -> nombre de lignes"""
+    text = text.strip().lower()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * factor)
+
+def read_sample(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def column_pools(rows):
+    """Valeurs observées par colonne dans l'échantillon"""
+    pools = {}
+    for row in rows:
+        for column, value in row.items():
+            pools.setdefault(column, []).append(value)
+    return pools
+
+class SampleProfile:
+    """Distribution des types et valeurs observées dans nodes/ et relations/ du dépôt"""
+
+    def __init__(self, sample_dir=SAMPLE_DIR):
+        schema = transform.load_schema()
+        self.tables = {table: node_type for node_type, (table, _) in transform.NODE_SPECS.items()}
+
+        self.node_weights = {}
+        self.node_pools = {}
+        # id de l'échantillon -> table : repère les attributs qui référencent un nœud
+        self.sample_ids = {}
+        for table in self.tables:
+            rows = read_sample(os.path.join(sample_dir, 'nodes', f'{table}.csv'))
+            self.node_weights[table] = len(rows)
+            self.node_pools[table] = column_pools(rows)
+            self.sample_ids.update((row['id'], table) for row in rows)
+
+        self.rel_weights = {}
+        self.rel_pools = {}
+        self.rel_endpoints = {}
+        for name, entry in schema.items():
+            path = os.path.join(sample_dir, 'relations', f'{name}.csv')
+            if entry['kind'] != 'rel' or entry['from'] not in self.tables or not os.path.exists(path):
+                continue
+            rows = read_sample(path)
+            self.rel_weights[name] = len(rows)
+            self.rel_pools[name] = column_pools(rows)
+            self.rel_endpoints[name] = (entry['from'], entry['to'])
+
+        self.kqi_pools = column_pools(read_sample(os.path.join(sample_dir, 'nodes', 'KQI.csv')))
+        nodes = sum(self.node_weights.values())
+        self.rel_ratio = sum(self.rel_weights.values()) / nodes
+        self.kqi_ratio = len(self.kqi_pools['id']) / nodes
+
+    def draw(self, pool, node_counts, rng):
+        """Valeur tirée d'une colonne de l'échantillon ; un id de l'échantillon (via,
+        st_concerne, declencheur...) devient un id généré de la même table"""
+        value = rng.choice(pool)
+        table = self.sample_ids.get(value)
+        if table is None:
+            return value
+        return node_id(table, rng.randrange(node_counts[table]))
+
+def node_id(table, index):
+    return f'{table.upper()}-{index:09d}'
+
+def split_counts(total, weights):
+    """Répartit total proportionnellement aux poids (au moins 1 par type)"""
+    scale = sum(weights.values())
+    return {name: max(1, round(total * weight / scale)) for name, weight in weights.items()}
+
+def json_value(value, kuzu_type):
+    """Valeur d'attribut telle que l'export l'écrirait dans Attributs_JSON"""
+    if value == '':
+        return None
+    if kuzu_type and kuzu_type.startswith('INT'):
+        return int(value)
+    if kuzu_type == 'BOOLEAN':
+        return value == 'true'
+    if kuzu_type == 'STRING[]':
+        return json.loads(value)
+    return value
+
+def generate_nodes(path, profile, counts, rng, schema):
+    sources = {'ID_Noeud', 'Nom_Description', 'Statut', 'Source_Donnees'}
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Type_Noeud', 'ID_Noeud', 'Nom_Description', 'Statut', 'Criticite',
+                         'Date_Creation', 'Date_Fin', 'Source_Donnees', 'Attributs_JSON'])
+        for table, count in counts.items():
+            node_type = profile.tables[table]
+            columns = transform.NODE_SPECS[node_type][1]
+            types = dict(schema[table]['columns'])
+            pools = profile.node_pools[table]
+            for index in range(count):
+                raw = {'Criticite': '-', 'Date_Creation': '', 'Date_Fin': ''}
+                attrs = {}
+                for column, source in columns:
+                    value = profile.draw(pools[column], counts, rng)
+                    kind = source[0]
+                    if kind == 'col' and source[1] in sources:
+                        raw[source[1]] = value
+                    elif kind in ('date', 'criticite'):
+                        raw[source[1]] = value or raw[source[1]]
+                    else:
+                        key = source[1][0] if kind == 'attr' else source[1]
+                        target = attrs.setdefault(source[-1], {}) if source[-1] else attrs
+                        value = json_value(value, 'BOOLEAN' if kind == 'flag' else types.get(column))
+                        if value is not None:
+                            target[key] = value
+                raw['ID_Noeud'] = node_id(table, index)
+                writer.writerow([node_type, raw['ID_Noeud'], raw['Nom_Description'], raw['Statut'],
+                                 raw['Criticite'], raw['Date_Creation'], raw['Date_Fin'],
+                                 raw['Source_Donnees'], json.dumps(attrs, ensure_ascii=False)])
+
+def generate_relations(path, profile, total, node_counts, rng, schema):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Type_Relation', 'Type_Noeud_Source', 'Type_Noeud_Cible', 'Noeud_Source',
+                         'Noeud_Cible', 'Date_Lien', 'Validite', 'Attributs'])
+        for name, count in split_counts(total, profile.rel_weights).items():
+            source, target = profile.rel_endpoints[name]
+            pools = profile.rel_pools[name]
+            types = dict(schema[name]['columns'])
+            extra = [column for column in pools if column not in ('from', 'to', 'date_lien', 'validite')]
+            for _ in range(count):
+                attrs = {}
+                for column in extra:
+                    value = json_value(profile.draw(pools[column], node_counts, rng), types.get(column))
+                    if value is not None:
+                        attrs[column] = value
+                writer.writerow([
+                    RAW_REL_TYPES.get(name, name), profile.tables[source], profile.tables[target],
+                    node_id(source, rng.randrange(node_counts[source])),
+                    node_id(target, rng.randrange(node_counts[target])),
+                    rng.choice(pools['date_lien']),
+                    rng.choice(pools['validite']) if 'validite' in pools else 'Active',
+                    json.dumps(attrs, ensure_ascii=False) if attrs else '{}',
+                ])
+
+def generate_kqi(path, profile, total, st_count, rng):
+    pools = profile.kqi_pools
+    indicators = sorted(set(pools['indicateur']))
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ID_KQI', 'ID_SousTraitant', 'Nom_SousTraitant', 'Indicateur', 'Periode',
+                         'Valeur', 'Seuil_Alerte', 'Seuil_Objectif', 'Statut', 'Tendance'])
+        for index in range(total):
+            # Séries trimestrielles par (sous-traitant, indicateur)
+            series, quarter = divmod(index, 12)
+            writer.writerow([
+                f'KQI-{index:09d}', node_id('SousTraitant', series % st_count),
+                rng.choice(pools['sous_traitant_nom']), indicators[series % len(indicators)],
+                f'{2022 + quarter // 4}-Q{quarter % 4 + 1}', rng.choice(pools['valeur']),
+                rng.choice(pools['seuil_alerte']), rng.choice(pools['seuil_objectif']),
+                rng.choice(pools['statut']), rng.choice(pools['tendance']),
+            ])
+
+def generate_dataset(directory, rows, seed=0, profile=None):
+    """Écrit nodes.csv (rows lignes), relations.csv et kqi.csv dans directory"""
+    profile = profile or SampleProfile()
+    schema = transform.load_schema()
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    node_counts = split_counts(rows, profile.node_weights)
+    paths = {kind: os.path.join(directory, f'{kind}.csv') for kind in ('nodes', 'relations', 'kqi')}
+    generate_nodes(paths['nodes'], profile, node_counts, rng, schema)
+    generate_relations(paths['relations'], profile, round(rows * profile.rel_ratio), node_counts, rng, schema)
+    generate_kqi(paths['kqi'], profile, round(rows * profile.kqi_ratio), node_counts['SousTraitant'], rng)
+    return paths
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Octets sous macOS, kilo-octets sous Linux
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def count_rows(path):
+    with open(path, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+def run_stages(inputs, output_dir):
+    """Exécuté dans un processus neuf : enchaîne les étapes de run_all() et mesure chacune.
+
+    Index des nœuds, chaînes de versions et de sous-traitance sont actifs
+    comme dans une exécution réelle. peak_rss_mb est le pic du processus à
+    la fin de l'étape (étapes précédentes et état qu'elles ont laissé compris).
+    """
+    transform.INPUT_NODES = inputs['nodes']
+    transform.INPUT_RELATIONS = inputs['relations']
+    transform.INPUT_KQI = inputs['kqi']
+    transform.OUTPUT_DIR = output_dir
+    os.makedirs(os.path.join(output_dir, 'nodes'), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, 'relations'), exist_ok=True)
+    quarantine_dir = os.path.join(output_dir, 'quarantine')
+    transform.NODE_INDEX = transform.NodeIndex(transform.load_schema())
+    transform.CHAINS = transform.SubcontractingChains()
+    calls = {
+        'find_versions': lambda: transform.find_versions(transform.INPUT_RELATIONS),
+        'process_nodes': transform.process_nodes,
+        'process_relations': transform.process_relations,
+        'process_kqi': transform.process_kqi,
+        'write_exposure': lambda: transform.write_exposure(
+            transform.TypeWriters(os.path.join(output_dir, 'relations')), quarantine_dir),
+    }
+
+    sys.stdout = open(os.devnull, 'w')
+    measures = {}
+    for stage, _ in STAGES:
+        wall, cpu = time.perf_counter(), time.process_time()
+        calls[stage]()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        measures[stage] = {'seconds': wall, 'cpu_seconds': cpu, 'peak_rss_mb': peak_rss_mb()}
+    return measures
+
+def benchmark(rows, work_dir, seed=0, profile=None):
+    inputs = generate_dataset(os.path.join(work_dir, 'input'), rows, seed, profile)
+    result = {
+        'rows': rows,
+        'inputs': {kind: {'rows': count_rows(path), 'bytes': os.path.getsize(path)}
+                   for kind, path in inputs.items()},
+        'stages': {},
+    }
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        measures = pool.apply(run_stages, (inputs, os.path.join(work_dir, 'output')))
+    for stage, kind in STAGES:
+        measure = measures[stage]
+        measure['rows'] = result['inputs'][kind]['rows']
+        measure['rows_per_s'] = measure['rows'] / measure['seconds'] if measure['seconds'] else None
+        result['stages'][stage] = measure
+    return result
+
+def compare(current, previous, tolerance):
+    """Liste les étapes dont le débit a baissé de plus de tolerance par rapport à previous"""
+    regressions = []
+    baseline = {run['rows']: run for run in previous['runs']}
+    for run in current['runs']:
+        before = baseline.get(run['rows'])
+        if before is None:
+            continue
+        for stage, measure in run['stages'].items():
+            old = before['stages'].get(stage, {}).get('rows_per_s')
+            new = measure['rows_per_s']
+            if old and new and new < old * (1 - tolerance):
+                regressions.append({'rows': run['rows'], 'stage': stage,
+                                    'rows_per_s': new, 'previous_rows_per_s': old})
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="KG-Oversight - Banc de performance de la transformation")
+    parser.add_argument('--scales', default='10k,100k,1M',
+                        help="tailles de nodes.csv à mesurer, séparées par des virgules (ex. 10k,1M,10M)")
+    parser.add_argument('--seed', type=int, default=0, help="graine du générateur")
+    parser.add_argument('--work-dir', help="répertoire des données générées (temporaire par défaut)")
+    parser.add_argument('--output', help="fichier JSON des résultats (sortie standard par défaut)")
+    parser.add_argument('--compare', metavar='JSON', help="résultats précédents à comparer")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="baisse de débit tolérée avant de signaler une régression (0.2 = 20 %%)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    profile = SampleProfile()
+
+    with tempfile.TemporaryDirectory(prefix='kg-bench-') as tmp:
+        work_dir = args.work_dir or tmp
+        runs = []
+        for scale in args.scales.split(','):
+            rows = parse_scale(scale)
+            print(f"⏱  {rows} nœuds...", file=sys.stderr)
+            runs.append(benchmark(rows, os.path.join(work_dir, str(rows)), args.seed, profile))
+
+    report = {
+        'script': 'transform_to_kuzu.py',
+        'version': transform.file_digest(transform.__file__)[:12],
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'runs': runs,
+    }
+
+    status = 0
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance)
+        status = 1 if report['regressions'] else 0
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+KG-Oversight - Inférence des alertes hors application
+Évalue les règles RGL-001 à RGL-007 (ruleEngine.ts) sur le graphe produit par
+transform_to_kuzu.py et écrit les alertes et leurs relations de déclenchement
+"""
+
+import argparse
+import csv
+import functools
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from datetime import date
+
+import transform_to_kuzu as transform
+
+# Sous-dossier de sortie, à côté de nodes/ et relations/
+INFERENCE_DIR = 'inference'
+
+# RGL-003 : délai maximal d'un finding critique ouvert, en jours
+FINDING_DELAY_DAYS = 30
+
+# Niveau d'alerte -> criticité (valeurs des alertes existantes)
+CRITICITE_BY_LEVEL = {'HAUTE': 'Critique', 'MOYENNE': 'Majeur', 'BASSE': 'Mineur'}
+
+# Relation de déclenchement par type d'élément déclencheur
+TRIGGER_RELATIONS = {
+    'Audit': 'AUDIT_DECLENCHE_ALERTE',
+    'EvenementQualite': 'QE_DECLENCHE_ALERTE',
+}
+
+# Normalisation des KQI, reprise de kqiNormalization.ts
+KQI_STATUTS = {
+    'ok': 'OK', 'attention': 'Attention', 'alerte': 'Alerte', 'critique': 'Critique',
+    'conforme': 'OK', 'à surveiller': 'Attention', 'a surveiller': 'Attention',
+    'warning': 'Attention', 'alert': 'Alerte', 'critical': 'Critique', 'good': 'OK',
+    'satisfaisant': 'OK', 'non satisfaisant': 'Critique',
+}
+
+def normalize_kqi_statut(statut):
+    if not statut:
+        return 'OK'
+    normalized = statut.lower().strip()
+    if normalized in KQI_STATUTS:
+        return KQI_STATUTS[normalized]
+    if 'critique' in normalized or 'critical' in normalized:
+        return 'Critique'
+    if 'alerte' in normalized or 'alert' in normalized:
+        return 'Alerte'
+    if 'attention' in normalized or 'warning' in normalized or 'surveiller' in normalized:
+        return 'Attention'
+    return 'OK'
+
+def is_degrading(tendance):
+    """Vrai si la tendance se normalise en 'Dégradation'"""
+    normalized = (tendance or '').lower().strip()
+    if '↑' in normalized:
+        return False
+    if '↓' in normalized:
+        return True
+    if '→' in normalized or '−' in normalized or '-' in normalized:
+        return False
+    return 'dégradation' in normalized or 'degradation' in normalized or 'declin' in normalized
+
+def read_table(directory, name):
+    """Lignes d'un fichier directory/name.csv (aucune si absent)"""
+    path = os.path.join(directory, f'{name}.csv')
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+def _text(value):
+    """Valeur Parquet en texte, comme dans les CSV produits"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, list):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+@functools.lru_cache(maxsize=None)
+def read_mapping(path):
+    """{code: valeur} d'une table de correspondance encodage/ (vide si absente)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return {code: value for code, value in reader}
+
+class OutputTables:
+    """Tables produites par transform_to_kuzu.py, en CSV ou en Parquet, encodées ou non.
+
+    Le format et l'encodage sont ceux de import.kuzu, qui décrit la dernière
+    transformation ; les clés entières et les codes de --encode sont décodés
+    avec encodage/. Chaque ligne est un dictionnaire de textes, comme en CSV.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        script = os.path.join(data_dir, 'import.kuzu')
+        if not os.path.exists(script):
+            raise SystemExit(f"❌ {script} absent : exécuter transform_to_kuzu.py avant l'inférence")
+        with open(script, 'r', encoding='utf-8') as f:
+            text = f.read()
+        self.suffix = '.parquet' if re.search(r'FROM "[^"]+\.parquet"', text) else '.csv'
+        self.encoded = 'schema_encoded.kuzu' in text
+        self.schema = transform.load_schema()
+        for name in ('SousTraitant',):
+            if not os.path.exists(os.path.join(data_dir, 'nodes', f'{name}{self.suffix}')):
+                raise SystemExit(f"❌ nodes/{name}{self.suffix} absent de {data_dir} (format annoncé par import.kuzu)")
+
+    def decoders(self, name, columns):
+        """{colonne: {code: valeur}} des colonnes encodées d'une table"""
+        entry = self.schema.get(name)
+        if not self.encoded or entry is None:
+            return {}
+        encoding = os.path.join(self.data_dir, transform.ENCODING_DIR)
+        types = dict(entry['columns'])
+        decoders = {}
+        for column in columns:
+            if column == 'id' and entry['kind'] == 'node':
+                table = name
+            elif column in ('from', 'to') and entry['kind'] == 'rel':
+                table = entry[column]
+            else:
+                table = transform.REFERENCE_COLUMNS.get((name, column))
+            if table is not None:
+                decoders[column] = read_mapping(os.path.join(encoding, 'identifiants', f'{table}.csv'))
+            elif column in transform.DICTIONARY_COLUMNS and types.get(column) == 'STRING':
+                decoders[column] = read_mapping(os.path.join(encoding, 'dictionnaires', f'{column}.csv'))
+        return decoders
+
+    def rows(self, subdir, name):
+        """Lignes brutes d'une table, en dictionnaires de textes (aucune si absente)"""
+        if self.suffix == '.csv':
+            yield from read_table(os.path.join(self.data_dir, subdir), name)
+            return
+        path = os.path.join(self.data_dir, subdir, f'{name}.parquet')
+        if not os.path.exists(path):
+            return
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit(f"La lecture de {path} nécessite le paquet pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches():
+            for row in batch.to_pylist():
+                yield {column: _text(value) for column, value in row.items()}
+
+    def read(self, subdir, name):
+        """Lignes décodées d'une table de nodes/ ou relations/"""
+        decoders = None
+        for row in self.rows(subdir, name):
+            if decoders is None:
+                decoders = self.decoders(name, list(row))
+            for column, mapping in decoders.items():
+                row[column] = mapping.get(row[column], row[column])
+            yield row
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value[:10]) if value else None
+    except ValueError:
+        return None
+
+class Graph:
+    """Index du graphe transformé, clés par sous-traitant, construits en une lecture"""
+
+    def __init__(self, data_dir):
+        tables = OutputTables(data_dir)
+
+        self.sous_traitants = {row['id']: row['nom'] for row in tables.read('nodes', 'SousTraitant')}
+        self.audits = {row['id']: row for row in tables.read('nodes', 'Audit')}
+        self.findings = {row['id']: row for row in tables.read('nodes', 'Finding')}
+        self.qes = {row['id']: row for row in tables.read('nodes', 'EvenementQualite')}
+
+        self.audits_by_st = self.adjacency(tables.read('relations', 'A_ETE_AUDITE_PAR'), 'from', 'to')
+        self.findings_by_audit = self.adjacency(tables.read('relations', 'GENERE_FINDING'), 'from', 'to')
+        self.qes_by_st = self.adjacency(tables.read('relations', 'QE_CONCERNE_ST'), 'to', 'from')
+
+        # KQI le plus récent par (sous-traitant, indicateur), dans l'ordre d'apparition
+        self.latest_kqis = {}
+        for row in tables.read('nodes', 'KQI'):
+            by_indicator = self.latest_kqis.setdefault(row['sous_traitant_id'], {})
+            existing = by_indicator.get(row['indicateur'])
+            if existing is None or row['periode'] > existing['periode']:
+                by_indicator[row['indicateur']] = row
+
+    @staticmethod
+    def adjacency(rows, key, value):
+        index = {}
+        for row in rows:
+            index.setdefault(row[key], []).append(row[value])
+        return index
+
+    def st_audits(self, st_id):
+        return [self.audits[a] for a in self.audits_by_st.get(st_id, ()) if a in self.audits]
+
+    def st_findings(self, st_id):
+        """Findings générés par les audits du sous-traitant (un par relation)"""
+        return [self.findings[f]
+                for audit_id in self.audits_by_st.get(st_id, ())
+                for f in self.findings_by_audit.get(audit_id, ()) if f in self.findings]
+
+# ============================================================================
+# RÈGLES (mêmes identifiants, conditions et niveaux que ruleDefinitions.ts)
+# ============================================================================
+
+def alert(rule_id, description, level, st_id, trigger_id, trigger_type, created):
+    return {
+        'id': f'{rule_id}-{trigger_id}',
+        'description': description,
+        'niveau': level,
+        'regle_id': rule_id,
+        'st_concerne': st_id,
+        'declencheur': trigger_id,
+        'declencheur_type': trigger_type,
+        'date_creation': created,
+    }
+
+def rule_audit_for_cause(graph, st_id, st_name, today):
+    for audit in graph.st_audits(st_id):
+        if audit['type_audit'] == 'For Cause':
+            yield alert('RGL-001', f'Audit For Cause "{audit["nom"]}" déclenché pour {st_name}', 'HAUTE',
+                        st_id, audit['id'], 'Audit', parse_date(audit['date_debut']) or today)
+
+def rule_audit_non_satisfaisant(graph, st_id, st_name, today):
+    for audit in graph.st_audits(st_id):
+        if audit['resultat'] == 'Non satisfaisant':
+            yield alert('RGL-002', f'Audit "{audit["nom"]}" avec résultat non satisfaisant', 'HAUTE',
+                        st_id, audit['id'], 'Audit', parse_date(audit['date_fin']) or today)
+
+def rule_finding_critique_ouvert(graph, st_id, st_name, today):
+    for finding in graph.st_findings(st_id):
+        if finding['criticite'] != 'Critique' or finding['statut'] == 'Clôturé':
+            continue
+        detected = parse_date(finding['date_detection'])
+        if detected is not None and (today - detected).days > FINDING_DELAY_DAYS:
+            yield alert('RGL-003', f'Finding critique ouvert depuis {(today - detected).days} jours', 'HAUTE',
+                        st_id, finding['id'], 'Finding', detected)
+
+def rule_findings_multiples(graph, st_id, st_name, today):
+    count = sum(1 for finding in graph.st_findings(st_id) if finding['statut'] != 'Clôturé')
+    if count > 3:
+        yield alert('RGL-004', f'{count} findings ouverts pour {st_name}', 'HAUTE' if count > 5 else 'MOYENNE',
+                    st_id, st_id, 'SousTraitant', today)
+
+def rule_kqi_degradation(graph, st_id, st_name, today):
+    count = sum(1 for kqi in graph.latest_kqis.get(st_id, {}).values() if is_degrading(kqi['tendance']))
+    if count >= 2:
+        yield alert('RGL-005', f'{count} indicateurs en dégradation pour {st_name}',
+                    'HAUTE' if count >= 3 else 'MOYENNE', st_id, st_id, 'SousTraitant', today)
+
+def rule_kqi_alerte(graph, st_id, st_name, today):
+    for kqi in graph.latest_kqis.get(st_id, {}).values():
+        statut = normalize_kqi_statut(kqi['statut'])
+        if statut in ('Alerte', 'Critique'):
+            yield alert('RGL-006', f'KQI "{kqi["indicateur"]}" en {statut} (valeur: {kqi["valeur"]})',
+                        'HAUTE' if statut == 'Critique' else 'MOYENNE', st_id, kqi['id'], 'KQI', today)
+
+def rule_qe_critique(graph, st_id, st_name, today):
+    for qe_id in graph.qes_by_st.get(st_id, ()):
+        qe = graph.qes.get(qe_id)
+        if qe and qe['criticite'] == 'Critique' and qe['statut'] != 'Clôturé':
+            yield alert('RGL-007', f'Événement qualité critique: {qe["description"][:50]}...', 'HAUTE',
+                        st_id, qe['id'], 'EvenementQualite', parse_date(qe['date_creation']) or today)
+
+RULES = [
+    rule_audit_for_cause,
+    rule_audit_non_satisfaisant,
+    rule_finding_critique_ouvert,
+    rule_findings_multiples,
+    rule_kqi_degradation,
+    rule_kqi_alerte,
+    rule_qe_critique,
+]
+
+def evaluate(graph, today):
+    """Évalue toutes les règles pour tous les sous-traitants ; dédoublonnage par id"""
+    alerts = {}
+    for st_id, st_name in graph.sous_traitants.items():
+        for rule in RULES:
+            for result in rule(graph, st_id, st_name, today):
+                alerts[result['id']] = result
+    return list(alerts.values())
+
+# ============================================================================
+# SORTIE
+# ============================================================================
+
+def write_outputs(alerts, data_dir, schema):
+    """Écrit inference/nodes/Alerte.csv, les relations de déclenchement et import_alertes.kuzu"""
+    base = os.path.join(data_dir, INFERENCE_DIR)
+    shutil.rmtree(base, ignore_errors=True)
+    nodes_out = transform.TypeWriters(os.path.join(base, 'nodes'))
+    relations_out = transform.TypeWriters(os.path.join(base, 'relations'))
+    alert_columns = [name for name, _ in schema['Alerte']['columns']]
+
+    for result in alerts:
+        created = result['date_creation'].isoformat()
+        record = {
+            'id': result['id'],
+            'description': result['description'],
+            'statut': 'Active',
+            'criticite': CRITICITE_BY_LEVEL[result['niveau']],
+            'date_creation': created,
+            'niveau': result['niveau'],
+            'regle_id': result['regle_id'],
+            'declencheur': result['declencheur'],
+            'st_concerne': result['st_concerne'],
+            'source_donnees': 'Moteur Inférence',
+        }
+        nodes_out.write_row('Alerte', alert_columns, [record.get(c, '') for c in alert_columns])
+
+        rel = TRIGGER_RELATIONS.get(result['declencheur_type'])
+        if rel is not None:
+            columns = transform.table_columns(schema[rel])
+            edge = {'from': result['declencheur'], 'to': result['id'], 'date_lien': created}
+            relations_out.write_row(rel, [c for c, _ in columns], [edge.get(c, '') for c, _ in columns])
+
+    nodes_out.close()
+    relations_out.close()
+
+    lines = [
+        '-- ============================================================================',
+        "-- IMPORT DES ALERTES INFÉRÉES (infer_alerts.py)",
+        '-- Exécuter après import.kuzu',
+        '-- ============================================================================',
+        '',
+    ]
+    for subdir, writers in (('nodes', nodes_out), ('relations', relations_out)):
+        for name in writers.counts:
+            lines.append(f'COPY {name} FROM "{INFERENCE_DIR}/{subdir}/{name}.csv" (HEADER=true);')
+    script_path = os.path.join(data_dir, 'import_alertes.kuzu')
+    with open(script_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    print(f"✓ {script_path}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="KG-Oversight - Inférence des alertes RGL-001 à RGL-007")
+    parser.add_argument('--data-dir', default=transform.OUTPUT_DIR,
+                        help="répertoire produit par transform_to_kuzu.py (nodes/, relations/)")
+    parser.add_argument('--date', type=date.fromisoformat, default=date.today(),
+                        help="date de référence AAAA-MM-JJ (délais et alertes sans date)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("=" * 60)
+    print("KG-Oversight - Inférence des alertes")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    print("\n🔎 Chargement du graphe...")
+    graph = Graph(args.data_dir)
+    print(f"✓ {len(graph.sous_traitants)} sous-traitants, {len(graph.audits)} audits, "
+          f"{len(graph.findings)} findings, {len(graph.qes)} événements qualité")
+
+    print("\n⚙️  Évaluation des règles...")
+    alerts = evaluate(graph, args.date)
+    by_level = {}
+    for result in alerts:
+        by_level[result['niveau']] = by_level.get(result['niveau'], 0) + 1
+    print(f"✓ {len(alerts)} alerte(s) : " + ', '.join(f"{level} {count}" for level, count in sorted(by_level.items())))
+
+    print("\n📝 Écriture des alertes...")
+    write_outputs(alerts, args.data_dir, transform.load_schema())
+
+    print("\n" + "=" * 60)
+    print(f"✅ Inférence terminée en {time.perf_counter() - start:.1f} s")
+    print("=" * 60)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
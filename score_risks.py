@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+KG-Oversight - Évaluation des risques sous-traitants
+Calcule les critères d'EvaluationRisque (findings_critiques, qe_critiques,
+kqi_alertes, inspection_recente, audit_for_cause) et le score Low/Medium/High
+de chaque sous-traitant à partir du graphe produit par transform_to_kuzu.py
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import date, timedelta
+
+import transform_to_kuzu as transform
+from infer_alerts import OutputTables, normalize_kqi_statut, parse_date
+
+# Sous-dossier de sortie, à côté de nodes/ et relations/
+SCORING_DIR = 'scoring'
+
+# Fenêtre d'observation des critères, en jours avant la date d'évaluation
+RISK_WINDOW_DAYS = 365
+
+# Nombre de KQI en alerte à partir duquel le risque est au moins Medium
+KQI_ALERTS_MEDIUM = 3
+
+# Prochaine évaluation : délai selon le score (High : semestrielle)
+NEXT_EVALUATION_DAYS = {'Low': 365, 'Medium': 365, 'High': 182}
+
+# Une évaluation automatique par sous-traitant, mise à jour (MERGE) à chaque calcul
+EVALUATION_ID = 'EVA-AUTO-{}'
+
+# État du calcul précédent (scoring/state.json) : empreinte des faits et
+# évaluation de chaque sous-traitant
+STATE_VERSION = 2
+STATE_FILE = 'state.json'
+
+# Colonnes refaites à chaque calcul, y compris pour une évaluation réutilisée
+DATED_COLUMNS = ('id', 'description', 'date_evaluation', 'evolution', 'prochaine_evaluation')
+
+@functools.lru_cache(maxsize=None)
+def kqi_period_end(periode):
+    """Dernier jour d'une période '2024-Q3' ou '2024-07' (None si illisible)"""
+    try:
+        year, part = periode.split('-', 1)
+        if part.startswith('Q'):
+            month = int(part[1:]) * 3
+        else:
+            month = int(part)
+        first_of_next = date(int(year) + month // 12, month % 12 + 1, 1)
+    except ValueError:
+        return None
+    return first_of_next - timedelta(days=1)
+
+def score(criteria):
+    """Score Low/Medium/High à partir des critères"""
+    if criteria['audit_for_cause'] or criteria['findings_critiques'] > 0:
+        return 'High'
+    if criteria['qe_critiques'] > 0 or criteria['kqi_alertes'] >= KQI_ALERTS_MEDIUM:
+        return 'Medium'
+    return 'Low'
+
+class RiskFacts:
+    """Faits de la fenêtre d'observation, agrégés par sous-traitant en une lecture de chaque table"""
+
+    def __init__(self, data_dir, today):
+        tables = OutputTables(data_dir)
+        since = today - timedelta(days=RISK_WINDOW_DAYS)
+
+        def in_window(value):
+            day = parse_date(value)
+            return day is not None and since < day <= today
+
+        self.sous_traitants = {row['id']: row['nom'] for row in tables.read('nodes', 'SousTraitant')}
+        # Faits retenus par sous-traitant : {(type, id)}
+        self.facts = {st_id: set() for st_id in self.sous_traitants}
+
+        audits = {row['id']: row for row in tables.read('nodes', 'Audit')}
+        inspections = {row['id']: row for row in tables.read('nodes', 'Inspection')}
+        owner = {}
+        for rel, nodes_by_id, kind in (('A_ETE_AUDITE_PAR', audits, 'audit'),
+                                       ('A_ETE_INSPECTE_PAR', inspections, 'inspection')):
+            for edge in tables.read('relations', rel):
+                node = nodes_by_id.get(edge['to'])
+                owner.setdefault(edge['to'], set()).add(edge['from'])
+                if node is None:
+                    continue
+                if kind == 'inspection' and in_window(node['date_debut']):
+                    self.add(edge['from'], 'inspection', node['id'])
+                elif kind == 'audit' and node['type_audit'] == 'For Cause' and in_window(node['date_debut']):
+                    self.add(edge['from'], 'audit_for_cause', node['id'])
+
+        critical_findings = {row['id'] for row in tables.read('nodes', 'Finding')
+                             if row['criticite'] == 'Critique' and in_window(row['date_detection'])}
+        for rel in ('GENERE_FINDING', 'INSPECTION_GENERE_FINDING'):
+            for edge in tables.read('relations', rel):
+                if edge['to'] in critical_findings:
+                    for st_id in owner.get(edge['from'], ()):
+                        self.add(st_id, 'finding', edge['to'])
+
+        critical_qes = {row['id'] for row in tables.read('nodes', 'EvenementQualite')
+                        if row['criticite'] == 'Critique' and in_window(row['date_creation'])}
+        for edge in tables.read('relations', 'QE_CONCERNE_ST'):
+            if edge['from'] in critical_qes:
+                self.add(edge['to'], 'qe', edge['from'])
+
+        # Peu de périodes et de statuts distincts : valeurs mises en cache
+        alerting = functools.lru_cache(maxsize=None)(
+            lambda statut: normalize_kqi_statut(statut) in ('Alerte', 'Critique'))
+        for row in tables.read('nodes', 'KQI'):
+            end = kqi_period_end(row['periode'])
+            if end and since < end <= today and alerting(row.get('statut_calcule') or row['statut']):
+                self.add(row['sous_traitant_id'], 'kqi', row['id'])
+
+        # Dernière évaluation existante de chaque sous-traitant (pour evolution)
+        evaluations = {row['id']: row for row in tables.read('nodes', 'EvaluationRisque')}
+        self.previous_scores = {}
+        for edge in sorted(tables.read('relations', 'A_FAIT_OBJET_EVALUATION'),
+                           key=lambda edge: evaluations.get(edge['to'], {}).get('date_evaluation', '')):
+            evaluation = evaluations.get(edge['to'])
+            if evaluation and evaluation['score']:
+                self.previous_scores[edge['from']] = evaluation['score']
+
+    def add(self, st_id, kind, node_id):
+        if st_id in self.facts:
+            self.facts[st_id].add((kind, node_id))
+
+    def criteria(self, st_id):
+        counts = {}
+        for kind, _ in self.facts[st_id]:
+            counts[kind] = counts.get(kind, 0) + 1
+        return {
+            'findings_critiques': counts.get('finding', 0),
+            'qe_critiques': counts.get('qe', 0),
+            'kqi_alertes': counts.get('kqi', 0),
+            'inspection_recente': counts.get('inspection', 0) > 0,
+            'audit_for_cause': counts.get('audit_for_cause', 0) > 0,
+        }
+
+    def digest(self, st_id):
+        """Empreinte des faits d'un sous-traitant : inchangée, son évaluation précédente est réutilisée"""
+        text = '\n'.join(f'{kind}\x1f{node_id}' for kind, node_id in sorted(self.facts[st_id]))
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def rules_version():
+    """Empreinte des règles de score : modifiées, aucune évaluation précédente n'est réutilisée"""
+    return transform.file_digest(os.path.abspath(__file__))
+
+def load_state(path):
+    """Évaluations du calcul précédent par sous-traitant : {st_id: {'digest', 'record'}}"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION or state.get('rules') != rules_version():
+        return {}
+    return state['evaluations']
+
+def write_state(path, evaluations):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': STATE_VERSION, 'rules': rules_version(), 'evaluations': evaluations},
+                  f, ensure_ascii=False)
+    print(f"✓ {path}")
+
+def assess(facts, st_id):
+    """Critères et score d'un sous-traitant : colonnes qui ne dépendent que de ses faits"""
+    criteria = facts.criteria(st_id)
+    result = score(criteria)
+    return {
+        'statut': 'Clôturé',
+        'criticite': 'Critique' if result == 'High' else '',
+        'score': result,
+        **{name: str(value).lower() if isinstance(value, bool) else value
+           for name, value in criteria.items()},
+        'source_donnees': 'Moteur Scoring',
+    }
+
+def previous_score(kept, today):
+    """Score auquel comparer le nouveau calcul, d'après l'évaluation automatique précédente.
+
+    Recalculée le même jour, l'évaluation garde son point de comparaison
+    (le score d'avant, conservé dans evolution).
+    """
+    if kept['date_evaluation'] != today.isoformat():
+        return kept['score']
+    return kept['evolution'].split('→')[0] if kept['evolution'] else kept['score']
+
+def evaluate(facts, today, previous, reuse=True):
+    """Évaluations datées de today de tous les sous-traitants, par id de sous-traitant.
+
+    previous : état du calcul précédent (load_state). Les critères et le score
+    d'un sous-traitant dont les faits n'ont pas changé sont repris, seules ses
+    dates sont refaites ; reuse=False (--full) recalcule tout. Retourne
+    ({st_id: {'digest', 'record'}}, sous-traitants recalculés).
+    """
+    evaluations = {}
+    recomputed = []
+    for st_id, st_name in facts.sous_traitants.items():
+        digest = facts.digest(st_id)
+        kept = previous.get(st_id)
+        if reuse and kept is not None and kept['digest'] == digest:
+            assessed = {name: value for name, value in kept['record'].items() if name not in DATED_COLUMNS}
+        else:
+            assessed = assess(facts, st_id)
+            recomputed.append(st_id)
+        result = assessed['score']
+        before = previous_score(kept['record'], today) if kept else facts.previous_scores.get(st_id)
+        record = {
+            'id': EVALUATION_ID.format(st_id),
+            'description': f'Évaluation automatique {st_name} {today.isoformat()}',
+            'date_evaluation': today.isoformat(),
+            'evolution': f'{before}→{result}' if before and before != result else '',
+            'prochaine_evaluation': (today + timedelta(days=NEXT_EVALUATION_DAYS[result])).isoformat(),
+            **assessed,
+        }
+        evaluations[st_id] = {'digest': digest, 'record': record}
+    return evaluations, recomputed
+
+def write_outputs(evaluations, data_dir, schema):
+    """Écrit scoring/nodes/EvaluationRisque.csv, scoring/relations/A_FAIT_OBJET_EVALUATION.csv
+    et import_scores.kuzu.
+
+    Le script met à jour les évaluations par MERGE sur leur id : il peut être
+    rejoué après chaque calcul sur une base qui contient déjà les précédentes.
+    """
+    base = os.path.join(data_dir, SCORING_DIR)
+    for subdir in ('nodes', 'relations'):
+        shutil.rmtree(os.path.join(base, subdir), ignore_errors=True)
+    nodes_out = transform.TypeWriters(os.path.join(base, 'nodes'))
+    relations_out = transform.TypeWriters(os.path.join(base, 'relations'))
+    columns = [name for name, _ in schema['EvaluationRisque']['columns']]
+    rel_columns = [name for name, _ in transform.table_columns(schema['A_FAIT_OBJET_EVALUATION'])]
+
+    for st_id, record in evaluations.items():
+        nodes_out.write_row('EvaluationRisque', columns, [record.get(c, '') for c in columns])
+        edge = {'from': st_id, 'to': record['id'], 'date_lien': record['date_evaluation']}
+        relations_out.write_row('A_FAIT_OBJET_EVALUATION', rel_columns, [edge.get(c, '') for c in rel_columns])
+    nodes_out.close()
+    relations_out.close()
+
+    lines = [
+        '-- ============================================================================',
+        "-- IMPORT DES ÉVALUATIONS DE RISQUE CALCULÉES (score_risks.py)",
+        '-- Exécuter après import.kuzu ; rejouable (MERGE sur les identifiants)',
+        '-- ============================================================================',
+        '',
+    ]
+    if nodes_out.counts:
+        types = dict(schema['EvaluationRisque']['columns'])
+        load = transform.load_with_headers(f'{SCORING_DIR}/nodes/EvaluationRisque.csv', columns, types)
+        assignments = ',\n    '.join(f'e.{c} = `{c}`' for c in columns if c != 'id')
+        lines.append(f"{load}\nMERGE (e:EvaluationRisque {{id: id}})\nSET {assignments};")
+        rel_types = dict(transform.table_columns(schema['A_FAIT_OBJET_EVALUATION']))
+        load = transform.load_with_headers(f'{SCORING_DIR}/relations/A_FAIT_OBJET_EVALUATION.csv',
+                                           rel_columns, rel_types)
+        assignments = ',\n    '.join(f'r.{c} = `{c}`' for c in rel_columns[2:])
+        lines.append(f"{load}\nMATCH (s:SousTraitant {{id: `from`}}), (e:EvaluationRisque {{id: `to`}})\n"
+                     f"MERGE (s)-[r:A_FAIT_OBJET_EVALUATION]->(e)\nSET {assignments};")
+    script_path = os.path.join(data_dir, 'import_scores.kuzu')
+    with open(script_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    print(f"✓ {script_path}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="KG-Oversight - Évaluation des risques sous-traitants")
+    parser.add_argument('--data-dir', default=transform.OUTPUT_DIR,
+                        help="répertoire produit par transform_to_kuzu.py (nodes/, relations/)")
+    parser.add_argument('--date', type=date.fromisoformat, default=date.today(),
+                        help="date d'évaluation AAAA-MM-JJ (fin de la fenêtre d'observation)")
+    parser.add_argument('--full', action='store_true',
+                        help="recalculer tous les sous-traitants, sans réutiliser l'état précédent")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("=" * 60)
+    print("KG-Oversight - Évaluation des risques")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    print("\n🔎 Agrégation des faits par sous-traitant...")
+    facts = RiskFacts(args.data_dir, args.date)
+    print(f"✓ {len(facts.sous_traitants)} sous-traitants, "
+          f"{sum(len(found) for found in facts.facts.values())} faits sur {RISK_WINDOW_DAYS} jours")
+
+    state_path = os.path.join(args.data_dir, SCORING_DIR, STATE_FILE)
+    evaluations, recomputed = evaluate(facts, args.date, load_state(state_path), reuse=not args.full)
+    records = {st_id: entry['record'] for st_id, entry in evaluations.items()}
+    scores = {}
+    for record in records.values():
+        scores[record['score']] = scores.get(record['score'], 0) + 1
+    print(f"✓ {len(recomputed)} évaluation(s) recalculée(s) sur {len(records)} : "
+          + ', '.join(f"{name} {count}" for name, count in sorted(scores.items())))
+
+    print("\n📝 Écriture des évaluations...")
+    write_outputs(records, args.data_dir, transform.load_schema())
+    write_state(state_path, evaluations)
+
+    print("\n" + "=" * 60)
+    print(f"✅ Évaluation terminée en {time.perf_counter() - start:.1f} s")
+    print("=" * 60)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Outils communs des tests de transform_to_kuzu.py et des étapes en aval.
+
+Le script garde son état dans des variables de module (index des nœuds,
+compteurs de rejets...) : chaque exécution complète passe donc par un
+processus séparé, comme en production.
+"""
+
+import contextlib
+import csv
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+sys.path.insert(0, ROOT)
+
+NODES_HEADER = ['Type_Noeud', 'ID_Noeud', 'Nom_Description', 'Statut', 'Criticite', 'Date_Creation',
+                'Date_Fin', 'Source_Donnees', 'Attributs_JSON']
+RELATIONS_HEADER = ['Type_Relation', 'Type_Noeud_Source', 'Type_Noeud_Cible', 'Noeud_Source', 'Noeud_Cible',
+                    'Date_Lien', 'Validite', 'Attributs']
+
+
+def pytest_addoption(parser):
+    parser.addoption('--run-slow', action='store_true', help="exécuter aussi les tests sur plusieurs millions de lignes")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "slow: test long (plusieurs millions de lignes), lancé avec --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-slow'):
+        return
+    skip = pytest.mark.skip(reason="test long : relancer avec --run-slow")
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    """Copie modifiable du jeu d'exemple (nodes.csv, relations.csv, kqi.csv)"""
+    directory = tmp_path / 'entrees'
+    shutil.copytree(DATA_DIR, directory)
+    return directory
+
+
+def append_rows(path, rows):
+    """Ajoute des lignes à un fichier d'entrée CSV"""
+    with open(path, 'a', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+
+def read_rows(path):
+    """Lignes d'un CSV produit, en dictionnaires"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def run_transform(input_dir, output_dir, *args, settings=None, check=True):
+    """Exécute transform_to_kuzu.main() dans un processus séparé.
+
+    settings : variables du module à remplacer avant l'exécution
+    (ex. {'CHUNK_MIN_BYTES': 1000} pour forcer le découpage en plages).
+    """
+    settings = {'OUTPUT_DIR': str(output_dir), **(settings or {})}
+    code = ('import json, sys, transform_to_kuzu as t\n'
+            'for name, value in json.loads(sys.argv[1]).items():\n'
+            '    setattr(t, name, value)\n'
+            't.main(sys.argv[2:])\n')
+    result = subprocess.run(
+        [sys.executable, '-c', code, json.dumps(settings), '--input-dir', str(input_dir), *map(str, args)],
+        cwd=ROOT, capture_output=True, text=True)
+    if check and result.returncode != 0:
+        raise AssertionError(f"transform_to_kuzu.py a échoué ({result.returncode}) :\n{result.stdout}\n{result.stderr}")
+    return result
+
+
+def output_files(directory):
+    """{chemin relatif: contenu} des fichiers produits (hors manifeste et parties temporaires)"""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, directory)
+            with open(path, 'rb') as f:
+                files[relpath] = f.read()
+    return files
+
+
+def script_statements(path):
+    """Instructions d'un script .kuzu généré (commentaires retirés)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = re.sub(r'--[^\n]*', '', f.read())
+    return [statement.strip() for statement in text.split(';\n') if statement.strip()]
+
+
+def kuzu_import(output_dir, db_path, scripts=('import.kuzu',), schema_file=None):
+    """Crée une base Kuzu vide, son schéma, puis exécute les scripts d'import de output_dir.
+
+    schema_file (schema_encoded.kuzu...) et les chemins des COPY/LOAD FROM
+    sont relatifs au dossier de sortie ; défaut : schema.kuzu du dépôt.
+    Retourne une connexion ouverte sur la base.
+    """
+    kuzu = pytest.importorskip('kuzu')
+    import transform_to_kuzu
+
+    connection = kuzu.Connection(kuzu.Database(str(db_path)))
+    with contextlib.chdir(output_dir):
+        if schema_file is None:
+            statements = transform_to_kuzu.schema_statements()
+        else:
+            statements = [statement.rstrip(';') for statement in script_statements(schema_file)]
+        for statement in statements:
+            connection.execute(statement)
+    for script in scripts:
+        run_script(connection, output_dir, script)
+    return connection
+
+
+def run_script(connection, output_dir, script):
+    """Exécute un script .kuzu de output_dir (chemins des COPY/LOAD FROM relatifs à ce dossier)"""
+    with contextlib.chdir(output_dir):
+        for statement in script_statements(script):
+            connection.execute(statement)
+
+
+def query(connection, cypher):
+    """Lignes d'une requête Cypher, en listes"""
+    result = connection.execute(cypher)
+    rows = []
+    while result.has_next():
+        rows.append(result.get_next())
+    return rows
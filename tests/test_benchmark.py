@@ -0,0 +1,28 @@
+"""benchmark_transform.py : exports synthétiques cohérents et étapes mesurées comme run_all()"""
+
+import benchmark_transform
+
+from conftest import read_rows, run_transform
+
+
+def test_generated_references_resolve(tmp_path):
+    benchmark_transform.generate_dataset(tmp_path / 'entrees', 3000)
+    run_transform(tmp_path / 'entrees', tmp_path / 'sortie')
+
+    assert not (tmp_path / 'sortie' / 'quarantine').exists()
+    via = {row['via'] for row in read_rows(tmp_path / 'sortie' / 'relations' / 'IMPLIQUE_ST.csv')} - {''}
+    assert via and all(value.startswith('SOUSTRAITANT-') for value in via)
+    exposure = read_rows(tmp_path / 'sortie' / 'relations' / 'EXPOSITION_ST.csv')
+    assert any(row['profondeur'] == '2' for row in exposure)
+
+
+def test_benchmark_runs_the_full_stage_sequence(tmp_path):
+    result = benchmark_transform.benchmark(3000, tmp_path)
+
+    assert list(result['stages']) == [stage for stage, _ in benchmark_transform.STAGES]
+    output = tmp_path / 'output'
+    exposure = read_rows(output / 'relations' / 'EXPOSITION_ST.csv')
+    assert any(row['profondeur'] == '2' for row in exposure)
+    contracts = read_rows(output / 'nodes' / 'Contrat.csv')
+    assert any(row['version_racine'] for row in contracts)
+    assert not (output / 'quarantine').exists()
@@ -0,0 +1,44 @@
+"""EXPOSITION_ST : fermeture des chaînes de sous-traitance et intégrité de ses extrémités"""
+
+import pytest
+
+from conftest import append_rows, kuzu_import, query, read_rows, run_transform
+
+DANGLING_VIA = ['IMPLIQUE_ST', 'Étude Clinique', 'Sous-Traitant', 'ETU-2023-001', 'ST-005', '2023-06-01', 'Active',
+                '{"niveau": 2, "role": "Stockage", "via": "ST-404"}']
+
+
+def test_level_two_subcontractor_is_exposed_through_via(inputs, tmp_path):
+    run_transform(inputs, tmp_path / 'sortie')
+    exposure = read_rows(tmp_path / 'sortie' / 'relations' / 'EXPOSITION_ST.csv')
+    assert {'from': 'ETU-2023-001', 'to': 'ST-008', 'profondeur': '2', 'chemin': '["ST-004", "ST-008"]'} in exposure
+
+
+def test_dangling_via_is_quarantined(inputs, tmp_path):
+    append_rows(inputs / 'relations.csv', [DANGLING_VIA])
+    run_transform(inputs, tmp_path / 'sortie')
+
+    quarantined = read_rows(tmp_path / 'sortie' / 'quarantine' / 'IMPLIQUE_ST.csv')
+    assert [(row['to'], row['via'], row['raison']) for row in quarantined] == [('ST-005', 'ST-404', 'via ST-404 inconnu')]
+    exposure = read_rows(tmp_path / 'sortie' / 'relations' / 'EXPOSITION_ST.csv')
+    assert not any('ST-404' in row['to'] or 'ST-404' in row['chemin'] for row in exposure)
+
+    connection = kuzu_import(tmp_path / 'sortie', tmp_path / 'base')
+    assert query(connection, "MATCH (:EtudeClinique)-[e:EXPOSITION_ST]->(:SousTraitant) RETURN count(e)")[0][0] == len(exposure)
+
+
+@pytest.mark.parametrize('args', [['--format', 'parquet'], ['--encode']])
+def test_dangling_via_other_outputs_import(inputs, tmp_path, args):
+    append_rows(inputs / 'relations.csv', [DANGLING_VIA])
+    run_transform(inputs, tmp_path / 'sortie', *args)
+    schema_file = 'schema_encoded.kuzu' if '--encode' in args else None
+    kuzu_import(tmp_path / 'sortie', tmp_path / 'base', schema_file=schema_file)
+    if '--encode' in args:
+        keys = read_rows(tmp_path / 'sortie' / 'encodage' / 'identifiants' / 'SousTraitant.csv')
+        assert 'ST-404' not in {row['id'] for row in keys}
+
+
+def test_dangling_via_direct_load(inputs, tmp_path):
+    append_rows(inputs / 'relations.csv', [DANGLING_VIA])
+    run_transform(inputs, tmp_path / 'sortie', '--kuzu-db', tmp_path / 'base')
+    assert read_rows(tmp_path / 'base.quarantine' / 'IMPLIQUE_ST.csv')[0]['raison'] == 'via ST-404 inconnu'
@@ -0,0 +1,28 @@
+"""import.kuzu : contrôle des fichiers produits puis chargement dans une base Kuzu réelle"""
+
+import pytest
+
+from conftest import append_rows, kuzu_import, query, read_rows, run_transform
+
+
+@pytest.mark.parametrize('args', [[], ['--format', 'parquet'], ['--workers', 2]])
+def test_import_script_loads_every_row(inputs, tmp_path, args):
+    run_transform(inputs, tmp_path / 'sortie', *args, settings={'CHUNK_MIN_BYTES': 1000})
+    connection = kuzu_import(tmp_path / 'sortie', tmp_path / 'base')
+    assert query(connection, "MATCH (c:Contrat) RETURN count(c)")[0][0] == 5
+    if '--format' not in args:
+        links = read_rows(tmp_path / 'sortie' / 'relations' / 'EST_LIE_AU_CONTRAT.csv')
+        assert query(connection, "MATCH ()-[r:EST_LIE_AU_CONTRAT]->() RETURN count(r)")[0][0] == len(links)
+
+
+@pytest.mark.parametrize('args', [[], ['--format', 'parquet']])
+def test_dangling_endpoint_blocks_the_import_script(inputs, tmp_path, args):
+    # Sans contrôle d'intégrité, la relation vers ST-404 arrive jusqu'aux fichiers produits
+    append_rows(inputs / 'relations.csv', [
+        ['EST_LIE_AU_CONTRAT', 'Sous-Traitant', 'Contrat', 'ST-404', 'CTR-001', '2024-01-01', 'Active', '{}'],
+    ])
+    result = run_transform(inputs, tmp_path / 'sortie', '--no-integrity-check', *args, check=False)
+    assert result.returncode != 0
+    assert "1 relation(s) dont l'extrémité from est absente des nœuds écrits" in result.stdout
+    assert "'ST-404'" in result.stdout
+    assert not (tmp_path / 'sortie' / 'import.kuzu').exists()
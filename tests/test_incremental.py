@@ -0,0 +1,81 @@
+"""--incremental : import_delta.kuzu rejoué sur une base Kuzu réelle"""
+
+import csv
+import os
+import shutil
+
+from conftest import ROOT, append_rows, kuzu_import, query, read_rows, run_script, run_transform
+
+DUPLICATE_LINK = ['EST_LIE_AU_CONTRAT', 'Sous-Traitant', 'Contrat', 'ST-001', 'CTR-002', '2024-03-01', 'Active', '{}']
+
+
+def rewrite_inputs(inputs):
+    """Modifie une date, retire une relation, double un lien et ajoute un nœud"""
+    with open(inputs / 'nodes.csv', encoding='utf-8', newline='') as f:
+        nodes = list(csv.reader(f))
+    audit = next(row for row in nodes[1:] if row[0] == 'Audit' and row[5])
+    audit[5] = '2020-02-02'
+    nodes.append(['Audit', 'AUD-NOUVEAU', 'Audit ajouté', 'Planifié', '-', '2025-01-15', '', '', '{}'])
+    with open(inputs / 'relations.csv', encoding='utf-8', newline='') as f:
+        relations = list(csv.reader(f))
+    removed = next(row for row in relations[1:] if row[0] == 'IMPLIQUE_ST')
+    relations.remove(removed)
+    for path, rows in ((inputs / 'nodes.csv', nodes), (inputs / 'relations.csv', relations)):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(rows)
+    append_rows(inputs / 'relations.csv', [DUPLICATE_LINK, DUPLICATE_LINK])
+    return audit[1]
+
+
+def snapshot(connection):
+    """Contenu comparable de la base : propriétés des nœuds et des relations"""
+    tables = [row[1] for row in query(connection, "CALL show_tables() RETURN *")]
+    content = {}
+    for table in tables:
+        try:
+            rows = query(connection, f"MATCH (n:{table}) RETURN n")
+        except RuntimeError:
+            rows = query(connection, f"MATCH (a)-[r:{table}]->(b) RETURN a.id, b.id, r")
+            rows = [(a, b, {k: v for k, v in r.items() if not k.startswith('_')}) for a, b, r in rows]
+        else:
+            rows = [{k: v for k, v in n.items() if not k.startswith('_')} for (n,) in rows]
+        content[table] = sorted(map(repr, rows))
+    return content
+
+
+def test_delta_script_matches_a_full_import(inputs, tmp_path):
+    output = tmp_path / 'sortie'
+    append_rows(inputs / 'relations.csv', [DUPLICATE_LINK])
+    run_transform(inputs, output, '--incremental')
+    connection = kuzu_import(output, tmp_path / 'base')
+
+    audit_id = rewrite_inputs(inputs)
+    run_transform(inputs, output, '--incremental')
+    assert (output / 'delta' / 'relations' / 'IMPLIQUE_ST_suppressions.csv').exists()
+    run_script(connection, output, 'import_delta.kuzu')
+
+    full = kuzu_import(output, tmp_path / 'base_complete')
+    assert snapshot(connection) == snapshot(full)
+    links = query(connection, "MATCH (:SousTraitant {id: 'ST-001'})-[r:EST_LIE_AU_CONTRAT]->(:Contrat {id: 'CTR-002'}) "
+                              "RETURN count(r)")
+    expected = sum(1 for row in read_rows(output / 'relations' / 'EST_LIE_AU_CONTRAT.csv')
+                   if (row['from'], row['to']) == ('ST-001', 'CTR-002'))
+    assert links[0][0] == expected >= 2
+    dates = query(connection, f"MATCH (a:Audit {{id: '{audit_id}'}}) RETURN a.date_debut")
+    assert str(dates[0][0]) == '2020-02-02'
+
+
+def test_schema_change_rebuilds_everything(inputs, tmp_path):
+    output = tmp_path / 'sortie'
+    schema = tmp_path / 'schema.kuzu'
+    shutil.copy(os.path.join(ROOT, 'schema.kuzu'), schema)
+    settings = {'SCHEMA_FILE': str(schema)}
+    run_transform(inputs, output, '--incremental', settings=settings)
+    unchanged = run_transform(inputs, output, '--incremental', settings=settings)
+    assert 'Entrées inchangées' in unchanged.stdout
+
+    text = schema.read_text(encoding='utf-8')
+    schema.write_text(text.replace('    niveau INT16,', '    niveau DOUBLE,', 1), encoding='utf-8')
+    rebuilt = run_transform(inputs, output, '--incremental', settings=settings)
+    assert 'Entrées inchangées' not in rebuilt.stdout
+    assert {row['niveau'] for row in read_rows(output / 'relations' / 'IMPLIQUE_ST.csv')} <= {'1.0', '2.0'}
@@ -0,0 +1,33 @@
+"""infer_alerts.py et score_risks.py lisent toutes les sorties de la transformation"""
+
+import pytest
+
+import infer_alerts
+import score_risks
+
+from conftest import read_rows, run_transform
+
+
+def alerts(output):
+    infer_alerts.main(['--data-dir', str(output), '--date', '2024-06-30'])
+    return sorted(map(sorted, (row.items() for row in read_rows(output / 'inference' / 'nodes' / 'Alerte.csv'))))
+
+
+def scores(output):
+    score_risks.main(['--data-dir', str(output), '--date', '2024-06-30'])
+    return read_rows(output / 'scoring' / 'nodes' / 'EvaluationRisque.csv')
+
+
+@pytest.mark.parametrize('args', [['--format', 'parquet'], ['--encode'], ['--encode', '--format', 'parquet']])
+def test_other_output_formats_give_the_same_alerts_and_scores(inputs, tmp_path, args):
+    run_transform(inputs, tmp_path / 'csv')
+    run_transform(inputs, tmp_path / 'autre', *args)
+    expected = alerts(tmp_path / 'csv')
+    assert expected
+    assert alerts(tmp_path / 'autre') == expected
+    assert scores(tmp_path / 'autre') == scores(tmp_path / 'csv')
+
+
+def test_missing_transform_output_fails_loudly(tmp_path):
+    with pytest.raises(SystemExit, match='import.kuzu absent'):
+        infer_alerts.main(['--data-dir', str(tmp_path)])
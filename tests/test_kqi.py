@@ -0,0 +1,25 @@
+"""KQI : colonnes calculées (statut, pente de tendance)"""
+
+import csv
+
+from conftest import read_rows, run_transform
+
+KQI_HEADER = ['ID_KQI', 'ID_SousTraitant', 'Nom_SousTraitant', 'Indicateur', 'Periode', 'Valeur',
+              'Seuil_Alerte', 'Seuil_Objectif', 'Statut', 'Tendance']
+
+
+def test_slope_uses_period_ordinal(inputs, tmp_path):
+    # 2023-Q3 absent et lignes dans le désordre : la pente suit le calendrier, pas la position
+    rows = [
+        ['KQI-3', 'ST-001', 'CRO', 'Délai', '2023-Q4', '40', '10', '50', '', ''],
+        ['KQI-1', 'ST-001', 'CRO', 'Délai', '2023-Q1', '10', '10', '50', '', ''],
+        ['KQI-2', 'ST-001', 'CRO', 'Délai', '2023-Q2', '20', '10', '50', '', ''],
+    ]
+    with open(inputs / 'kqi.csv', 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows([KQI_HEADER] + rows)
+    run_transform(inputs, tmp_path / 'sortie')
+
+    slopes = {row['id']: row['pente_tendance'] for row in read_rows(tmp_path / 'sortie' / 'nodes' / 'KQI.csv')}
+    assert slopes['KQI-1'] == ''
+    assert float(slopes['KQI-2']) == 10.0
+    assert float(slopes['KQI-3']) == 10.0
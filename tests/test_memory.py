@@ -0,0 +1,47 @@
+"""Mémoire de la transformation en flux : le pic ne dépend pas du nombre de relations"""
+
+import csv
+import json
+
+import pytest
+
+from conftest import RELATIONS_HEADER, read_rows, run_transform
+
+
+def write_relations(inputs, rows):
+    """Remplace relations.csv par `rows` liens Sous-traitant → Contrat valides"""
+    st_ids = [row['ID_Noeud'] for row in read_rows(inputs / 'nodes.csv') if row['Type_Noeud'] == 'Sous-Traitant']
+    contract_ids = [row['ID_Noeud'] for row in read_rows(inputs / 'nodes.csv') if row['Type_Noeud'] == 'Contrat']
+    with open(inputs / 'relations.csv', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(RELATIONS_HEADER)
+        for n in range(rows):
+            writer.writerow(['EST_LIE_AU_CONTRAT', 'Sous-Traitant', 'Contrat', st_ids[n % len(st_ids)],
+                             contract_ids[n % len(contract_ids)], '2024-01-01', 'Active', '{}'])
+
+
+def peak_bytes(inputs, output_dir, rows):
+    """Pic d'allocation Python (tracemalloc) d'une exécution complète"""
+    write_relations(inputs, rows)
+    metrics = output_dir.with_suffix('.json')
+    run_transform(inputs, output_dir, '--metrics', metrics, '--tracemalloc')
+    with open(metrics, encoding='utf-8') as f:
+        return json.load(f)['memory']['peak_bytes']
+
+
+def assert_bounded(small, large):
+    # Marge fixe : caches de conversion et tampons d'écriture, indépendants du volume
+    assert large < small * 1.2 + 4 * 1024 * 1024, f"pic {large} octets contre {small} sur le petit fichier"
+
+
+def test_relations_memory_is_bounded(inputs, tmp_path):
+    small = peak_bytes(inputs, tmp_path / 'petit', 10_000)
+    large = peak_bytes(inputs, tmp_path / 'grand', 200_000)
+    assert_bounded(small, large)
+
+
+@pytest.mark.slow
+def test_relations_memory_is_bounded_on_5m_rows(inputs, tmp_path):
+    small = peak_bytes(inputs, tmp_path / 'petit', 10_000)
+    large = peak_bytes(inputs, tmp_path / 'grand', 5_000_000)
+    assert_bounded(small, large)
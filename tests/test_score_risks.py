@@ -0,0 +1,65 @@
+"""score_risks.py : évaluations datées du calcul, recalcul incrémental et import rejouable"""
+
+import json
+
+import score_risks
+
+from conftest import kuzu_import, query, read_rows, run_script, run_transform
+
+
+def evaluations(output):
+    return {row['id']: row for row in read_rows(output / 'scoring' / 'nodes' / 'EvaluationRisque.csv')}
+
+
+def test_rescoring_refreshes_dates_and_reimports(inputs, tmp_path):
+    output = tmp_path / 'sortie'
+    run_transform(inputs, output)
+    connection = kuzu_import(output, tmp_path / 'base')
+    existing = query(connection, "MATCH (e:EvaluationRisque) RETURN count(e)")[0][0]
+
+    score_risks.main(['--data-dir', str(output), '--date', '2024-06-30'])
+    first = evaluations(output)
+    run_script(connection, output, 'import_scores.kuzu')
+
+    # Mêmes faits, autre date : dates rafraîchies, mêmes identifiants mis à jour
+    score_risks.main(['--data-dir', str(output), '--date', '2024-09-30'])
+    second = evaluations(output)
+    assert second.keys() == first.keys()
+    record = second['EVA-AUTO-ST-001']
+    assert record['date_evaluation'] == '2024-09-30'
+    assert record['description'].endswith('2024-09-30')
+    assert record['prochaine_evaluation'] > '2024-09-30'
+    links = read_rows(output / 'scoring' / 'relations' / 'A_FAIT_OBJET_EVALUATION.csv')
+    assert {row['date_lien'] for row in links} == {'2024-09-30'}
+
+    run_script(connection, output, 'import_scores.kuzu')
+    run_script(connection, output, 'import_scores.kuzu')
+    assert query(connection, "MATCH (e:EvaluationRisque) RETURN count(e)")[0][0] == existing + len(second)
+    dates = query(connection, "MATCH (:SousTraitant {id: 'ST-001'})-[r:A_FAIT_OBJET_EVALUATION]->"
+                              "(e:EvaluationRisque {id: 'EVA-AUTO-ST-001'}) RETURN r.date_lien, e.date_evaluation")
+    assert [(str(link), str(day)) for link, day in dates] == [('2024-09-30', '2024-09-30')]
+
+
+def test_unchanged_facts_reuse_the_previous_assessment(inputs, tmp_path, capsys):
+    output = tmp_path / 'sortie'
+    run_transform(inputs, output)
+    score_risks.main(['--data-dir', str(output), '--date', '2024-06-30'])
+    expected = evaluations(output)['EVA-AUTO-ST-001']['kqi_alertes']
+
+    # Critère altéré dans l'état : repris tant que les faits de ST-001 ne changent pas ;
+    # empreinte effacée pour ST-002 : recalculé
+    state_path = output / 'scoring' / 'state.json'
+    state = json.loads(state_path.read_text(encoding='utf-8'))
+    state['evaluations']['ST-001']['record']['kqi_alertes'] = 99
+    state['evaluations']['ST-002']['digest'] = ''
+    state_path.write_text(json.dumps(state), encoding='utf-8')
+    capsys.readouterr()
+
+    score_risks.main(['--data-dir', str(output), '--date', '2024-06-30'])
+    total = len(state['evaluations'])
+    assert f"1 évaluation(s) recalculée(s) sur {total}" in capsys.readouterr().out
+    assert evaluations(output)['EVA-AUTO-ST-001']['kqi_alertes'] == '99'
+
+    score_risks.main(['--data-dir', str(output), '--date', '2024-06-30', '--full'])
+    assert f"{total} évaluation(s) recalculée(s) sur {total}" in capsys.readouterr().out
+    assert evaluations(output)['EVA-AUTO-ST-001']['kqi_alertes'] == expected
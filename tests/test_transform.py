@@ -0,0 +1,124 @@
+"""Transformation complète du jeu d'exemple : parallélisme, rejets et quarantaine"""
+
+import json
+
+import pytest
+
+from conftest import NODES_HEADER, append_rows, output_files, read_rows, run_transform
+
+
+def test_workers_match_sequential(inputs, tmp_path):
+    run_transform(inputs, tmp_path / 'sequentiel')
+    # Plages de quelques Ko : chaque fichier est découpé entre plusieurs processus
+    run_transform(inputs, tmp_path / 'parallele', '--workers', 3, settings={'CHUNK_MIN_BYTES': 1000})
+    assert output_files(tmp_path / 'parallele') == output_files(tmp_path / 'sequentiel')
+
+
+def test_bad_rows_are_rejected_with_line_and_reason(inputs, tmp_path):
+    with open(inputs / 'nodes.csv', encoding='utf-8') as f:
+        lines = sum(1 for _ in f)
+    append_rows(inputs / 'nodes.csv', [
+        ['Fournisseur', 'FRN-001', 'Type inconnu', '', '-', '', '', '', '{}'],
+        ['Audit', '', 'Sans identifiant', '', '-', '', '', '', '{}'],
+        ['Audit', 'AUD-999', 'Date impossible', '', '-', '31/02/2024', '', '', '{}'],
+    ])
+    run_transform(inputs, tmp_path / 'sortie')
+
+    rejected = read_rows(tmp_path / 'sortie' / 'rejets' / 'nodes.csv')
+    assert [row['ligne'] for row in rejected] == [str(lines + 1), str(lines + 2), str(lines + 3)]
+    assert [row['raison'] for row in rejected] == ['type_noeud_inconnu', 'identifiant_vide', 'valeur_invalide']
+    assert rejected[0]['detail'] == 'Fournisseur'
+    assert rejected[2]['detail'].startswith("Audit.date_debut (DATE) : '31/02/2024'")
+    assert list(rejected[0])[3:] == NODES_HEADER
+    assert rejected[0]['Type_Noeud'] == 'Fournisseur'
+    assert 'AUD-999' not in {row['id'] for row in read_rows(tmp_path / 'sortie' / 'nodes' / 'Audit.csv')}
+
+    summary = json.loads((tmp_path / 'sortie' / 'rejets' / 'resume.json').read_text(encoding='utf-8'))
+    # Compteurs par code : leur nombre ne dépend pas des valeurs rejetées
+    assert summary['rejets']['nodes']['raisons'] == {'type_noeud_inconnu': 1, 'identifiant_vide': 1,
+                                                     'valeur_invalide': 1}
+
+
+@pytest.mark.parametrize('args, settings', [([], None), (['--workers', 3], {'CHUNK_MIN_BYTES': 1000})])
+def test_kqi_line_with_too_many_fields_keeps_its_content(inputs, tmp_path, args, settings):
+    append_rows(inputs / 'kqi.csv', [
+        ['KQI-EXTRA', 'ST-001', 'CRO', 'Délai', '2024-Q1', '12', '15', '10', 'Conforme', '→', 'en trop'],
+        ['KQI-APRES', 'ST-001', 'CRO', 'Délai', '2024-Q2', '11', '15', '10', 'Conforme', '→'],
+    ])
+    run_transform(inputs, tmp_path / 'sortie', *args, settings=settings)
+
+    rejected = read_rows(tmp_path / 'sortie' / 'rejets' / 'kqi.csv')
+    assert [(row['raison'], row['ID_KQI'], row['Tendance']) for row in rejected] == [
+        ('nombre_de_champs', 'KQI-EXTRA', '→')]
+    assert 'KQI-APRES' in {row['id'] for row in read_rows(tmp_path / 'sortie' / 'nodes' / 'KQI.csv')}
+
+
+def test_structured_relation_attribute_is_rejected(inputs, tmp_path):
+    append_rows(inputs / 'relations.csv', [
+        ['IMPLIQUE_ST', 'Étude Clinique', 'Sous-Traitant', 'ETU-2023-001', 'ST-005', '2023-06-01', 'Active',
+         '{"niveau": [2]}'],
+        ['IMPLIQUE_ST', 'Étude Clinique', 'Sous-Traitant', 'ETU-2023-001', 'ST-006', '2023-06-01', 'Active',
+         '{"niveau": 2, "via": {"id": "ST-004"}}'],
+    ])
+    run_transform(inputs, tmp_path / 'sortie')
+
+    rejected = read_rows(tmp_path / 'sortie' / 'rejets' / 'relations.csv')
+    assert [(row['Noeud_Cible'], row['raison']) for row in rejected] == [
+        ('ST-005', 'attributs_inexploitables'), ('ST-006', 'attributs_inexploitables')]
+
+
+def test_study_context_must_be_a_list_of_strings(inputs, tmp_path):
+    append_rows(inputs / 'relations.csv', [
+        ['EST_SOUS_TRAITANT_DE', 'Sous-Traitant', 'Sous-Traitant', 'ST-005', 'ST-001', '2023-06-01', 'Active',
+         '{"contexte_etudes": "ETU-2023-001"}'],
+        ['EST_SOUS_TRAITANT_DE', 'Sous-Traitant', 'Sous-Traitant', 'ST-006', 'ST-001', '2023-06-01', 'Active',
+         '{"contexte_etudes": ["ETU-2023-001", 2]}'],
+        ['EST_SOUS_TRAITANT_DE', 'Sous-Traitant', 'Sous-Traitant', 'ST-006', 'ST-002', '2023-06-01', 'Active',
+         '{"contexte_etudes": ["ETU-2023-001"]}'],
+    ])
+    run_transform(inputs, tmp_path / 'sortie')
+
+    rejected = read_rows(tmp_path / 'sortie' / 'rejets' / 'relations.csv')
+    assert [(row['Noeud_Source'], row['raison']) for row in rejected] == [
+        ('ST-005', 'valeur_invalide'), ('ST-006', 'valeur_invalide')]
+    links = read_rows(tmp_path / 'sortie' / 'relations' / 'EST_SOUS_TRAITANT_DE.csv')
+    assert {(row['from'], row['to']): row['contexte_etudes'] for row in links}[('ST-006', 'ST-002')] == \
+        '["ETU-2023-001"]'
+    assert (tmp_path / 'sortie' / 'import.kuzu').exists()
+
+
+def test_invalid_utf8_lines_are_rejected_and_reading_continues(inputs, tmp_path):
+    for name, marker in (('nodes.csv', b'\nSous-Traitant,ST-002,'), ('kqi.csv', b'\nKQI-002,')):
+        data = (inputs / name).read_bytes()
+        start = data.index(marker) + len(marker)
+        (inputs / name).write_bytes(data[:start] + b'\xff' + data[start:])
+    run_transform(inputs, tmp_path / 'sortie')
+
+    for name, column, rejected_id, kept_id in (('nodes', 'ID_Noeud', 'ST-002', 'ST-003'),
+                                               ('kqi', 'ID_KQI', 'KQI-002', 'KQI-003')):
+        rejected = read_rows(tmp_path / 'sortie' / 'rejets' / f'{name}.csv')
+        assert [(row[column], row['raison']) for row in rejected] == [(rejected_id, 'encodage_invalide')]
+    ids = {row['id'] for row in read_rows(tmp_path / 'sortie' / 'nodes' / 'SousTraitant.csv')}
+    assert 'ST-002' not in ids and 'ST-003' in ids
+    ids = {row['id'] for row in read_rows(tmp_path / 'sortie' / 'nodes' / 'KQI.csv')}
+    assert 'KQI-002' not in ids and 'KQI-003' in ids
+
+
+def test_reject_budget_fails_the_run(inputs, tmp_path):
+    append_rows(inputs / 'nodes.csv', [['Fournisseur', f'FRN-{n}', '', '', '-', '', '', '', '{}']
+                                       for n in range(50)])
+    result = run_transform(inputs, tmp_path / 'sortie', '--max-rejets', 5, check=False)
+    assert result.returncode != 0
+    assert not (tmp_path / 'sortie' / 'import.kuzu').exists()
+
+
+def test_dangling_relation_goes_to_quarantine(inputs, tmp_path):
+    append_rows(inputs / 'relations.csv', [
+        ['EST_LIE_AU_CONTRAT', 'Sous-Traitant', 'Contrat', 'ST-404', 'CTR-001', '2024-01-01', 'Active', '{}'],
+    ])
+    run_transform(inputs, tmp_path / 'sortie')
+
+    quarantined = read_rows(tmp_path / 'sortie' / 'quarantine' / 'EST_LIE_AU_CONTRAT.csv')
+    assert [(row['from'], row['raison']) for row in quarantined] == [('ST-404', 'source ST-404 inconnue')]
+    links = read_rows(tmp_path / 'sortie' / 'relations' / 'EST_LIE_AU_CONTRAT.csv')
+    assert 'ST-404' not in {row['from'] for row in links}
@@ -0,0 +1,23 @@
+"""Périodes de validité des versions de contrats et accords qualité"""
+
+from conftest import append_rows, read_rows, run_transform
+
+
+def test_successor_on_start_date_does_not_invert_the_interval(inputs, tmp_path):
+    # CTR-004 débute le 2024-01-01 et serait remplacé le jour même
+    append_rows(inputs / 'nodes.csv', [
+        ['Contrat', 'CTR-004-v3', 'Logistics Services - Delta (v3)', 'Actif', '-', '2024-01-01', '', '', '{}'],
+    ])
+    append_rows(inputs / 'relations.csv', [
+        ['A_VERSION_SUIVANTE', 'Contrat', 'Contrat', 'CTR-004', 'CTR-004-v3', '2024-01-01', 'Active', '{}'],
+    ])
+    run_transform(inputs, tmp_path / 'sortie')
+
+    contracts = {row['id']: row for row in read_rows(tmp_path / 'sortie' / 'nodes' / 'Contrat.csv')}
+    assert (contracts['CTR-004']['valide_du'], contracts['CTR-004']['valide_au']) == ('2024-01-01', '2024-01-01')
+    assert contracts['CTR-004']['version_courante'] == 'false'
+    assert contracts['CTR-004-v3']['version_racine'] == 'CTR-004-v1'
+    assert all(row['valide_au'] == '' or row['valide_du'] <= row['valide_au'] for row in contracts.values())
+
+    links = read_rows(tmp_path / 'sortie' / 'relations' / 'EST_LIE_AU_CONTRAT.csv')
+    assert all(row['valide_au'] == '' or row['valide_du'] <= row['valide_au'] for row in links)
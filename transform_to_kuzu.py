@@ -4,35 +4,237 @@ KG-Oversight - Transformation CSV vers format Kuzu
 Génère des fichiers CSV séparés par type de nœud et de relation
 """
 
+import argparse
+import codecs
+import contextlib
+import cProfile
 import csv
+import functools
+import gzip
+import hashlib
+import io
 import json
+import mmap
 import os
-from datetime import datetime
+import pickle
+import re
+import shutil
+import sys
+import time
+import tracemalloc
+import warnings
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = pd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 INPUT_NODES = '/mnt/user-data/uploads/nodes.csv'
 INPUT_RELATIONS = '/mnt/user-data/uploads/relations.csv'
 INPUT_KQI = '/mnt/user-data/uploads/kqi.csv'
 OUTPUT_DIR = '/home/claude/kuzu_data'
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.kuzu')
 
-# Mapping des types de nœuds vers les noms de fichiers
-NODE_TYPE_MAP = {
-    'Sous-Traitant': 'SousTraitant',
-    'Contrat': 'Contrat',
-    'Accord Qualité': 'AccordQualite',
-    'Audit': 'Audit',
-    'Inspection': 'Inspection',
-    'Finding': 'Finding',
-    'Événement Qualité': 'EvenementQualite',
-    'Décision': 'Decision',
-    'Évaluation Risque': 'EvaluationRisque',
-    'Réunion Qualité': 'ReunionQualite',
-    'Étude Clinique': 'EtudeClinique',
-    'Domaine de Service': 'DomaineService',
-    'Contexte Réglementaire': 'ContexteReglementaire',
-    'Alerte': 'Alerte',
-    'Événement': 'Evenement'
+# Mode parallèle : taille minimale d'une plage d'octets et plages par processus
+CHUNK_MIN_BYTES = 8 * 1024 * 1024
+CHUNKS_PER_WORKER = 4
+
+# Attributs JSON : nombre de valeurs distinctes gardées en cache
+JSON_CACHE_SIZE = 65536
+
+# KQI : périodes de la fenêtre glissante de la pente, lignes écrites par bloc
+KQI_TREND_WINDOW = 4
+KQI_WRITE_ROWS = 100_000
+
+# Chargement direct dans Kuzu : nombre de lignes par COPY
+KUZU_BATCH_ROWS = 100_000
+
+# Sortie Parquet : nombre de lignes par groupe de lignes
+PARQUET_ROW_GROUP = 100_000
+
+# Cache des lignes produites par fichier d'entrée (activé par --cache)
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'kg-oversight')
+CACHE_MAX_MB = 2048
+CACHE_BLOCK_ROWS = 50_000
+
+# ============================================================================
+# SPÉCIFICATIONS DES NŒUDS
+# Une entrée par type : table Kuzu + colonnes dans l'ordre de schema.kuzu.
+# Chaque spécification est compilée une fois en fonction de projection.
+# ============================================================================
+
+def col(name):
+    """Colonne brute de nodes.csv"""
+    return ('col', name)
+
+def date_col(name):
+    """Colonne date de nodes.csv (convertie en DATE selon schema.kuzu)"""
+    return ('date', name)
+
+def attr(*keys, default='', within=None):
+    """Attribut JSON ; plusieurs clés sont essayées dans l'ordre"""
+    return ('attr', keys, default, within)
+
+def flag(key, within=None):
+    """Attribut JSON booléen, écrit 'true'/'false'"""
+    return ('flag', key, within)
+
+ID = col('ID_Noeud')
+NOM = col('Nom_Description')
+STATUT = col('Statut')
+CRITICITE = ('criticite', 'Criticite')  # '-' signifie non renseignée
+SOURCE = col('Source_Donnees')
+DEBUT = date_col('Date_Creation')
+FIN = date_col('Date_Fin')
+
+NODE_SPECS = {
+    'Sous-Traitant': ('SousTraitant', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_creation', DEBUT),
+        ('type_service', attr('type_service')),
+        ('pays', attr('pays')),
+        ('niveau_actuel', attr('niveau_actuel', default=1)),
+        ('source_donnees', SOURCE),
+    ]),
+    'Contrat': ('Contrat', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT),
+        ('date_debut', DEBUT), ('date_fin', FIN),
+        ('type_contrat', attr('type')),
+        ('montant_annuel', attr('montant_annuel')),
+        ('version', attr('version')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Accord Qualité': ('AccordQualite', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT),
+        ('date_debut', DEBUT), ('date_fin', FIN),
+        ('version', attr('version')),
+        ('revision_en_cours', flag('revision_en_cours')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Audit': ('Audit', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_debut', DEBUT), ('date_fin', FIN),
+        ('type_audit', attr('type')),
+        ('resultat', attr('resultat')),
+        ('declencheur', attr('declencheur')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Inspection': ('Inspection', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_debut', DEBUT), ('date_fin', FIN),
+        ('autorite', attr('autorite')),
+        ('type_inspection', attr('type')),
+        ('resultat', attr('resultat')),
+        ('nb_observations', attr('nb_observations')),
+        ('nb_critiques', attr('nb_critiques')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Finding': ('Finding', [
+        ('id', ID), ('description', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_detection', DEBUT), ('date_cloture', FIN),
+        ('capa_id', attr('capa')),
+        ('concerne_st2', attr('concerne_st2')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Événement Qualité': ('EvenementQualite', [
+        ('id', ID), ('description', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_creation', DEBUT), ('date_cloture', FIN),
+        ('impact', attr('impact')),
+        ('nb_echantillons_impactes', attr('nb_echantillons_impactes')),
+        ('retard_jours', attr('retard_jours')),
+        ('nb_erreurs', attr('nb_erreurs')),
+        ('delai_detection_mois', attr('delai_detection_mois')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Décision': ('Decision', [
+        ('id', ID), ('description', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_decision', DEBUT),
+        ('decideur', attr('decideur')),
+        ('nature', attr('nature')),
+        ('duree_mois', attr('duree_mois')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Évaluation Risque': ('EvaluationRisque', [
+        ('id', ID), ('description', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_evaluation', DEBUT),
+        ('score', attr('score')),
+        ('evolution', attr('evolution')),
+        ('findings_critiques', attr('findings_critiques', within='criteres')),
+        ('qe_critiques', attr('qe_critiques', within='criteres')),
+        ('kqi_alertes', attr('kqi_alertes', within='criteres')),
+        ('inspection_recente', flag('inspection_recente', within='criteres')),
+        ('audit_for_cause', flag('audit_for_cause', within='criteres')),
+        ('prochaine_evaluation', attr('prochaine')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Réunion Qualité': ('ReunionQualite', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_reunion', DEBUT),
+        ('trimestre', attr('trimestre')),
+        ('semestre', attr('semestre')),
+        ('periodicite', attr('periodicite')),
+        ('motif', attr('motif')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Étude Clinique': ('EtudeClinique', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_debut', DEBUT), ('date_fin', FIN),
+        ('phase', attr('phase')),
+        ('indication', attr('indication')),
+        ('nb_patients', attr('nb_patients')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Domaine de Service': ('DomaineService', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_creation', DEBUT),
+        ('categorie', attr('categorie')),
+        ('complexite', attr('complexite')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Contexte Réglementaire': ('ContexteReglementaire', [
+        ('id', ID), ('nom', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_application', DEBUT),
+        ('reference', attr('reference')),
+        ('impact', attr('impact')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Alerte': ('Alerte', [
+        ('id', ID), ('description', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_creation', DEBUT), ('date_resolution', FIN),
+        ('niveau', attr('niveau')),
+        ('regle_id', attr('regle')),
+        ('declencheur', attr('declencheur')),
+        ('st_concerne', attr('st_concerne')),
+        ('source_donnees', SOURCE),
+    ]),
+    'Événement': ('Evenement', [
+        ('id', ID), ('description', NOM), ('statut', STATUT), ('criticite', CRITICITE),
+        ('date_creation', DEBUT), ('date_cloture', FIN),
+        ('type_evenement', attr('type')),
+        ('source', attr('source', 'demandeur', 'client')),
+        ('impact', attr('impact', 'contexte')),
+        ('source_donnees', SOURCE),
+    ]),
 }
 
+# Mapping des types de nœuds vers les noms de fichiers
+NODE_TYPE_MAP = {node_type: spec[0] for node_type, spec in NODE_SPECS.items()}
+
 # Mapping des types de relations vers les noms de fichiers
 REL_TYPE_MAP = {
     'EST_LIE_AU_CONTRAT': 'EST_LIE_AU_CONTRAT',
@@ -55,309 +257,1436 @@ REL_TYPE_MAP = {
     'IMPLIQUE_ST': 'IMPLIQUE_ST'
 }
 
-def parse_json_safe(json_str):
-    """Parse JSON en gérant les cas vides ou malformés"""
+# Nombre de lignes dont les attributs JSON n'ont pas pu être lus, par type
+JSON_ERRORS = {}
+
+@functools.lru_cache(maxsize=JSON_CACHE_SIZE)
+def _decode_attributes(json_str):
+    """Décode un objet JSON d'attributs, None s'il est illisible.
+
+    Les exports doublent parfois les guillemets ; la version dédoublée n'est
+    essayée en premier que si la chaîne en contient. Le résultat est partagé
+    entre les lignes identiques et ne doit pas être modifié.
+    """
+    candidates = (json_str.replace('""', '"'), json_str) if '""' in json_str else (json_str,)
+    for candidate in candidates:
+        try:
+            value = _json_loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+def parse_json_safe(json_str, source=None):
+    """Parse JSON en gérant les cas vides ou malformés (comptés par type dans JSON_ERRORS)"""
     if not json_str or json_str == '{}':
         return {}
-    try:
-        return json.loads(json_str.replace('""', '"'))
-    except:
+    if METRICS is None:
+        attrs = _decode_attributes(json_str)
+    else:
+        start = time.perf_counter()
+        attrs = _decode_attributes(json_str)
+        METRICS.add_time('json_seconds', time.perf_counter() - start)
+    if attrs is None:
+        JSON_ERRORS[source] = JSON_ERRORS.get(source, 0) + 1
         return {}
+    return attrs
+
+def report_json_errors():
+    """Signale les attributs JSON illisibles, remplacés par des attributs vides"""
+    if not JSON_ERRORS:
+        return
+    total = sum(JSON_ERRORS.values())
+    details = ', '.join(f"{name} ({count})" for name, count in sorted(JSON_ERRORS.items(), key=str))
+    print(f"\n⚠ {total} ligne(s) aux attributs JSON illisibles, importées sans attributs : {details}")
+
+def load_schema(path=None):
+    """Lit les CREATE NODE/REL TABLE de schema.kuzu.
+
+    Retourne {table: {'kind': 'node'|'rel', 'from', 'to', 'columns': [(nom, type)]}}
+    dans l'ordre du fichier.
+    """
+    with open(path or SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        ddl = re.sub(r'--[^\n]*', '', f.read())
+    
+    schema = {}
+    for kind, table, body in re.findall(r'CREATE\s+(NODE|REL)\s+TABLE\s+(\w+)\s*\((.*?)\);', ddl, re.S):
+        entry = {'kind': kind.lower(), 'from': None, 'to': None, 'columns': []}
+        for item in body.split(','):
+            words = item.split()
+            if not words:
+                continue
+            if words[0] == 'FROM':
+                entry['from'], entry['to'] = words[1], words[3]
+            elif words[0] != 'PRIMARY':
+                entry['columns'].append((words[0], words[1]))
+        schema[table] = entry
+    return schema
+
+def check_node_specs(schema):
+    """Vérifie que chaque spécification suit les colonnes de sa table dans schema.kuzu"""
+    for node_type, (table, columns) in NODE_SPECS.items():
+        if table not in schema:
+            raise ValueError(f"Table {table} ({node_type}) absente de {SCHEMA_FILE}")
+        expected = [name for name, _ in schema[table]['columns']]
+        # Les colonnes de validité des versions sont ajoutées par VersionedSink
+        actual = [name for name, _ in columns] + (VERSION_COLUMNS if table in ('Contrat', 'AccordQualite') else [])
+        if actual != expected:
+            raise ValueError(f"Colonnes de {table} différentes du schéma : {actual} != {expected}")
+
+# ============================================================================
+# CONVERSION DES VALEURS (types de schema.kuzu)
+# Chaque colonne non STRING reçoit une fonction de conversion compilée une
+# fois : dates aux formats reçus vers DATE, entiers bornés, décimaux,
+# booléens. Les résultats sont mis en cache par colonne (valeurs très
+# répétées) ; une valeur invalide lève ValueError avec table et colonne, et
+# sa ligne part dans les rejets au lieu de faire échouer le COPY.
+# ============================================================================
+
+COERCE_CACHE_SIZE = 16_384
 
-def format_date(date_str):
-    """Formate une date pour Kuzu (YYYY-MM-DD)"""
-    if not date_str:
+# Formats de date reçus en plus du format ISO (AAAA-MM-JJ, AAAAMMJJ)
+DATE_FORMATS = [
+    (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})[T ]'), 'ymd'),        # horodatage ISO
+    (re.compile(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})$'), 'dmy'),   # JJ/MM/AAAA, JJ.MM.AAAA
+    (re.compile(r'(\d{4})/(\d{1,2})/(\d{1,2})$'), 'ymd'),           # AAAA/MM/JJ
+]
+
+BOOLEAN_VALUES = {
+    'true': 'true', 'vrai': 'true', 'oui': 'true', 'yes': 'true', '1': 'true',
+    'false': 'false', 'faux': 'false', 'non': 'false', 'no': 'false', '0': 'false',
+}
+
+def parse_date(value):
+    """Date d'une valeur ISO, horodatage ISO, JJ/MM/AAAA ou AAAA/MM/JJ"""
+    text = value.strip()
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for pattern, order in DATE_FORMATS:
+        match = pattern.match(text)
+        if match:
+            first, second, third = map(int, match.groups())
+            return date(first, second, third) if order == 'ymd' else date(third, second, first)
+    raise ValueError("format de date non reconnu")
+
+def _to_date(value):
+    return value if isinstance(value, date) else parse_date(str(value))
+
+def _integral(number):
+    if not number.is_integer():
+        raise ValueError("nombre non entier")
+    return int(number)
+
+def _to_int(bits):
+    bound = 1 << (bits - 1)
+    
+    def convert(value):
+        if isinstance(value, bool):
+            raise ValueError("booléen au lieu d'un entier")
+        if isinstance(value, str):
+            text = value.strip()
+            number = int(text) if text.lstrip('+-').isdigit() else _integral(float(text.replace(',', '.')))
+        elif isinstance(value, float):
+            number = _integral(value)
+        else:
+            number = int(value)
+        if not -bound <= number < bound:
+            raise ValueError(f"hors de l'intervalle INT{bits}")
+        return number
+    return convert
+
+def _to_double(value):
+    if isinstance(value, bool):
+        raise ValueError("booléen au lieu d'un nombre")
+    if isinstance(value, str):
+        return float(value.strip().replace(',', '.'))
+    return float(value)
+
+def _to_boolean(value):
+    """'true' ou 'false', comme les attributs booléens déjà produits"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    result = BOOLEAN_VALUES.get(str(value).strip().lower())
+    if result is None:
+        raise ValueError("booléen attendu")
+    return result
+
+def _to_string_list(value):
+    """Liste JSON de chaînes (texte ou liste), réécrite comme les listes déjà produites ; null reste vide"""
+    items = json.loads(value) if isinstance(value, str) else value
+    if items is None:
         return ''
-    return date_str
+    if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+        raise ValueError("liste de chaînes attendue")
+    return json.dumps(items)
 
-def process_nodes():
-    """Traite le fichier nodes.csv et génère un CSV par type"""
-    nodes_by_type = {}
+COERCERS = {
+    'DATE': _to_date,
+    'INT8': _to_int(8),
+    'INT16': _to_int(16),
+    'INT32': _to_int(32),
+    'INT64': _to_int(64),
+    'DOUBLE': _to_double,
+    'FLOAT': _to_double,
+    'BOOLEAN': _to_boolean,
+    'STRING[]': _to_string_list,
+}
+
+def column_coercer(table, column, kuzu_type):
+    """Conversion d'une colonne ('' reste vide), avec cache des valeurs déjà vues"""
+    convert = COERCERS[kuzu_type]
     
-    with open(INPUT_NODES, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            node_type = row['Type_Noeud']
-            if node_type not in nodes_by_type:
-                nodes_by_type[node_type] = []
-            
-            attrs = parse_json_safe(row['Attributs_JSON'])
-            
-            # Créer l'enregistrement selon le type
-            if node_type == 'Sous-Traitant':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_creation': format_date(row['Date_Creation']),
-                    'type_service': attrs.get('type_service', ''),
-                    'pays': attrs.get('pays', ''),
-                    'niveau_actuel': attrs.get('niveau_actuel', 1),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Contrat':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'date_debut': format_date(row['Date_Creation']),
-                    'date_fin': format_date(row['Date_Fin']),
-                    'type_contrat': attrs.get('type', ''),
-                    'montant_annuel': attrs.get('montant_annuel', ''),
-                    'version': attrs.get('version', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Accord Qualité':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'date_debut': format_date(row['Date_Creation']),
-                    'date_fin': format_date(row['Date_Fin']),
-                    'version': attrs.get('version', ''),
-                    'revision_en_cours': str(attrs.get('revision_en_cours', False)).lower(),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Audit':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_debut': format_date(row['Date_Creation']),
-                    'date_fin': format_date(row['Date_Fin']),
-                    'type_audit': attrs.get('type', ''),
-                    'resultat': attrs.get('resultat', ''),
-                    'declencheur': attrs.get('declencheur', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Inspection':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_debut': format_date(row['Date_Creation']),
-                    'date_fin': format_date(row['Date_Fin']),
-                    'autorite': attrs.get('autorite', ''),
-                    'type_inspection': attrs.get('type', ''),
-                    'resultat': attrs.get('resultat', ''),
-                    'nb_observations': attrs.get('nb_observations', ''),
-                    'nb_critiques': attrs.get('nb_critiques', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Finding':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'description': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_detection': format_date(row['Date_Creation']),
-                    'date_cloture': format_date(row['Date_Fin']),
-                    'capa_id': attrs.get('capa', ''),
-                    'concerne_st2': attrs.get('concerne_st2', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Événement Qualité':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'description': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_creation': format_date(row['Date_Creation']),
-                    'date_cloture': format_date(row['Date_Fin']),
-                    'impact': attrs.get('impact', ''),
-                    'nb_echantillons_impactes': attrs.get('nb_echantillons_impactes', ''),
-                    'retard_jours': attrs.get('retard_jours', ''),
-                    'nb_erreurs': attrs.get('nb_erreurs', ''),
-                    'delai_detection_mois': attrs.get('delai_detection_mois', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Décision':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'description': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_decision': format_date(row['Date_Creation']),
-                    'decideur': attrs.get('decideur', ''),
-                    'nature': attrs.get('nature', ''),
-                    'duree_mois': attrs.get('duree_mois', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Évaluation Risque':
-                criteres = attrs.get('criteres', {})
-                record = {
-                    'id': row['ID_Noeud'],
-                    'description': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_evaluation': format_date(row['Date_Creation']),
-                    'score': attrs.get('score', ''),
-                    'evolution': attrs.get('evolution', ''),
-                    'findings_critiques': criteres.get('findings_critiques', ''),
-                    'qe_critiques': criteres.get('qe_critiques', ''),
-                    'kqi_alertes': criteres.get('kqi_alertes', ''),
-                    'inspection_recente': str(criteres.get('inspection_recente', False)).lower(),
-                    'audit_for_cause': str(criteres.get('audit_for_cause', False)).lower(),
-                    'prochaine_evaluation': attrs.get('prochaine', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Réunion Qualité':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_reunion': format_date(row['Date_Creation']),
-                    'trimestre': attrs.get('trimestre', ''),
-                    'semestre': attrs.get('semestre', ''),
-                    'periodicite': attrs.get('periodicite', ''),
-                    'motif': attrs.get('motif', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Étude Clinique':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_debut': format_date(row['Date_Creation']),
-                    'date_fin': format_date(row['Date_Fin']),
-                    'phase': attrs.get('phase', ''),
-                    'indication': attrs.get('indication', ''),
-                    'nb_patients': attrs.get('nb_patients', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Domaine de Service':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_creation': format_date(row['Date_Creation']),
-                    'categorie': attrs.get('categorie', ''),
-                    'complexite': attrs.get('complexite', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Contexte Réglementaire':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'nom': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_application': format_date(row['Date_Creation']),
-                    'reference': attrs.get('reference', ''),
-                    'impact': attrs.get('impact', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Alerte':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'description': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_creation': format_date(row['Date_Creation']),
-                    'date_resolution': format_date(row['Date_Fin']),
-                    'niveau': attrs.get('niveau', ''),
-                    'regle_id': attrs.get('regle', ''),
-                    'declencheur': attrs.get('declencheur', ''),
-                    'st_concerne': attrs.get('st_concerne', ''),
-                    'source_donnees': row['Source_Donnees']
-                }
-            elif node_type == 'Événement':
-                record = {
-                    'id': row['ID_Noeud'],
-                    'description': row['Nom_Description'],
-                    'statut': row['Statut'],
-                    'criticite': row['Criticite'] if row['Criticite'] != '-' else '',
-                    'date_creation': format_date(row['Date_Creation']),
-                    'date_cloture': format_date(row['Date_Fin']),
-                    'type_evenement': attrs.get('type', ''),
-                    'source': attrs.get('source', attrs.get('demandeur', attrs.get('client', ''))),
-                    'impact': attrs.get('impact', attrs.get('contexte', '')),
-                    'source_donnees': row['Source_Donnees']
-                }
+    # typed : 1, 1.0 et True restent des entrées distinctes du cache
+    @functools.lru_cache(maxsize=COERCE_CACHE_SIZE, typed=True)
+    def coerce(value):
+        if value == '' or value is None:
+            return ''
+        try:
+            return convert(value)
+        except (TypeError, ValueError) as error:
+            raise ValueError(f"{table}.{column} ({kuzu_type}) : {value!r} ({error})") from None
+    return coerce
+
+@functools.lru_cache(maxsize=None)
+def column_coercers(table):
+    """{colonne: conversion} des colonnes typées d'une table de schema.kuzu"""
+    entry = load_schema().get(table)
+    if entry is None:
+        return {}
+    return {column: column_coercer(table, column, kuzu_type)
+            for column, kuzu_type in entry['columns'] if kuzu_type in COERCERS}
+
+def compile_node_spec(table, columns, header):
+    """Compile une spécification en projection (ligne, attributs) -> tuple.
+
+    Les index de colonnes et les clés JSON sont résolus une fois pour toutes :
+    la fonction générée ne construit aucun dictionnaire par ligne.
+    """
+    index = {name: i for i, name in enumerate(header)}
+    coercers = column_coercers(table)
+    scopes = {}
+    prelude = []
+    exprs = []
+    for _, source in columns:
+        kind = source[0]
+        if kind in ('col', 'date', 'criticite'):
+            i = index[source[1]]
+            if kind == 'criticite':
+                exprs.append(f"('' if r[{i}] == '-' else r[{i}])")
             else:
-                print(f"Type inconnu: {node_type}")
+                exprs.append(f'r[{i}]')
+            continue
+        
+        within = source[-1]
+        obj = 'a'
+        if within:
+            if within not in scopes:
+                scopes[within] = f'w{len(scopes)}'
+                prelude.append(f'{scopes[within]} = a.get({within!r}, {{}})')
+            obj = scopes[within]
+        
+        if kind == 'attr':
+            _, keys, default, _ = source
+            expr = repr(default)
+            for key in reversed(keys):
+                expr = f'{obj}.get({key!r}, {expr})'
+            exprs.append(expr)
+        else:
+            exprs.append(f'str({obj}.get({source[1]!r}, False)).lower()')
+    
+    # Conversion selon le type de la colonne dans schema.kuzu
+    namespace = {}
+    for position, (name, _) in enumerate(columns):
+        if name in coercers:
+            namespace[f'c{position}'] = coercers[name]
+            exprs[position] = f'c{position}({exprs[position]})'
+    
+    code = f'def project_{table}(r, a):\n'
+    code += ''.join(f'    {line}\n' for line in prelude)
+    code += f'    return ({", ".join(exprs)},)\n'
+    exec(compile(code, f'<spec {table}>', 'exec'), namespace)
+    return namespace[f'project_{table}']
+
+def compile_node_specs(header):
+    """Compile toutes les spécifications pour l'en-tête de nodes.csv"""
+    return {
+        node_type: (table, [name for name, _ in columns], compile_node_spec(table, columns, header))
+        for node_type, (table, columns) in NODE_SPECS.items()
+    }
+
+class TypeWriters:
+    """Écrit les enregistrements au fil de la lecture : un CSV ouvert par type de sortie.
+
+    La mémoire reste constante quelle que soit la taille de l'export, seuls
+    les writers et les compteurs sont conservés.
+    """
+
+    def __init__(self, directory, header=True):
+        self.directory = directory
+        self.header = header
+        self.files = {}
+        self.writers = {}
+        self.fieldnames = {}
+        self.counts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(report=exc_type is None)
+
+    def write_row(self, name, fieldnames, row):
+        """Écrit une ligne déjà ordonnée selon fieldnames"""
+        writer = self.writers.get(name)
+        if writer is None:
+            if not self.files:
+                os.makedirs(self.directory, exist_ok=True)
+            filepath = os.path.join(self.directory, f'{name}.csv')
+            f = open(filepath, 'w', encoding='utf-8', newline='')
+            writer = csv.writer(f)
+            if self.header:
+                writer.writerow(fieldnames)
+            self.files[name] = f
+            self.writers[name] = writer
+            self.fieldnames[name] = list(fieldnames)
+            self.counts[name] = 0
+        writer.writerow(row)
+        self.counts[name] += 1
+
+    def write(self, name, record):
+        """Écrit un dictionnaire ; les colonnes sont fixées par le premier du type"""
+        fieldnames = self.fieldnames.get(name) or list(record)
+        self.write_row(name, fieldnames, [record.get(field, '') for field in fieldnames])
+
+    def close(self, report=True):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        if report:
+            for name, count in self.counts.items():
+                filepath = os.path.join(self.directory, f'{name}.csv')
+                print(f"✓ {filepath} ({count} enregistrements)")
+
+    def summary(self):
+        """(nom, colonnes, nombre de lignes) par type, dans l'ordre d'apparition"""
+        return [(name, self.fieldnames[name], count) for name, count in self.counts.items()]
+
+# ============================================================================
+# MÉTRIQUES (--metrics)
+# Temps réel et CPU par étape, dont le temps passé à décoder les attributs
+# JSON et à écrire les enregistrements ; lignes produites par type ; octets
+# lus et produits. Sans --metrics, METRICS reste None et rien n'est mesuré.
+# ============================================================================
+
+METRICS = None
+
+class Metrics:
+    """Mesures d'une exécution, exportées en JSON ou au format textfile Prometheus"""
+
+    TIMES = {
+        'wall_seconds': "Durée réelle par étape",
+        'cpu_seconds': "Temps CPU par étape",
+        'json_seconds': "Temps de décodage des attributs JSON par étape",
+        'write_seconds': "Temps d'écriture des enregistrements par étape",
+    }
+
+    def __init__(self):
+        self.started = time.time()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.current = None
+        self.stages = {}
+        self.rows = {'nodes': {}, 'relations': {}}
+        self.bytes_read = {}
+        self.output_bytes = 0
+        self.memory = None
+        self.success = False
+
+    def entry(self, name):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = dict.fromkeys(self.TIMES, 0.0)
+        return entry
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Chronomètre une étape ; les temps JSON et écriture lui sont imputés"""
+        previous, self.current = self.current, name
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry = self.entry(name)
+            entry['wall_seconds'] += time.perf_counter() - wall
+            entry['cpu_seconds'] += time.process_time() - cpu
+            self.current = previous
+
+    def add_time(self, field, seconds):
+        self.entry(self.current or 'autre')[field] += seconds
+
+    def add_rows(self, subdir, counts):
+        rows = self.rows[subdir]
+        for name, count in counts.items():
+            rows[name] = rows.get(name, 0) + count
+
+    def merge(self, other):
+        """Ajoute les mesures d'un processus de travail (temps cumulés par processus)"""
+        for name, times in other['stages'].items():
+            entry = self.entry(name)
+            for field, seconds in times.items():
+                entry[field] += seconds
+        for subdir, counts in other['rows'].items():
+            self.add_rows(subdir, counts)
+
+    def to_dict(self):
+        return {
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'success': self.success,
+            'wall_seconds': time.perf_counter() - self.wall,
+            'cpu_seconds': time.process_time() - self.cpu,
+            'stages': self.stages,
+            'rows': self.rows,
+            'bytes_read': self.bytes_read,
+            'output_bytes': self.output_bytes,
+            'json_errors': {str(name): count for name, count in JSON_ERRORS.items()},
+            'quarantined': dict(QUARANTINED),
+            'rows_read': dict(ROWS_READ),
+            'rejected': {kind: sum(reasons.values()) for kind, reasons in REJECTED.items()},
+            'memory': self.memory,
+        }
+
+    def to_prometheus(self):
+        data = self.to_dict()
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f'# HELP kg_transform_{name} {help_text}')
+            lines.append(f'# TYPE kg_transform_{name} gauge')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f'kg_transform_{name}{{{label_text}}} {value}' if label_text
+                             else f'kg_transform_{name} {value}')
+
+        metric('success', "1 si la dernière exécution a abouti", [({}, int(data['success']))])
+        metric('last_run_timestamp_seconds', "Début de la dernière exécution", [({}, self.started)])
+        metric('wall_seconds', "Durée totale", [({}, data['wall_seconds'])])
+        metric('cpu_seconds', "Temps CPU du processus principal", [({}, data['cpu_seconds'])])
+        for field, help_text in self.TIMES.items():
+            metric(f'stage_{field}', help_text,
+                   [({'stage': name}, times[field]) for name, times in self.stages.items()])
+        metric('rows', "Lignes produites par table",
+               [({'kind': subdir, 'table': name}, count)
+                for subdir, counts in self.rows.items() for name, count in counts.items()])
+        metric('input_bytes', "Taille des fichiers d'entrée traités",
+               [({'input': kind}, size) for kind, size in self.bytes_read.items()])
+        metric('output_bytes', "Taille des fichiers produits", [({}, self.output_bytes)])
+        metric('json_errors', "Lignes aux attributs JSON illisibles",
+               [({'table': name}, count) for name, count in data['json_errors'].items()])
+        metric('quarantined', "Relations invalides mises en quarantaine",
+               [({'table': name}, count) for name, count in data['quarantined'].items()])
+        metric('input_rows', "Lignes lues par fichier d'entrée",
+               [({'input': kind}, count) for kind, count in data['rows_read'].items()])
+        metric('rejected', "Lignes d'entrée rejetées",
+               [({'input': kind}, count) for kind, count in data['rejected'].items()])
+        if self.memory:
+            metric('tracemalloc_peak_bytes', "Pic d'allocation Python (tracemalloc)",
+                   [({}, self.memory['peak_bytes'])])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Écrit les mesures (.prom : textfile Prometheus, sinon JSON) de façon atomique"""
+        if path.endswith('.prom'):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_dict(), indent=2, ensure_ascii=False) + '\n'
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+class MeteredSink:
+    """Destination (TypeWriters, KuzuLoader...) dont le temps d'écriture est mesuré"""
+
+    def __init__(self, sink, metrics):
+        self.sink = sink
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+    def write_row(self, name, fieldnames, row):
+        start = time.perf_counter()
+        self.sink.write_row(name, fieldnames, row)
+        self.metrics.add_time('write_seconds', time.perf_counter() - start)
+
+    def write(self, name, record):
+        start = time.perf_counter()
+        self.sink.write(name, record)
+        self.metrics.add_time('write_seconds', time.perf_counter() - start)
+
+    def close(self, report=True):
+        start = time.perf_counter()
+        self.sink.close(report)
+        self.metrics.add_time('write_seconds', time.perf_counter() - start)
+
+def stage(name):
+    """Chronomètre une étape quand --metrics est actif"""
+    return METRICS.stage(name) if METRICS is not None else contextlib.nullcontext()
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            total += os.path.getsize(os.path.join(root, filename))
+    return total
+
+# ============================================================================
+# INTÉGRITÉ RÉFÉRENTIELLE
+# Les identifiants de chaque nœud écrit sont indexés par table ; chaque
+# relation est ensuite contrôlée contre les tables FROM/TO de schema.kuzu.
+# Les relations invalides partent en quarantaine (un CSV par table, colonne
+# raison en plus) au lieu de faire échouer le COPY de l'import complet.
+# ============================================================================
+
+NODE_INDEX = None
+
+# Nombre de relations mises en quarantaine, par table
+QUARANTINED = {}
+
+class NodeIndex:
+    """Ensemble des identifiants de nœuds par table et extrémités attendues des relations"""
+
+    def __init__(self, schema):
+        self.ids = {}
+        self.endpoints = {name: (entry['from'], entry['to'])
+                          for name, entry in schema.items() if entry['kind'] == 'rel'}
+        # Attributs de relation qui référencent un nœud (IMPLIQUE_ST.via) : {table: [(colonne, table visée)]}
+        self.references = {}
+        for (name, column), table in REFERENCE_COLUMNS.items():
+            if name in self.endpoints:
+                self.references.setdefault(name, []).append((column, table))
+
+    def add(self, table, node_id):
+        ids = self.ids.get(table)
+        if ids is None:
+            ids = self.ids[table] = set()
+        ids.add(sys.intern(node_id))
+
+    def update(self, ids):
+        for table, table_ids in ids.items():
+            self.ids.setdefault(table, set()).update(table_ids)
+
+    def locate(self, node_id):
+        return next((table for table, ids in self.ids.items() if node_id in ids), None)
+
+    def check(self, name, source, target, record=None):
+        """Raison du rejet d'une relation, None si elle est valide"""
+        endpoints = self.endpoints.get(name)
+        if endpoints is None:
+            return "table absente de schema.kuzu"
+        for role, node_id, table in (('source', source, endpoints[0]), ('cible', target, endpoints[1])):
+            if node_id in self.ids.get(table, ()):
                 continue
-            
-            nodes_by_type[node_type].append(record)
+            actual = self.locate(node_id)
+            if actual is None:
+                return f"{role} {node_id} inconnue"
+            return f"{role} {node_id} de type {actual} au lieu de {table}"
+        for column, table in self.references.get(name, ()):
+            node_id = record.get(column) if record is not None else None
+            if node_id and node_id not in self.ids.get(table, ()):
+                return f"{column} {node_id} inconnu"
+        return None
+
+class IndexedNodes:
+    """Destination de nœuds qui enregistre l'identifiant de chaque ligne écrite"""
+
+    def __init__(self, sink, index):
+        self.sink = sink
+        self.index = index
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+    def write_row(self, name, fieldnames, row):
+        self.index.add(name, row[0])
+        self.sink.write_row(name, fieldnames, row)
+
+    def write(self, name, record):
+        self.index.add(name, record['id'])
+        self.sink.write(name, record)
+
+    def close(self, report=True):
+        self.sink.close(report)
+
+class CheckedRelations:
+    """Destination de relations qui détourne les arêtes invalides vers la quarantaine"""
+
+    def __init__(self, sink, index, quarantine):
+        self.sink = sink
+        self.index = index
+        self.quarantine = quarantine
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+    def write_row(self, name, fieldnames, row):
+        self.write(name, dict(zip(fieldnames, row)))
+
+    def write(self, name, record):
+        reason = self.index.check(name, record['from'], record['to'], record)
+        if reason is None:
+            self.sink.write(name, record)
+            return
+        QUARANTINED[name] = QUARANTINED.get(name, 0) + 1
+        self.quarantine.write(name, {**record, 'raison': reason})
+
+    def close(self, report=True):
+        self.sink.close(report)
+        self.quarantine.close(report=False)
+
+def checked_outputs(nodes_out, relations_out, quarantine_dir, header=True):
+    """Ajoute l'indexation des nœuds et le contrôle des relations quand NODE_INDEX est actif"""
+    if NODE_INDEX is None:
+        return nodes_out, relations_out
+    return (IndexedNodes(nodes_out, NODE_INDEX),
+            CheckedRelations(relations_out, NODE_INDEX, TypeWriters(quarantine_dir, header)))
+
+def report_quarantine(directory):
+    """Signale les relations mises en quarantaine"""
+    if not QUARANTINED:
+        return
+    total = sum(QUARANTINED.values())
+    details = ', '.join(f"{name} ({count})" for name, count in sorted(QUARANTINED.items()))
+    print(f"\n⚠ {total} relation(s) invalide(s) écartée(s) de l'import : {details}")
+    print(f"   Détail et raison dans {directory}")
+
+# ============================================================================
+# LIGNES REJETÉES
+# Une ligne d'entrée inexploitable (type inconnu, identifiant vide, colonne
+# obligatoire absente, enregistrement CSV illisible...) n'interrompt plus
+# l'exécution : elle est copiée dans rejets/<entrée>.csv avec son numéro de
+# ligne, un code de raison fixe (REJECT_REASONS) et le détail (valeur en
+# cause). --max-rejets fixe la part de lignes écartées (rejets
+# et relations en quarantaine) au-delà de laquelle l'exécution échoue ;
+# rejets/resume.json récapitule chaque exécution.
+# ============================================================================
+
+REJECTS = None
+
+# Lignes lues par entrée et lignes rejetées par entrée et par code de raison
+ROWS_READ = {}
+REJECTED = {}
+
+# Codes des raisons de rejet (nombre fini : resume.json reste borné) et libellés
+REJECT_REASONS = {
+    'enregistrement_illisible': "enregistrement CSV illisible",
+    'encodage_invalide': "octets non UTF-8",
+    'colonnes_absentes': "colonne(s) obligatoire(s) absente(s)",
+    'nombre_de_champs': "nombre de champs incorrect",
+    'type_noeud_inconnu': "type de nœud inconnu",
+    'identifiant_vide': "identifiant vide",
+    'valeur_invalide': "valeur invalide",
+    'attributs_inexploitables': "attributs inexploitables",
+    'extremite_vide': "extrémité vide",
+    'type_relation_inconnu': "type de relation inconnu",
+    'cible_inattendue': "type de cible inattendu pour la relation",
+}
+
+REJECTS_SUMMARY = 'resume.json'
+
+# Colonnes sans lesquelles aucune ligne d'une entrée n'est exploitable
+REQUIRED_COLUMNS = {
+    'nodes': ['Type_Noeud', 'ID_Noeud'],
+    'relations': ['Type_Relation', 'Type_Noeud_Source', 'Type_Noeud_Cible', 'Noeud_Source', 'Noeud_Cible'],
+    'kqi': ['ID_KQI', 'ID_SousTraitant'],
+}
+
+def optional_columns(kind):
+    """Colonnes lues dans une entrée qui, absentes, sont lues comme vides"""
+    if kind == 'nodes':
+        columns = {source[1] for _, columns in NODE_SPECS.values() for _, source in columns
+                   if source[0] in ('col', 'date', 'criticite')}
+        return sorted(columns - set(REQUIRED_COLUMNS['nodes'])) + ['Attributs_JSON']
+    if kind == 'relations':
+        return ['Date_Lien', 'Attributs']
+    return [column for column in KQI_COLUMNS if column not in REQUIRED_COLUMNS['kqi']]
+
+def header_lines(header):
+    """Nombre de lignes physiques occupées par l'en-tête"""
+    return 1 + sum(field.count('\n') for field in header)
+
+def lines_before(path, position):
+    """Nombre de lignes physiques avant l'octet `position` d'un fichier"""
+    count = 0
+    with open(path, 'rb') as f:
+        while position > 0:
+            block = f.read(min(position, 16 * 1024 * 1024))
+            if not block:
+                break
+            count += block.count(b'\n')
+            position -= len(block)
+    return count
+
+class Rejects:
+    """Lignes rejetées d'une entrée, écrites avec leur numéro de ligne, la raison et son détail"""
+
+    def __init__(self, sink, kind, header, lines_before_data):
+        self.sink = sink
+        self.kind = kind
+        self.fieldnames = ['ligne', 'raison', 'detail', *header]
+        # Calculé au premier rejet seulement (comptage des lignes qui précèdent une plage)
+        self.lines_before_data = lines_before_data
+        self.offset = None
+
+    def reject(self, line, reason, detail='', row=()):
+        """Rejette une ligne ; line est compté à partir de la première ligne de données (1).
+
+        reason : code de REJECT_REASONS ; detail : valeur en cause, écrite avec la ligne.
+        """
+        if self.offset is None:
+            self.offset = self.lines_before_data()
+        reasons = REJECTED.setdefault(self.kind, {})
+        reasons[reason] = reasons.get(reason, 0) + 1
+        self.sink.write_row(self.kind, self.fieldnames, [self.offset + line, reason, detail, *row])
+
+def record_line(reader, row):
+    """Première ligne de l'enregistrement que `reader` vient de lire (valeurs multilignes comprises)"""
+    return reader.line_num - sum(field.count('\n') for field in row)
+
+# Octets non UTF-8 des entrées : remplacés par U+FFFD au décodage (INPUT_ERRORS)
+# et décomptés ici jusqu'à ce que les lignes qui les contiennent soient rejetées
+INPUT_ERRORS = 'rejet-encodage'
+UNDECODED = 0
+
+def _replace_undecoded(error):
+    global UNDECODED
+    UNDECODED += error.end - error.start
+    return '\ufffd' * (error.end - error.start), error.end
+
+codecs.register_error(INPUT_ERRORS, _replace_undecoded)
+
+def undecoded_fields(row):
+    """Nombre de caractères U+FFFD d'une ligne (octets non UTF-8 remplacés)"""
+    return sum(field.count('\ufffd') for field in row)
+
+def reject_undecoded(line, row, count):
+    """Rejette une ligne dont `count` octets n'étaient pas de l'UTF-8"""
+    global UNDECODED
+    UNDECODED = max(UNDECODED - count, 0)
+    REJECTS.reject(line, 'encodage_invalide', f"{count} octet(s) non UTF-8", row)
+
+def tolerant(reader):
+    """Parcourt un csv.reader ; un enregistrement illisible ou mal encodé est rejeté et la lecture continue"""
+    while True:
+        try:
+            for row in reader:
+                # Vérification ligne à ligne tant que des octets remplacés restent à attribuer
+                if UNDECODED:
+                    count = undecoded_fields(row)
+                    if count:
+                        ROWS_READ[REJECTS.kind] = ROWS_READ.get(REJECTS.kind, 0) + 1
+                        reject_undecoded(record_line(reader, row), row, count)
+                        continue
+                yield row
+            return
+        except csv.Error as error:
+            ROWS_READ[REJECTS.kind] = ROWS_READ.get(REJECTS.kind, 0) + 1
+            REJECTS.reject(reader.line_num, 'enregistrement_illisible', str(error))
+
+def reject_all(lines, reason, detail=''):
+    """Rejette toutes les lignes d'une entrée inexploitable"""
+    reader = csv.reader(lines)
+    count = 0
+    for row in tolerant(reader):
+        if row:
+            count += 1
+            REJECTS.reject(record_line(reader, row), reason, detail, row)
+    ROWS_READ[REJECTS.kind] = ROWS_READ.get(REJECTS.kind, 0) + count
+
+def check_header(kind, header, source=None):
+    """Retourne (en-tête complété, colonnes obligatoires absentes) ; signale les absences si `source`.
+
+    Les colonnes facultatives absentes sont ajoutées en fin d'en-tête : les
+    lignes plus courtes que l'en-tête sont complétées à vide à la lecture.
+    """
+    missing = [column for column in REQUIRED_COLUMNS[kind] if column not in header]
+    absent = [column for column in optional_columns(kind) if column not in header]
+    if source and missing:
+        print(f"✗ {source} : colonne(s) obligatoire(s) absente(s) ({', '.join(missing)}), "
+              f"toutes les lignes sont rejetées")
+    elif source and absent:
+        print(f"⚠ {source} : colonne(s) absente(s), lues comme vides : {', '.join(absent)}")
+    return header + absent, missing
+
+def transform_input(kind, lines, header, nodes_out, relations_out, rejects, source=None):
+    """Contrôle l'en-tête d'une entrée puis la transforme ; rejects(en-tête) crée ses Rejects"""
+    global REJECTS
+    header, missing = check_header(kind, header, source)
+    REJECTS = rejects(header)
+    if missing:
+        reject_all(lines, 'colonnes_absentes', ', '.join(missing))
+        return
+    TRANSFORMS[kind](lines, header, nodes_out, relations_out)
+
+def merge_counts(totals, counts):
+    for name, count in counts.items():
+        totals[name] = totals.get(name, 0) + count
+
+def rejects_summary(max_percent):
+    """Récapitulatif des lignes lues, rejetées et mises en quarantaine"""
+    read = sum(ROWS_READ.values())
+    discarded = sum(sum(reasons.values()) for reasons in REJECTED.values()) + sum(QUARANTINED.values())
+    percent = 100 * discarded / read if read else 0.0
+    return {
+        'lignes_lues': dict(ROWS_READ),
+        'rejets': {kind: {'lignes': sum(reasons.values()), 'raisons': reasons}
+                   for kind, reasons in REJECTED.items()},
+        'quarantaine': dict(QUARANTINED),
+        'lignes_ecartees': discarded,
+        'taux_pourcent': round(percent, 4),
+        'budget_pourcent': max_percent,
+        'dans_le_budget': max_percent is None or percent <= max_percent,
+    }
+
+def report_rejects(directory, max_percent=None):
+    """Signale les lignes rejetées, écrit le récapitulatif et applique le budget d'erreurs"""
+    summary = rejects_summary(max_percent)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, REJECTS_SUMMARY), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
     
-    # Écrire les fichiers CSV
-    for node_type, records in nodes_by_type.items():
-        if not records:
-            continue
+    rejected = {kind: entry['lignes'] for kind, entry in summary['rejets'].items()}
+    if rejected:
+        details = ', '.join(f"{kind} ({count})" for kind, count in sorted(rejected.items()))
+        print(f"\n⚠ {sum(rejected.values())} ligne(s) d'entrée rejetée(s) : {details}")
+        for kind, reasons in sorted(REJECTED.items()):
+            for reason, count in sorted(reasons.items(), key=lambda item: -item[1])[:3]:
+                print(f"   {kind} : {REJECT_REASONS.get(reason, reason)} ({count})")
+        print(f"   Lignes et raisons dans {directory}")
+    if not summary['dans_le_budget']:
+        raise SystemExit(f"✗ {summary['lignes_ecartees']} ligne(s) écartée(s) sur "
+                         f"{sum(ROWS_READ.values())} ({summary['taux_pourcent']:.2f} %), "
+                         f"au-delà du budget de {max_percent} % (--max-rejets)")
+
+# ============================================================================
+# CHAÎNES DE SOUS-TRAITANCE (EXPOSITION_ST)
+# Les arêtes IMPLIQUE_ST et EST_SOUS_TRAITANT_DE écrites sont retenues pendant
+# la transformation des relations. La fermeture transitive est calculée une
+# seule fois sur une adjacence indexée par entiers (tableaux offsets/cibles)
+# et matérialisée dans EXPOSITION_ST : « quelles études sont exposées à ST-X,
+# directement ou non » devient une lecture à un seul saut.
+# ============================================================================
+
+CHAINS = None
+
+EXPOSURE_TABLE = 'EXPOSITION_ST'
+EXPOSURE_FIELDS = ['from', 'to', 'profondeur', 'chemin']
+
+class SubcontractingChains:
+    """Arêtes des chaînes de sous-traitance et calcul de leur fermeture par étude"""
+
+    def __init__(self):
+        # (étude, sous-traitant, niveau, via)
+        self.involved = []
+        # (sous-traitant N+1, sous-traitant N, études de contexte)
+        self.subcontracts = []
+
+    def add(self, name, record):
+        if name == 'IMPLIQUE_ST':
+            self.involved.append((record['from'], record['to'], record.get('niveau', 1), record.get('via', '')))
+        elif name == 'EST_SOUS_TRAITANT_DE':
+            self.subcontracts.append((record['from'], record['to'], record.get('contexte_etudes', '')))
+
+    def edges(self):
+        return self.involved, self.subcontracts
+
+    def update(self, edges):
+        involved, subcontracts = edges
+        self.involved.extend(involved)
+        self.subcontracts.extend(subcontracts)
+
+    def closure(self):
+        """Itère (étude, sous-traitant, profondeur, chemin) par plus court chemin depuis les ST N1.
+
+        Une arête EST_SOUS_TRAITANT_DE dont contexte_etudes est renseigné n'est
+        suivie que pour ces études ; un IMPLIQUE_ST de niveau 2 avec via ajoute
+        l'arête via → sous-traitant pour son étude.
+        """
+        index = {}
         
-        filename = NODE_TYPE_MAP.get(node_type, node_type.replace(' ', ''))
-        filepath = os.path.join(OUTPUT_DIR, 'nodes', f'{filename}.csv')
+        def number(st_id):
+            return index.setdefault(st_id, len(index))
         
-        with open(filepath, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=records[0].keys())
-            writer.writeheader()
-            writer.writerows(records)
+        edges = []
+        for child, parent, context in self.subcontracts:
+            try:
+                studies = frozenset(json.loads(context)) if context else None
+            except (TypeError, ValueError):
+                studies = None
+            edges.append((number(parent), number(child), studies or None))
+        seeds = {}
+        for study, st_id, level, via in self.involved:
+            try:
+                level = int(level)
+            except (TypeError, ValueError):
+                level = 1
+            if via and level > 1:
+                edges.append((number(via), number(st_id), frozenset([study])))
+                st_id, level = via, level - 1
+            seeds.setdefault(study, []).append((level, number(st_id)))
         
-        print(f"✓ {filepath} ({len(records)} enregistrements)")
+        # Adjacence en tableaux : successeurs de p = targets[offsets[p]:offsets[p + 1]]
+        offsets = array('l', [0]) * (len(index) + 1)
+        for parent, _, _ in edges:
+            offsets[parent + 1] += 1
+        for k in range(len(index)):
+            offsets[k + 1] += offsets[k]
+        cursor = array('l', offsets[:-1])
+        targets = array('l', [0]) * len(edges)
+        contexts = [None] * len(edges)
+        for parent, child, studies in edges:
+            position = cursor[parent]
+            targets[position] = child
+            contexts[position] = studies
+            cursor[parent] += 1
+        names = list(index)
+        
+        for study, starts in seeds.items():
+            # Parcours en largeur par niveaux : {sous-traitant: (profondeur, prédécesseur)}
+            best = {}
+            levels = {}
+            for level, node in starts:
+                levels.setdefault(level, []).append((node, -1))
+            depth = min(levels)
+            while levels:
+                for node, parent in levels.pop(depth, ()):
+                    if node in best:
+                        continue
+                    best[node] = (depth, parent)
+                    for position in range(offsets[node], offsets[node + 1]):
+                        studies = contexts[position]
+                        if targets[position] not in best and (studies is None or study in studies):
+                            levels.setdefault(depth + 1, []).append((targets[position], node))
+                depth += 1
+            for node, (depth, parent) in best.items():
+                path = [names[node]]
+                while parent >= 0:
+                    path.append(names[parent])
+                    parent = best[parent][1]
+                yield study, names[node], depth, path[::-1]
 
-def process_relations():
-    """Traite le fichier relations.csv et génère un CSV par type"""
-    relations_by_type = {}
+class ChainEdges:
+    """Destination de relations qui retient les arêtes des chaînes de sous-traitance"""
+
+    def __init__(self, sink, chains):
+        self.sink = sink
+        self.chains = chains
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+    def write_row(self, name, fieldnames, row):
+        if name in ('IMPLIQUE_ST', 'EST_SOUS_TRAITANT_DE'):
+            self.chains.add(name, dict(zip(fieldnames, row)))
+        self.sink.write_row(name, fieldnames, row)
+
+    def write(self, name, record):
+        if name in ('IMPLIQUE_ST', 'EST_SOUS_TRAITANT_DE'):
+            self.chains.add(name, record)
+        self.sink.write(name, record)
+
+    def close(self, report=True):
+        self.sink.close(report)
+
+def write_exposure(relations_out, quarantine_dir):
+    """Écrit EXPOSITION_ST dans relations_out à partir des chaînes retenues (CHAINS).
+
+    Les arêtes retenues ont déjà passé le contrôle d'intégrité (via compris) ;
+    les liens d'exposition sont contrôlés à leur tour avant l'écriture.
+    """
+    relations_out = checked_outputs(None, relations_out, quarantine_dir)[1]
+    with stage('exposure'):
+        try:
+            for study, st_id, depth, path in CHAINS.closure():
+                relations_out.write_row(EXPOSURE_TABLE, EXPOSURE_FIELDS, [study, st_id, depth, json.dumps(path)])
+        finally:
+            relations_out.close()
+    if METRICS is not None:
+        METRICS.add_rows('relations', relations_out.counts)
+
+# ============================================================================
+# PÉRIODES DE VALIDITÉ DES VERSIONS
+# Les arêtes A_VERSION_SUIVANTE sont relevées dans relations.csv avant la
+# transformation, en un passage qui ne décode que les lignes qui les
+# contiennent. Triées par date, elles donnent à chaque version de Contrat
+# et d'AccordQualite son successeur, sa date de remplacement et la première
+# version de sa chaîne. Les versions et les relations qui les visent
+# reçoivent leur intervalle de validité (bornes incluses) et un indicateur
+# de version courante : « état au jour J » devient un filtre de colonnes,
+# sans parcours des chaînes à la requête.
+# ============================================================================
+
+VERSIONS = None
+
+VERSION_RELATION = 'A_VERSION_SUIVANTE'
+
+# Colonnes calculées des tables versionnées et des relations vers une version
+VERSION_COLUMNS = ['valide_du', 'valide_au', 'version_courante', 'version_racine']
+LINK_COLUMNS = ['valide_du', 'valide_au', 'courant']
+
+# Relation vers une version -> table versionnée
+VERSIONED_LINKS = {
+    'EST_LIE_AU_CONTRAT': 'Contrat',
+    'EST_COUVERT_PAR_QA': 'AccordQualite',
+}
+
+class VersionChains:
+    """Successeur, date de remplacement et première version de chaque version"""
+
+    def __init__(self):
+        # (table, id) -> (date de remplacement ou None, id du successeur)
+        self.successors = {}
+        # (table, id) -> id de la première version de sa chaîne
+        self.roots = {}
+
+    def build(self, edges):
+        """Calcule successeurs et racines à partir des arêtes (table, précédente, suivante, date).
+
+        Les arêtes sont parcourues par date : une version remplacée deux fois
+        garde son premier remplacement, une version reprise deux fois son
+        premier prédécesseur.
+        """
+        predecessors = {}
+        for table, previous, following, replaced in sorted(
+                edges, key=lambda edge: (edge[3] is None, edge[3] or date.min)):
+            self.successors.setdefault((table, previous), (replaced, following))
+            predecessors.setdefault((table, following), previous)
+        for key in predecessors:
+            table, version_id = key
+            path = []
+            seen = set()
+            while key in predecessors and key not in self.roots and key not in seen:
+                seen.add(key)
+                path.append(key)
+                key = (table, predecessors[key])
+            root = self.roots.get(key, key[1])
+            for visited in path:
+                self.roots[visited] = root
+        return self
+
+    def last_day(self, table, version_id, start):
+        """Veille de la prise d'effet du successeur, jamais antérieure à start ('' sans successeur daté).
+
+        Un successeur daté du jour de start ou avant donnerait une période
+        inversée : elle est ramenée au seul jour start.
+        """
+        successor = self.successors.get((table, version_id))
+        if successor is None or successor[0] is None:
+            return ''
+        last_day = successor[0] - timedelta(days=1)
+        return start if isinstance(start, date) and last_day < start else last_day
+
+    def interval(self, table, version_id, start, end):
+        """[valide_du, valide_au, version_courante, version_racine] d'une version"""
+        # La version précédente cesse la veille de la prise d'effet de la suivante
+        last_day = self.last_day(table, version_id, start)
+        if last_day != '' and (end == '' or last_day < end):
+            end = last_day
+        return [start, end, 'false' if (table, version_id) in self.successors else 'true',
+                self.roots.get((table, version_id), version_id)]
+
+    def link(self, table, version_id, start, validite):
+        """[valide_du, valide_au, courant] d'une relation vers une version"""
+        current = (table, version_id) not in self.successors and validite != 'Archivée'
+        return [start, self.last_day(table, version_id, start), 'true' if current else 'false']
+
+def scan_versions(path):
+    """Relève les arêtes A_VERSION_SUIVANTE d'un fichier de relations.
+
+    Seules les lignes contenant le type de relation sont décodées ; si l'une
+    d'elles appartient à un enregistrement sur plusieurs lignes (guillemets
+    non appariés), le fichier est relu entièrement. Les arêtes que la
+    transformation rejettera (extrémité vide, date invalide) sont ignorées.
+    """
+    versions = VersionChains()
+    header = read_header(path)
+    columns = ('Type_Relation', 'Type_Noeud_Source', 'Noeud_Source', 'Noeud_Cible', 'Date_Lien')
+    if header is None or any(column not in header for column in columns):
+        return versions
+    rel_index, source_type_index, source_index, target_index, date_index = map(header.index, columns)
     
-    with open(INPUT_RELATIONS, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            rel_type = row['Type_Relation']
-            source_type = row['Type_Noeud_Source']
-            target_type = row['Type_Noeud_Cible']
-            
-            # Clé unique pour le type de relation (inclut source et cible pour les relations polymorphes)
-            if rel_type == 'EST_JUSTIFIE_PAR':
-                if target_type == 'Audit':
-                    rel_key = 'DECISION_JUSTIFIEE_PAR_AUDIT'
-                elif target_type == 'Événement Qualité':
-                    rel_key = 'DECISION_JUSTIFIEE_PAR_QE'
-                elif target_type == 'Inspection':
-                    rel_key = 'DECISION_JUSTIFIEE_PAR_INSPECTION'
-                elif target_type == 'Finding':
-                    rel_key = 'DECISION_JUSTIFIEE_PAR_FINDING'
-                else:
-                    rel_key = f'DECISION_JUSTIFIEE_PAR_{target_type}'
-            elif rel_type == 'GENERE_FINDING':
-                if source_type == 'Inspection':
-                    rel_key = 'INSPECTION_GENERE_FINDING'
-                else:
-                    rel_key = 'GENERE_FINDING'
-            elif rel_type == 'DECLENCHE_ALERTE':
-                if source_type == 'Événement Qualité':
-                    rel_key = 'QE_DECLENCHE_ALERTE'
-                else:
-                    rel_key = 'AUDIT_DECLENCHE_ALERTE'
-            elif rel_type == 'CONCERNE_ST':
-                if source_type == 'Événement Qualité':
-                    rel_key = 'QE_CONCERNE_ST'
-                else:
-                    rel_key = 'EVT_CONCERNE_ST'
-            elif rel_type == 'A_VERSION_SUIVANTE':
-                if source_type == 'Accord Qualité':
-                    rel_key = 'QA_A_VERSION_SUIVANTE'
-                else:
-                    rel_key = 'A_VERSION_SUIVANTE'
+    with open_input(path) as f:
+        next(csv.reader(f), None)
+        lines = [line for line in f if VERSION_RELATION in line]
+    if any(line.count('"') % 2 for line in lines):
+        with open_input(path) as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            rows = [row for row in reader if len(row) > rel_index and row[rel_index] == VERSION_RELATION]
+    else:
+        rows = [row for row in csv.reader(lines) if len(row) > rel_index and row[rel_index] == VERSION_RELATION]
+    
+    coerce = column_coercers(VERSION_RELATION)['date_lien']
+    edges = []
+    for row in rows:
+        row += [''] * (len(header) - len(row))
+        if not row[source_index] or not row[target_index]:
+            continue
+        try:
+            replaced = coerce(row[date_index]) or None
+        except ValueError:
+            continue
+        table = 'AccordQualite' if row[source_type_index] == 'Accord Qualité' else 'Contrat'
+        edges.append((table, row[source_index], row[target_index], replaced))
+    return versions.build(edges)
+
+class VersionedSink:
+    """Destination qui complète versions et relations vers une version par leur période de validité"""
+
+    def __init__(self, sink, versions):
+        self.sink = sink
+        self.versions = versions
+        # nom -> (colonnes complétées, positions utiles), calculé au premier enregistrement
+        self.plans = {}
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+    def plan(self, name, fieldnames):
+        plan = self.plans.get(name)
+        if plan is None:
+            if name in VERSIONED_LINKS:
+                plan = (list(fieldnames) + LINK_COLUMNS,
+                        [fieldnames.index(column) for column in ('to', 'date_lien', 'validite')])
             else:
-                rel_key = REL_TYPE_MAP.get(rel_type, rel_type)
-            
-            if rel_key not in relations_by_type:
-                relations_by_type[rel_key] = []
-            
-            attrs = parse_json_safe(row['Attributs'])
-            
-            record = {
-                'from': row['Noeud_Source'],
-                'to': row['Noeud_Cible'],
-                'date_lien': format_date(row['Date_Lien']),
-                'validite': row.get('Validite', 'Active')
-            }
-            
+                plan = (list(fieldnames) + VERSION_COLUMNS,
+                        [fieldnames.index(column) for column in ('id', 'date_debut', 'date_fin')])
+            self.plans[name] = plan
+        return plan
+
+    def write_row(self, name, fieldnames, row):
+        if name in VERSIONED_LINKS:
+            fieldnames, (to, start, validite) = self.plan(name, fieldnames)
+            row = [*row, *self.versions.link(VERSIONED_LINKS[name], row[to], row[start], row[validite])]
+        elif name in ('Contrat', 'AccordQualite'):
+            fieldnames, (version_id, start, end) = self.plan(name, fieldnames)
+            row = [*row, *self.versions.interval(name, row[version_id], row[start], row[end])]
+        self.sink.write_row(name, fieldnames, row)
+
+    def write(self, name, record):
+        # Nouveau dictionnaire : l'enregistrement reçu peut être retenu par le cache
+        if name in VERSIONED_LINKS:
+            values = self.versions.link(VERSIONED_LINKS[name], record['to'], record.get('date_lien', ''),
+                                        record.get('validite', ''))
+            record = {**record, **dict(zip(LINK_COLUMNS, values))}
+        elif name in ('Contrat', 'AccordQualite'):
+            values = self.versions.interval(name, record['id'], record.get('date_debut', ''),
+                                            record.get('date_fin', ''))
+            record = {**record, **dict(zip(VERSION_COLUMNS, values))}
+        self.sink.write(name, record)
+
+    def close(self, report=True):
+        self.sink.close(report)
+
+def find_versions(path):
+    """Relève les chaînes de versions de path dans VERSIONS"""
+    global VERSIONS
+    print("\n🗂️  Relevé des chaînes de versions...")
+    with stage('versions'):
+        VERSIONS = scan_versions(path)
+    print(f"✓ {len(VERSIONS.successors)} versions remplacées, {len(set(VERSIONS.roots.values()))} chaînes")
+
+# ============================================================================
+# ENCODAGE COMPACT (--encode)
+# Chaque table de nœuds reçoit des clés entières denses (0, 1, 2... dans
+# l'ordre d'écriture) ; les relations et les colonnes qui référencent un
+# nœud sont écrites en entiers. Les colonnes énumérées sont encodées par
+# dictionnaire, un dictionnaire par nom de colonne. Les correspondances sont
+# écrites dans encodage/ et le schéma typé en conséquence dans
+# schema_encoded.kuzu.
+# ============================================================================
+
+ENCODER = None
+
+ENCODING_DIR = 'encodage'
+
+# Colonnes STRING à faible cardinalité encodées par dictionnaire
+DICTIONARY_COLUMNS = {
+    'statut', 'criticite', 'source_donnees', 'pays', 'type_service', 'type_contrat', 'type_audit',
+    'resultat', 'autorite', 'type_inspection', 'impact', 'decideur', 'nature', 'score', 'evolution',
+    'trimestre', 'semestre', 'periodicite', 'phase', 'indication', 'categorie', 'complexite',
+    'niveau', 'type_evenement', 'source', 'sous_traitant_nom', 'indicateur', 'periode', 'tendance',
+    'statut_calcule', 'validite', 'role',
+}
+
+# Colonnes contenant l'identifiant d'un nœud : (table, colonne) -> table référencée
+REFERENCE_COLUMNS = {
+    ('KQI', 'sous_traitant_id'): 'SousTraitant',
+    ('IMPLIQUE_ST', 'via'): 'SousTraitant',
+    ('Contrat', 'version_racine'): 'Contrat',
+    ('AccordQualite', 'version_racine'): 'AccordQualite',
+}
+
+class Encoder:
+    """Clés entières par table de nœuds et dictionnaires des colonnes énumérées"""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.keys = {}
+        self.dictionaries = {}
+        self.plans = {}
+
+    def keys_of(self, table):
+        """Fonction id -> clé entière d'une table (nouvelle clé pour un id inconnu)"""
+        keys = self.keys.setdefault(table, {})
+        
+        def encode(node_id):
+            code = keys.get(node_id)
+            if code is None:
+                if not node_id:
+                    return ''
+                code = keys[sys.intern(node_id)] = len(keys)
+            return code
+        return encode
+
+    def codes_of(self, column):
+        """Fonction valeur -> code du dictionnaire d'une colonne ('' reste vide)"""
+        values = self.dictionaries.setdefault(column, {})
+        
+        def encode(value):
+            code = values.get(value)
+            if code is None:
+                if value == '' or value is None:
+                    return ''
+                code = values[value] = len(values)
+            return code
+        return encode
+
+    def plan(self, name, fieldnames):
+        """[(position, encodeur)] des colonnes à encoder d'une table, calculé une fois"""
+        plan = self.plans.get(name)
+        if plan is not None:
+            return plan
+        entry = self.schema.get(name)
+        plan = []
+        if entry is not None:
+            types = dict(table_columns(entry))
+            for position, column in enumerate(fieldnames):
+                if column == 'id' and entry['kind'] == 'node':
+                    plan.append((position, self.keys_of(name)))
+                elif column in ('from', 'to') and entry['kind'] == 'rel':
+                    plan.append((position, self.keys_of(entry[column])))
+                elif (name, column) in REFERENCE_COLUMNS:
+                    plan.append((position, self.keys_of(REFERENCE_COLUMNS[name, column])))
+                elif column in DICTIONARY_COLUMNS and types.get(column) == 'STRING':
+                    plan.append((position, self.codes_of(column)))
+        self.plans[name] = plan
+        return plan
+
+    def encode(self, name, fieldnames, row):
+        plan = self.plans.get(name)
+        if plan is None:
+            plan = self.plan(name, fieldnames)
+        if not plan:
+            return row
+        row = list(row)
+        for position, encode in plan:
+            row[position] = encode(row[position])
+        return row
+
+    def write_mappings(self, directory):
+        """Écrit identifiants/<Table>.csv (cle, id) et dictionnaires/<colonne>.csv (code, valeur)"""
+        for subdir, header, mappings in (('identifiants', ['cle', 'id'], self.keys),
+                                         ('dictionnaires', ['code', 'valeur'], self.dictionaries)):
+            path = os.path.join(directory, subdir)
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+            for name, values in mappings.items():
+                with open(os.path.join(path, f'{name}.csv'), 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(header)
+                    writer.writerows((code, value) for value, code in values.items())
+        print(f"✓ {directory} ({len(self.keys)} tables de clés, {len(self.dictionaries)} dictionnaires)")
+
+def encoded_schema(schema):
+    """Schéma typé pour la sortie encodée : clés INT64, colonnes encodées INT32"""
+    encoded = {}
+    for name, entry in schema.items():
+        columns = []
+        for column, kuzu_type in entry['columns']:
+            if (column == 'id' and entry['kind'] == 'node') or (name, column) in REFERENCE_COLUMNS:
+                kuzu_type = 'INT64'
+            elif column in DICTIONARY_COLUMNS and kuzu_type == 'STRING':
+                kuzu_type = 'INT32'
+            columns.append((column, kuzu_type))
+        encoded[name] = {**entry, 'columns': columns, 'key_type': 'INT64'}
+    return encoded
+
+def schema_ddl(schema):
+    """Instructions CREATE NODE/REL TABLE correspondant à un schéma chargé par load_schema()"""
+    statements = []
+    for name, entry in schema.items():
+        columns = [f'{column} {kuzu_type}' + (' PRIMARY KEY' if column == 'id' and entry['kind'] == 'node' else '')
+                   for column, kuzu_type in entry['columns']]
+        if entry['kind'] == 'node':
+            statements.append(f"CREATE NODE TABLE {name} ({', '.join(columns)});")
+        else:
+            columns.insert(0, f"FROM {entry['from']} TO {entry['to']}")
+            statements.append(f"CREATE REL TABLE {name} ({', '.join(columns)});")
+    return statements
+
+class EncodedSink:
+    """Destination qui remplace identifiants et valeurs énumérées par leurs codes entiers"""
+
+    def __init__(self, sink, encoder):
+        self.sink = sink
+        self.encoder = encoder
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+    def write_row(self, name, fieldnames, row):
+        self.sink.write_row(name, fieldnames, self.encoder.encode(name, fieldnames, row))
+
+    def write(self, name, record):
+        fieldnames = self.sink.fieldnames.get(name) or list(record)
+        self.write_row(name, fieldnames, [record.get(field, '') for field in fieldnames])
+
+    def close(self, report=True):
+        self.sink.close(report)
+
+def encoded_outputs(nodes_out, relations_out):
+    """Ajoute l'encodage compact quand ENCODER est actif"""
+    if ENCODER is None:
+        return nodes_out, relations_out
+    return EncodedSink(nodes_out, ENCODER), EncodedSink(relations_out, ENCODER)
+
+def transform_nodes(lines, header, nodes_out, relations_out):
+    """Projette les lignes de nodes.csv (sans en-tête) vers un CSV par type"""
+    reader = csv.reader(lines)
+    projections = compile_node_specs(header)
+    width = len(header)
+    type_index = header.index('Type_Noeud')
+    id_index = header.index('ID_Noeud')
+    json_index = header.index('Attributs_JSON')
+    count = 0
+    
+    for row in tolerant(reader):
+        if len(row) < width:
+            if not row:
+                continue
+            row += [''] * (width - len(row))
+        count += 1
+        
+        node_type = row[type_index]
+        projection = projections.get(node_type)
+        if projection is None:
+            REJECTS.reject(record_line(reader, row), 'type_noeud_inconnu', node_type, row)
+            continue
+        if not row[id_index]:
+            REJECTS.reject(record_line(reader, row), 'identifiant_vide', '', row)
+            continue
+        
+        table, fieldnames, project = projection
+        try:
+            values = project(row, parse_json_safe(row[json_index], table))
+        except ValueError as error:
+            REJECTS.reject(record_line(reader, row), 'valeur_invalide', str(error), row)
+            continue
+        except (AttributeError, TypeError) as error:
+            REJECTS.reject(record_line(reader, row), 'attributs_inexploitables', str(error), row)
+            continue
+        nodes_out.write_row(table, fieldnames, values)
+    ROWS_READ['nodes'] = ROWS_READ.get('nodes', 0) + count
+
+def text_attribute(attrs, key):
+    """Attribut texte d'une relation ('' si absent) ; TypeError pour une liste ou un objet"""
+    value = attrs.get(key, '')
+    if isinstance(value, (dict, list)):
+        raise TypeError(f"{key} : valeur structurée {json.dumps(value, ensure_ascii=False)}")
+    return value
+
+def transform_relations(lines, header, nodes_out, relations_out):
+    """Route les lignes de relations.csv (sans en-tête) vers un CSV par type"""
+    # Lecture positionnelle : index des colonnes résolus une fois, sans dict par ligne
+    width = len(header)
+    (rel_index, source_type_index, target_type_index, source_index, target_index,
+     date_index, attrs_index) = (header.index(column) for column in (
+        'Type_Relation', 'Type_Noeud_Source', 'Type_Noeud_Cible', 'Noeud_Source', 'Noeud_Cible',
+        'Date_Lien', 'Attributs'))
+    validite_index = header.index('Validite') if 'Validite' in header else None
+    reader = csv.reader(lines)
+    coercers = {}
+    count = 0
+    for row in tolerant(reader):
+        if len(row) < width:
+            if not row:
+                continue
+            row += [''] * (width - len(row))
+        count += 1
+        if not row[source_index] or not row[target_index]:
+            REJECTS.reject(record_line(reader, row), 'extremite_vide', '', row)
+            continue
+        rel_type = row[rel_index]
+        source_type = row[source_type_index]
+        target_type = row[target_type_index]
+        
+        # Clé unique pour le type de relation (inclut source et cible pour les relations polymorphes)
+        if rel_type == 'EST_JUSTIFIE_PAR':
+            if target_type == 'Audit':
+                rel_key = 'DECISION_JUSTIFIEE_PAR_AUDIT'
+            elif target_type == 'Événement Qualité':
+                rel_key = 'DECISION_JUSTIFIEE_PAR_QE'
+            elif target_type == 'Inspection':
+                rel_key = 'DECISION_JUSTIFIEE_PAR_INSPECTION'
+            elif target_type == 'Finding':
+                rel_key = 'DECISION_JUSTIFIEE_PAR_FINDING'
+            else:
+                REJECTS.reject(record_line(reader, row), 'cible_inattendue',
+                               f"{target_type} pour {rel_type}", row)
+                continue
+        elif rel_type == 'GENERE_FINDING':
+            if source_type == 'Inspection':
+                rel_key = 'INSPECTION_GENERE_FINDING'
+            else:
+                rel_key = 'GENERE_FINDING'
+        elif rel_type == 'DECLENCHE_ALERTE':
+            if source_type == 'Événement Qualité':
+                rel_key = 'QE_DECLENCHE_ALERTE'
+            else:
+                rel_key = 'AUDIT_DECLENCHE_ALERTE'
+        elif rel_type == 'CONCERNE_ST':
+            if source_type == 'Événement Qualité':
+                rel_key = 'QE_CONCERNE_ST'
+            else:
+                rel_key = 'EVT_CONCERNE_ST'
+        elif rel_type == 'A_VERSION_SUIVANTE':
+            if source_type == 'Accord Qualité':
+                rel_key = 'QA_A_VERSION_SUIVANTE'
+            else:
+                rel_key = 'A_VERSION_SUIVANTE'
+        else:
+            rel_key = REL_TYPE_MAP.get(rel_type)
+            if rel_key is None:
+                REJECTS.reject(record_line(reader, row), 'type_relation_inconnu', rel_type, row)
+                continue
+        
+        attrs = parse_json_safe(row[attrs_index], rel_key)
+        
+        record = {
+            'from': row[source_index],
+            'to': row[target_index],
+            'date_lien': row[date_index],
+            'validite': row[validite_index] if validite_index is not None else 'Active'
+        }
+        
+        columns = coercers.get(rel_key)
+        if columns is None:
+            columns = coercers[rel_key] = list(column_coercers(rel_key).items())
+        try:
             # Ajouter les attributs spécifiques selon le type
             if rel_key == 'EST_SOUS_TRAITANT_DE':
                 record['contexte_etudes'] = json.dumps(attrs.get('contexte_etudes', []))
@@ -366,162 +1695,1922 @@ def process_relations():
                 record['en_reevaluation'] = str(attrs.get('en_reevaluation', False)).lower()
             elif rel_key == 'IMPLIQUE_ST':
                 record['niveau'] = attrs.get('niveau', 1)
-                record['role'] = attrs.get('role', '')
-                record['via'] = attrs.get('via', '')
+                record['role'] = text_attribute(attrs, 'role')
+                record['via'] = text_attribute(attrs, 'via')
             elif rel_key in ['CAUSE_EVENEMENT', 'EVT_CONCERNE_ST']:
-                record['impact'] = attrs.get('impact', '')
+                record['impact'] = text_attribute(attrs, 'impact')
             
-            relations_by_type[rel_key].append(record)
-    
-    # Écrire les fichiers CSV
-    for rel_type, records in relations_by_type.items():
-        if not records:
+            # Conversion selon les types de la table dans schema.kuzu
+            for column, coerce in columns:
+                if column in record:
+                    record[column] = coerce(record[column])
+        except ValueError as error:
+            REJECTS.reject(record_line(reader, row), 'valeur_invalide', str(error), row)
+            continue
+        except (AttributeError, TypeError) as error:
+            # Attributs qui ne sont pas un objet JSON, valeur structurée (liste, objet) à la place d'un scalaire
+            REJECTS.reject(record_line(reader, row), 'attributs_inexploitables', str(error), row)
             continue
         
-        filepath = os.path.join(OUTPUT_DIR, 'relations', f'{rel_type}.csv')
+        # Les colonnes absentes sont complétées à vide par le writer
+        relations_out.write(rel_key, record)
+    ROWS_READ['relations'] = ROWS_READ.get('relations', 0) + count
+
+# Colonnes de kqi.csv -> colonnes de la table KQI
+KQI_COLUMNS = {
+    'ID_KQI': 'id',
+    'ID_SousTraitant': 'sous_traitant_id',
+    'Nom_SousTraitant': 'sous_traitant_nom',
+    'Indicateur': 'indicateur',
+    'Periode': 'periode',
+    'Valeur': 'valeur',
+    'Seuil_Alerte': 'seuil_alerte',
+    'Seuil_Objectif': 'seuil_objectif',
+    'Statut': 'statut',
+    'Tendance': 'tendance',
+}
+
+# Colonnes calculées par kqi_analytics()
+KQI_ANALYTICS = ['statut_calcule', 'pente_tendance', 'periodes_degradation']
+
+PERIOD_PATTERN = re.compile(r'(\d{4})-Q([1-4])')
+
+def period_ordinals(periods):
+    """Rang chronologique de chaque période distincte (triées).
+
+    Trimestres « AAAA-Qn » : annee * 4 + trimestre, si bien qu'un trimestre
+    manquant laisse un écart. Autre format : rang dans l'ordre de tri.
+    """
+    matches = [PERIOD_PATTERN.fullmatch(str(period)) for period in periods]
+    if all(matches):
+        return np.array([int(m.group(1)) * 4 + int(m.group(2)) for m in matches], dtype=float)
+    return np.arange(len(periods), dtype=float)
+
+def kqi_analytics(frame, numbers):
+    """Statut par rapport aux seuils, pente glissante et périodes de dégradation consécutives.
+
+    Calcul vectorisé sur toutes les séries (sous_traitant_id, indicateur)
+    triées par période. Le sens de l'indicateur se déduit des seuils : plus
+    haut est mieux quand seuil_objectif >= seuil_alerte. La pente est celle
+    de la régression de valeur sur le rang de la période (period_ordinals),
+    sur les KQI_TREND_WINDOW dernières périodes de la série.
+    `numbers` : colonnes numériques déjà converties par coerce_kqi_numbers().
+    Retourne trois tableaux NumPy dans l'ordre des lignes de frame.
+    """
+    # Tri sur des codes entiers plutôt que sur les chaînes
+    st_codes = pd.factorize(frame['sous_traitant_id'])[0]
+    indicator_codes = pd.factorize(frame['indicateur'])[0]
+    period_codes, periods = pd.factorize(frame['periode'], sort=True)
+    order = np.lexsort((period_codes, indicator_codes, st_codes))
+    
+    value = numbers['valeur'][order]
+    alert = numbers['seuil_alerte'][order]
+    target = numbers['seuil_objectif'][order]
+    higher_is_better = ~(target < alert)
+    
+    # Statut : objectif atteint, seuil d'alerte atteint ou dépassé, entre les deux
+    reached = np.where(higher_is_better, value >= target, value <= target)
+    alerting = np.where(higher_is_better, value <= alert, value >= alert)
+    status = np.select([np.isnan(value) | np.isnan(alert) | np.isnan(target), reached, alerting],
+                       ['', 'Conforme', 'ALERTE'], 'À surveiller')
+    
+    # Début de la série de chaque ligne
+    n = len(order)
+    index = np.arange(n)
+    st_sorted, indicator_sorted = st_codes[order], indicator_codes[order]
+    new_series = np.ones(n, dtype=bool)
+    new_series[1:] = (st_sorted[1:] != st_sorted[:-1]) | (indicator_sorted[1:] != indicator_sorted[:-1])
+    series_start = np.maximum.accumulate(np.where(new_series, index, 0))
+    window_start = np.maximum(series_start, index - KQI_TREND_WINDOW + 1)
+    
+    # Pente des moindres carrés sur la fenêtre, par sommes cumulées (valeurs manquantes ignorées)
+    # x relatif au début de la série : petites valeurs, sommes cumulées précises
+    valid = ~np.isnan(value)
+    ordinal = period_ordinals(periods)[period_codes[order]]
+    x = np.where(valid, ordinal - ordinal[series_start], 0.0)
+    y = np.where(valid, value, 0.0)
+    
+    def window_sum(column):
+        total = np.concatenate(([0.0], np.cumsum(column)))
+        return total[index + 1] - total[window_start]
+    
+    count = window_sum(valid.astype(float))
+    sx, sy, sxx, sxy = window_sum(x), window_sum(y), window_sum(x * x), window_sum(x * y)
+    denominator = count * sxx - sx * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where((count >= 2) & (denominator > 0), (count * sxy - sx * sy) / denominator, np.nan)
+    
+    # Périodes consécutives qui se dégradent par rapport à la précédente
+    previous = np.concatenate(([np.nan], value[:-1]))
+    worse = ~new_series & np.where(higher_is_better, value < previous, value > previous)
+    runs = np.cumsum(worse)
+    degrading = runs - np.maximum.accumulate(np.where(worse, 0, runs))
+    
+    inverse = np.empty(n, dtype=np.intp)
+    inverse[order] = index
+    return status[inverse], np.round(slope, 6)[inverse], degrading[inverse]
+
+def coerce_kqi_numbers(frame, header, skipped):
+    """Convertit les colonnes numériques lues de kqi.csv.
+
+    Les décimaux à virgule sont normalisés ; une ligne à valeur illisible ou
+    aux octets non UTF-8 est rejetée. `skipped` : numéros des enregistrements déjà écartés par pandas,
+    pour numéroter les rejets comme lui. Retourne le cadre sans les lignes
+    rejetées et les colonnes converties en tableaux de flottants (NaN si
+    vide), réutilisés par kqi_analytics().
+    """
+    types = dict(load_schema()['KQI']['columns'])
+    numbers = {}
+    # position -> (code de raison, détail)
+    invalid = {}
+    if UNDECODED:
+        for column in frame.columns:
+            counts = frame[column].str.count('\ufffd').to_numpy()
+            for position in np.flatnonzero(counts):
+                reason, count = invalid.get(position, ('encodage_invalide', 0))
+                invalid[position] = (reason, count + int(counts[position]))
+    for column in frame.columns:
+        if types.get(column) not in ('DOUBLE', 'FLOAT'):
+            continue
+        raw = frame[column]
+        numbers[column] = values = pd.to_numeric(raw, errors='coerce').to_numpy(float, copy=True)
+        suspect = np.isnan(values) & (raw != '').to_numpy()
+        if not suspect.any():
+            continue
+        # Seules les valeurs non reconnues par pandas passent par la conversion ligne à ligne
+        coerce = column_coercer('KQI', column, types[column])
+        for position in np.flatnonzero(suspect):
+            if position in invalid:
+                continue
+            try:
+                values[position] = coerce(raw.iat[position])
+            except ValueError as error:
+                invalid[position] = ('valeur_invalide', str(error))
+            else:
+                frame.iat[position, frame.columns.get_loc(column)] = repr(float(values[position]))
+    if not invalid:
+        return frame, numbers
+    skipped = sorted(skipped)
+    positions = [header.index(column) for column in KQI_COLUMNS]
+    for position, (reason, detail) in sorted(invalid.items()):
+        record = position + 1
+        for line in skipped:
+            if line <= record:
+                record += 1
+        row = [''] * len(header)
+        for index, value in zip(positions, frame.iloc[position].tolist()):
+            row[index] = value
+        if reason == 'encodage_invalide':
+            reject_undecoded(record, row, detail)
+        else:
+            REJECTS.reject(record, reason, detail, row)
+    dropped = list(invalid)
+    return (frame.drop(index=frame.index[dropped]).reset_index(drop=True),
+            {column: np.delete(values, dropped) for column, values in numbers.items()})
+
+def bad_records(lines, header, records):
+    """Relit les enregistrements `records` (numérotés comme pandas, à partir de 1) d'un flux déjà lu.
+
+    Retourne {numéro: champs}. Le flux est rembobiné et relu jusqu'au dernier
+    numéro demandé ; un flux non rembobinable (.zst) donne {} et la ligne est
+    rejetée sans son contenu. L'en-tête n'est présent que si le flux couvre
+    tout le fichier (il manque aux plages des processus).
+    """
+    if not lines.seekable():
+        return {}
+    lines.seek(0)
+    reader = csv.reader(lines)
+    first = next(reader, None)
+    found = {}
+    number = 0
+    if first is not None and not (first and header[:len(first)] == first):
+        number = 1
+        if number in records:
+            found[number] = first
+    last = max(records)
+    # pandas compte aussi les lignes vides, et un enregistrement multiligne une fois
+    for row in reader:
+        if number >= last:
+            break
+        number += 1
+        if number in records:
+            found[number] = row
+    return found
+
+def transform_kqi(lines, header, nodes_out, relations_out):
+    """Renomme les colonnes de kqi.csv (sans en-tête), calcule les indicateurs de tendance
+    et crée les relations KQI → SousTraitant"""
+    fieldnames = list(KQI_COLUMNS.values()) + KQI_ANALYTICS
+    if pd is None:
+        print("⚠ pandas/numpy absents : statut_calcule, pente_tendance et periodes_degradation "
+              "non calculés (pip install pandas)")
+        positions = [header.index(column) for column in KQI_COLUMNS]
+        width = len(header)
+        frame = []
+        coercers = column_coercers('KQI')
+        conversions = [(index, coercers[column]) for index, column in enumerate(KQI_COLUMNS.values())
+                       if column in coercers]
+        reader = csv.reader(lines)
+        count = 0
+        for row in tolerant(reader):
+            if row:
+                count += 1
+                row += [''] * (width - len(row))
+                values = [row[position] for position in positions]
+                try:
+                    for index, coerce in conversions:
+                        values[index] = coerce(values[index])
+                except ValueError as error:
+                    REJECTS.reject(record_line(reader, row), 'valeur_invalide', str(error), row)
+                    continue
+                frame.append(values)
+        ROWS_READ['kqi'] = ROWS_READ.get('kqi', 0) + count
+        for row in frame:
+            nodes_out.write_row('KQI', fieldnames, row + ['', '', ''])
+        # Les relations KQI → SousTraitant sont dédupliquées sur (sous-traitant, KQI)
+        links = {}
+        for kqi_id, st_id, _, _, periode, *_ in frame:
+            links.setdefault((kqi_id, st_id), periode)
+        for (kqi_id, st_id), periode in links.items():
+            relations_out.write('KQI_MESURE_ST', {'from': kqi_id, 'to': st_id, 'periode': periode})
+        return
+    
+    # Sans usecols, pandas signale (au lieu de les tronquer) les lignes ayant trop de champs ;
+    # ses numéros comptent les enregistrements, non les lignes physiques
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        frame = pd.read_csv(lines, header=None, names=header, dtype=object, keep_default_na=False,
+                            on_bad_lines='warn')[list(KQI_COLUMNS)]
+    bad_lines = [(int(line), detail) for warning in caught
+                 for line, detail in re.findall(r'Skipping line (\d+): (.*)', str(warning.message))]
+    raw = bad_records(lines, header, {line for line, _ in bad_lines}) if bad_lines else {}
+    for line, detail in bad_lines:
+        REJECTS.reject(line, 'nombre_de_champs', detail, raw.get(line, ()))
+    ROWS_READ['kqi'] = ROWS_READ.get('kqi', 0) + len(frame) + len(bad_lines)
+    frame.columns = list(KQI_COLUMNS.values())
+    frame, numbers = coerce_kqi_numbers(frame, header, [line for line, _ in bad_lines])
+    if frame.empty:
+        return
+    status, slope, degrading = kqi_analytics(frame, numbers)
+    
+    # Écriture par blocs : les chaînes Python ne sont créées que pour le bloc courant
+    for start in range(0, len(frame), KQI_WRITE_ROWS):
+        block = slice(start, start + KQI_WRITE_ROWS)
+        rows = zip(*(frame[column].iloc[block].tolist() for column in frame.columns),
+                   status[block].tolist(),
+                   ['' if value != value else value for value in slope[block].tolist()],
+                   degrading[block].tolist())
+        for row in rows:
+            nodes_out.write_row('KQI', fieldnames, row)
+    
+    # Les relations KQI → SousTraitant sont dédupliquées sur (sous-traitant, KQI)
+    links = frame.loc[~frame.duplicated(['sous_traitant_id', 'id']), ['id', 'sous_traitant_id', 'periode']]
+    for start in range(0, len(links), KQI_WRITE_ROWS):
+        block = links.iloc[start:start + KQI_WRITE_ROWS]
+        for kqi_id, st_id, periode in zip(*(block[column].tolist() for column in block.columns)):
+            relations_out.write('KQI_MESURE_ST', {'from': kqi_id, 'to': st_id, 'periode': periode})
+
+TRANSFORMS = {
+    'nodes': transform_nodes,
+    'relations': transform_relations,
+    'kqi': transform_kqi,
+}
+
+# ============================================================================
+# SOURCES D'ENTRÉE
+# Les exports arrivent en CSV brut, compressé (.gz, .zst) ou en classeur
+# Excel (.xlsx, premier onglet, comme excelParser.ts côté application).
+# Chaque format fournit un flux texte CSV lu au fil de l'eau, sans
+# décompression préalable sur disque. Seul le CSV brut se découpe en plages
+# d'octets pour le mode parallèle ; ces plages sont lues par projection
+# mémoire (mmap) partagée entre les processus.
+# ============================================================================
+
+# Suffixe -> format de source
+INPUT_FORMATS = {
+    '.csv': 'csv',
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+    '.xlsx': 'xlsx',
+}
+
+def input_format(path):
+    """Format d'un fichier d'entrée d'après son suffixe (CSV brut par défaut)"""
+    return INPUT_FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+class MappedRange(io.RawIOBase):
+    """Flux limité à la plage [start, end) d'un fichier projeté en mémoire"""
+
+    def __init__(self, path, start, end):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.start = self.position = start
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position - self.start
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: self.start, io.SEEK_CUR: self.position, io.SEEK_END: self.end}[whence]
+        self.position = min(max(base + offset, self.start), self.end)
+        return self.position - self.start
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.end - self.position)
+        if size <= 0:
+            return 0
+        buffer[:size] = self.view[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.view.release()
+            self.map.close()
+        super().close()
+
+def _open_zstd(path):
+    if zstandard is None:
+        raise SystemExit(f"La lecture de {path} nécessite le paquet zstandard (pip install zstandard)")
+    raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8', errors=INPUT_ERRORS)
+
+def _cell_text(value):
+    """Valeur de cellule Excel en texte, comme formatCellValue() de excelParser.ts"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def _open_xlsx(path):
+    try:
+        import openpyxl
+    except ImportError:
+        raise SystemExit(f"La lecture de {path} nécessite le paquet openpyxl (pip install openpyxl)")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        # Un onglet Excel tient en mémoire (1 048 576 lignes au plus) : converti en CSV
+        text = io.StringIO()
+        writer = csv.writer(text)
+        for values in workbook.worksheets[0].iter_rows(values_only=True):
+            row = [_cell_text(value) for value in values]
+            if any(row):
+                writer.writerow(row)
+    finally:
+        workbook.close()
+    text.seek(0)
+    return text
+
+INPUT_READERS = {
+    'csv': lambda path: open(path, 'r', encoding='utf-8', errors=INPUT_ERRORS),
+    'gzip': lambda path: gzip.open(path, 'rt', encoding='utf-8', errors=INPUT_ERRORS),
+    'zstd': _open_zstd,
+    'xlsx': _open_xlsx,
+}
+
+def open_input(path, start=None, end=None):
+    """Flux texte CSV d'un fichier d'entrée, en-tête compris.
+
+    start/end limitent un CSV brut à la plage d'octets [start, end), lue par mmap.
+    """
+    if start is not None:
+        return io.TextIOWrapper(io.BufferedReader(MappedRange(path, start, end), 1024 * 1024),
+                                encoding='utf-8', errors=INPUT_ERRORS)
+    return INPUT_READERS[input_format(path)](path)
+
+def read_header(path):
+    with open_input(path) as f:
+        return next(csv.reader(f), None)
+
+def resolve_inputs(args):
+    """Chemins des trois entrées : --nodes/--relations/--kqi, sinon --input-dir, sinon INPUT_*"""
+    inputs = {'nodes': INPUT_NODES, 'relations': INPUT_RELATIONS, 'kqi': INPUT_KQI}
+    if args.input_dir:
+        for kind in inputs:
+            candidates = [os.path.join(args.input_dir, f'{kind}{suffix}')
+                          for suffix in ('.csv', '.csv.gz', '.csv.zst', '.xlsx')]
+            found = next((path for path in candidates if os.path.exists(path)), None)
+            if found is None:
+                raise SystemExit(f"Aucun fichier {kind}.csv(.gz|.zst) ou {kind}.xlsx dans {args.input_dir}")
+            inputs[kind] = found
+    for kind in inputs:
+        inputs[kind] = getattr(args, kind) or inputs[kind]
+    return inputs
+
+# ============================================================================
+# CACHE DE LECTURE (--cache)
+# Les lignes produites par la lecture d'un fichier d'entrée (avant contrôle
+# d'intégrité, encodage et écriture) sont conservées sur disque en blocs
+# pickle. Une entrée est identifiée par le type d'entrée, l'empreinte SHA-256
+# du contenu (recalculée seulement si taille ou mtime changent) et celle du
+# script et de schema.kuzu, comme le manifeste de --incremental : toute
+# modification du code invalide le cache. Au-delà de la taille maximale,
+# les entrées les moins récemment utilisées sont supprimées. Le cache n'est
+# utile que si les mêmes entrées sont retransformées (mise au point du
+# code de sortie, reprise) ; il est désactivé par défaut.
+# ============================================================================
+
+PARSE_CACHE = None
+
+CACHE_VERSION = 3
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Empreinte du script et du schéma qui produisent les lignes mises en cache"""
+    digest = hashlib.sha256(f'{CACHE_VERSION}\x1f{pd is not None}'.encode('utf-8'))
+    for path in (os.path.abspath(__file__), SCHEMA_FILE):
+        digest.update(file_digest(path).encode('utf-8'))
+    return digest.hexdigest()
+
+class ParseRecorder:
+    """Enregistre les lignes produites, par blocs pickle, dans un fichier temporaire.
+
+    Chaque bloc est un couple (nouveaux types, [(numéro de type, ligne)]) ; un
+    type (numéro, destination, nom, colonnes) est décrit dans le bloc où il
+    apparaît. Les enregistrements des plages parallèles sont concaténés tels
+    quels : chacun redéclare ses numéros avant de les utiliser.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(f'{path}.tmp', 'wb')
+        self.slots = 0
+        self.new_slots = []
+        self.block = []
+
+    def slot(self, target, name, fieldnames):
+        self.new_slots.append((self.slots, target, name, list(fieldnames)))
+        self.slots += 1
+        return self.slots - 1
+
+    def flush(self):
+        if self.block:
+            pickle.dump((self.new_slots, self.block), self.f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.new_slots.clear()
+            self.block.clear()
+
+    def close(self):
+        """Termine l'enregistrement : le fichier complet remplace l'éventuel précédent"""
+        self.flush()
+        self.f.close()
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def discard(self):
+        self.f.close()
+        os.remove(f'{self.path}.tmp')
+
+class RecordingSink:
+    """Destination qui enregistre chaque ligne dans le cache avant de la transmettre"""
+
+    def __init__(self, sink, recorder, target):
+        self.sink = sink
+        self.recorder = recorder
+        self.target = target
+        self.slots = {}
+        self.block = recorder.block
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+    def write_row(self, name, fieldnames, row):
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = self.recorder.slot(self.target, name, fieldnames)
+        self.block.append((slot, row))
+        if len(self.block) >= CACHE_BLOCK_ROWS:
+            self.recorder.flush()
+        self.sink.write_row(name, fieldnames, row)
+
+    def write(self, name, record):
+        fieldnames = self.sink.fieldnames.get(name) or list(record)
+        self.write_row(name, fieldnames, [record.get(field, '') for field in fieldnames])
+
+    def close(self, report=True):
+        self.sink.close(report)
+
+def recording_outputs(nodes_out, relations_out, rejects_out, recorder):
+    return tuple(RecordingSink(sink, recorder, target)
+                 for target, sink in enumerate((nodes_out, relations_out, rejects_out)))
+
+class ParseCache:
+    """Entrées du cache de lecture et index (empreintes des fichiers, dates d'utilisation)"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, 'index.json')
+        index = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        if index is None or index.get('version') != CACHE_VERSION:
+            index = {'version': CACHE_VERSION, 'files': {}, 'entries': {}}
+        self.index = index
+        # La limite a pu être abaissée depuis l'exécution précédente
+        self.evict()
+
+    def key(self, kind, path):
+        """Clé d'entrée : type, empreinte du contenu et empreinte du code"""
+        stat = os.stat(path)
+        path = os.path.abspath(path)
+        known = self.index['files'].get(path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            content = known['sha256']
+        else:
+            content = file_digest(path)
+            self.index['files'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': content}
+        return hashlib.sha256(f'{kind}\x1f{content}\x1f{code_version()}'.encode('utf-8')).hexdigest()[:32]
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def lookup(self, key):
+        """True si l'entrée est disponible (sa date d'utilisation est alors mise à jour)"""
+        entry = self.index['entries'].get(key)
+        if entry is None or not os.path.exists(self.entry_path(key)):
+            return False
+        entry['last_used'] = time.time()
+        self.save()
+        return True
+
+    def replay(self, key, kind, nodes_out, relations_out, rejects_out):
+        """Rejoue les lignes d'une entrée dans les destinations, avec ses compteurs"""
+        writers = (nodes_out.write_row, relations_out.write_row, rejects_out.write_row)
+        slots = {}
+        with open(self.entry_path(key), 'rb') as f:
+            while True:
+                try:
+                    new_slots, block = pickle.load(f)
+                except EOFError:
+                    break
+                for slot, target, name, fieldnames in new_slots:
+                    slots[slot] = (writers[target], name, fieldnames)
+                for slot, row in block:
+                    write_row, name, fieldnames = slots[slot]
+                    write_row(name, fieldnames, row)
+        add_counters(kind, self.index['entries'][key]['counters'])
+
+    def store(self, key, kind, path, counters):
+        """Déclare une entrée écrite puis applique la limite de taille (LRU)"""
+        self.index['entries'][key] = {
+            'kind': kind,
+            'path': os.path.abspath(path),
+            'bytes': os.path.getsize(self.entry_path(key)),
+            'last_used': time.time(),
+            'counters': counters,
+        }
+        self.evict()
+        self.save()
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille maximale"""
+        entries = self.index['entries']
+        total = sum(entry['bytes'] for entry in entries.values())
+        for old_key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= entries.pop(old_key)['bytes']
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.entry_path(old_key))
+
+    def save(self):
+        temp_path = f'{self.index_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(temp_path, self.index_path)
+
+def input_counters(kind):
+    """Compteurs d'une entrée conservés avec ses lignes : erreurs JSON, rejets et lignes lues"""
+    return {'json_errors': dict(JSON_ERRORS), 'rejected': dict(REJECTED.get(kind, {})),
+            'rows': ROWS_READ.get(kind, 0)}
+
+def counters_since(kind, before):
+    """Compteurs ajoutés depuis la copie `before` de input_counters(kind)"""
+    after = input_counters(kind)
+    return {
+        'json_errors': {name: count - before['json_errors'].get(name, 0)
+                        for name, count in after['json_errors'].items()
+                        if count != before['json_errors'].get(name, 0)},
+        'rejected': {reason: count - before['rejected'].get(reason, 0)
+                     for reason, count in after['rejected'].items()
+                     if count != before['rejected'].get(reason, 0)},
+        'rows': after['rows'] - before['rows'],
+    }
+
+def add_counters(kind, counters):
+    merge_counts(JSON_ERRORS, counters['json_errors'])
+    if counters['rejected']:
+        merge_counts(REJECTED.setdefault(kind, {}), counters['rejected'])
+    ROWS_READ[kind] = ROWS_READ.get(kind, 0) + counters['rows']
+
+def run_transform(kind, path, output_dir, outputs=None, quarantine_dir=None, rejects_dir=None):
+    """Traite un fichier d'entrée complet en écrivant directement dans output_dir.
+
+    outputs remplace au besoin les writers CSV par d'autres destinations
+    (nodes_out, relations_out) exposant write_row(), write() et close().
+    Les relations invalides vont dans quarantine_dir (output_dir/quarantine),
+    les lignes d'entrée rejetées dans rejects_dir (output_dir/rejets).
+    """
+    if outputs is None:
+        outputs = (TypeWriters(os.path.join(output_dir, 'nodes')),
+                   TypeWriters(os.path.join(output_dir, 'relations')))
+    outputs = encoded_outputs(*outputs)
+    if VERSIONS is not None and kind == 'nodes':
+        outputs = (VersionedSink(outputs[0], VERSIONS), outputs[1])
+    elif VERSIONS is not None and kind == 'relations':
+        outputs = (outputs[0], VersionedSink(outputs[1], VERSIONS))
+    if CHAINS is not None and kind == 'relations':
+        outputs = (outputs[0], ChainEdges(outputs[1], CHAINS))
+    nodes_out, relations_out = checked_outputs(
+        *outputs, quarantine_dir or os.path.join(output_dir, 'quarantine'))
+    if METRICS is not None:
+        nodes_out, relations_out = MeteredSink(nodes_out, METRICS), MeteredSink(relations_out, METRICS)
+        METRICS.bytes_read[kind] = METRICS.bytes_read.get(kind, 0) + os.path.getsize(path)
+    rejects_out = TypeWriters(rejects_dir or os.path.join(output_dir, 'rejets'))
+    cache_key = PARSE_CACHE.key(kind, path) if PARSE_CACHE is not None else None
+    cached = cache_key is not None and PARSE_CACHE.lookup(cache_key)
+    recorder = None
+    if cache_key is not None and not cached:
+        recorder = ParseRecorder(PARSE_CACHE.entry_path(cache_key))
+        nodes_out, relations_out, rejects_out = recording_outputs(nodes_out, relations_out, rejects_out, recorder)
+    counters = input_counters(kind)
+    try:
+        if cached:
+            print(f"♻️  {os.path.basename(path)} : lignes relues depuis le cache")
+            PARSE_CACHE.replay(cache_key, kind, nodes_out, relations_out, rejects_out)
+        else:
+            with open_input(path) as f:
+                header = next(csv.reader(f), None)
+                if header is not None:
+                    transform_input(kind, f, header, nodes_out, relations_out,
+                                    lambda columns: Rejects(rejects_out, kind, columns,
+                                                            lambda: header_lines(header)),
+                                    os.path.basename(path))
+    except BaseException:
+        if recorder is not None:
+            recorder.discard()
+        raise
+    finally:
+        nodes_out.close()
+        relations_out.close()
+        rejects_out.close(report=False)
+    if recorder is not None:
+        recorder.close()
+        PARSE_CACHE.store(cache_key, kind, path, counters_since(kind, counters))
+    if METRICS is not None:
+        METRICS.add_rows('nodes', nodes_out.counts)
+        METRICS.add_rows('relations', relations_out.counts)
+
+def process_nodes():
+    """Traite le fichier nodes.csv et écrit un CSV par type au fil de la lecture"""
+    run_transform('nodes', INPUT_NODES, OUTPUT_DIR)
+
+def process_relations():
+    """Traite le fichier relations.csv et écrit un CSV par type au fil de la lecture"""
+    run_transform('relations', INPUT_RELATIONS, OUTPUT_DIR)
+
+def process_kqi():
+    """Traite le fichier kqi.csv (déjà bien structuré, juste renommer les colonnes)"""
+    run_transform('kqi', INPUT_KQI, OUTPUT_DIR)
+
+# ============================================================================
+# MODE PARALLÈLE
+# Chaque fichier d'entrée est découpé en plages d'octets alignées sur les fins
+# de ligne (un enregistrement par ligne dans les exports) ; une source
+# compressée ou Excel est traitée d'un seul tenant. Chaque plage produit
+# des fichiers partiels sans en-tête, concaténés ensuite dans l'ordre des
+# plages : le résultat est identique octet pour octet au mode séquentiel.
+# ============================================================================
+
+def split_ranges(path, count):
+    """Retourne (en-tête, [(début, fin)]) avec des plages alignées sur les fins de ligne.
+
+    Une source compressée ou Excel ne se découpe pas : une seule plage (None, None).
+    """
+    if input_format(path) != 'csv':
+        return read_header(path), [(None, None)]
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        first_line = f.readline()
+        header = next(csv.reader([first_line.decode('utf-8')]), None)
+        bounds = [len(first_line)]
+        count = max(1, min(count, (size - bounds[0]) // CHUNK_MIN_BYTES))
+        step = (size - bounds[0]) // count
+        for k in range(1, count):
+            # Avancer jusqu'au début de la ligne suivante
+            f.seek(bounds[0] + k * step - 1)
+            f.readline()
+            position = f.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return header, list(zip(bounds, bounds[1:]))
+
+def init_worker(index, versions):
+    """Initialise un processus de travail avec l'index des nœuds et les chaînes de versions
+    (transmis une seule fois)"""
+    global NODE_INDEX, VERSIONS
+    NODE_INDEX = index
+    VERSIONS = versions
+
+def run_chunk(kind, path, header, start, end, part_dir, metrics=False, record=False):
+    """Traite une plage d'octets dans un processus de travail"""
+    global METRICS
+    METRICS = Metrics() if metrics else None
+    if NODE_INDEX is not None and kind == 'nodes':
+        # Seuls les identifiants de cette plage sont renvoyés au processus principal
+        NODE_INDEX.ids = {}
+    nodes_out = TypeWriters(os.path.join(part_dir, 'nodes'), header=False)
+    relations_out = TypeWriters(os.path.join(part_dir, 'relations'), header=False)
+    os.makedirs(nodes_out.directory, exist_ok=True)
+    os.makedirs(relations_out.directory, exist_ok=True)
+    chains = SubcontractingChains() if kind == 'relations' else None
+    outputs = (nodes_out, relations_out)
+    if VERSIONS is not None and kind == 'nodes':
+        outputs = (VersionedSink(nodes_out, VERSIONS), relations_out)
+    elif VERSIONS is not None and kind == 'relations':
+        outputs = (nodes_out, VersionedSink(relations_out, VERSIONS))
+    if chains is not None:
+        outputs = (outputs[0], ChainEdges(outputs[1], chains))
+    outputs = checked_outputs(*outputs, os.path.join(part_dir, 'quarantine'), header=False)
+    if METRICS is not None:
+        outputs = (MeteredSink(outputs[0], METRICS), MeteredSink(outputs[1], METRICS))
+    rejects_out = TypeWriters(os.path.join(part_dir, 'rejets'), header=False)
+    outputs = (*outputs, rejects_out)
+    recorder = ParseRecorder(os.path.join(part_dir, 'cache.pkl')) if record else None
+    if recorder is not None:
+        outputs = recording_outputs(*outputs, recorder)
+    JSON_ERRORS.clear()
+    QUARANTINED.clear()
+    REJECTED.clear()
+    ROWS_READ.clear()
+    # Numéros de ligne absolus : lignes de l'en-tête, ou lignes qui précèdent la plage
+    lines_before_data = (lambda: header_lines(header)) if start is None else (lambda: lines_before(path, start))
+    with stage(kind):
+        try:
+            with open_input(path, start, end) as stream:
+                if start is None:
+                    # Source entière : son en-tête est déjà connu
+                    next(csv.reader(stream), None)
+                transform_input(kind, stream, header, outputs[0], outputs[1],
+                                lambda columns: Rejects(outputs[2], kind, columns, lines_before_data))
+        finally:
+            for out in outputs:
+                out.close(report=False)
+    if recorder is not None:
+        recorder.close()
+    return {
+        'part_dir': part_dir,
+        'cache': recorder.path if recorder is not None else None,
+        'nodes': nodes_out.summary(),
+        'relations': relations_out.summary(),
+        'quarantine': outputs[1].quarantine.summary() if NODE_INDEX is not None else [],
+        'rejects': rejects_out.summary(),
+        'json_errors': dict(JSON_ERRORS),
+        'rejected': REJECTED.get(kind, {}),
+        'rows': ROWS_READ.get(kind, 0),
+        'quarantined': dict(QUARANTINED),
+        'metrics': METRICS.to_dict() if METRICS is not None else None,
+        'ids': NODE_INDEX.ids if NODE_INDEX is not None and kind == 'nodes' else None,
+        'chains': chains.edges() if chains is not None else None,
+    }
+
+def merge_parts(directory, subdir, parts, output_format='csv', schema=None, report=True):
+    """Concatène les fichiers partiels dans l'ordre des plages, un fichier par type"""
+    fieldnames = {}
+    counts = {}
+    for part_dir, summaries in parts:
+        for name, columns, count in summaries:
+            fieldnames.setdefault(name, columns)
+            counts[name] = counts.get(name, 0) + count
+    if METRICS is not None and subdir in METRICS.rows:
+        METRICS.add_rows(subdir, counts)
+    
+    if output_format == 'parquet':
+        # Les parties CSV sont relues puis converties selon le schéma
+        with ParquetWriters(os.path.join(directory, subdir), schema) as out:
+            for name, columns in fieldnames.items():
+                for part_dir, _ in parts:
+                    part = os.path.join(part_dir, subdir, f'{name}.csv')
+                    if os.path.exists(part):
+                        with open(part, 'r', encoding='utf-8', newline='') as f:
+                            for row in csv.reader(f):
+                                out.write_row(name, columns, row)
+        return
+    
+    for name, columns in fieldnames.items():
+        os.makedirs(os.path.join(directory, subdir), exist_ok=True)
+        header = io.StringIO()
+        csv.writer(header).writerow(columns)
+        filepath = os.path.join(directory, subdir, f'{name}.csv')
+        with open(filepath, 'wb') as out:
+            out.write(header.getvalue().encode('utf-8'))
+            for part_dir, _ in parts:
+                part = os.path.join(part_dir, subdir, f'{name}.csv')
+                if os.path.exists(part):
+                    with open(part, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+        if report:
+            print(f"✓ {filepath} ({counts[name]} enregistrements)")
+
+def store_chunk_cache(key, kind, path, chunks):
+    """Assemble dans l'ordre des plages les enregistrements des processus en une entrée du cache"""
+    entry_path = PARSE_CACHE.entry_path(key)
+    counters = {'json_errors': {}, 'rejected': {}, 'rows': 0}
+    with open(f'{entry_path}.tmp', 'wb') as out:
+        for chunk in chunks:
+            with open(chunk['cache'], 'rb') as f:
+                shutil.copyfileobj(f, out)
+            merge_counts(counters['json_errors'], chunk['json_errors'])
+            merge_counts(counters['rejected'], chunk['rejected'])
+            counters['rows'] += chunk['rows']
+    os.replace(f'{entry_path}.tmp', entry_path)
+    PARSE_CACHE.store(key, kind, path, counters)
+
+def run_parallel(workers, output_dir=None, output_format='csv', schema=None):
+    """Traite nodes.csv, relations.csv et kqi.csv en parallèle sur `workers` processus"""
+    output_dir = output_dir or OUTPUT_DIR
+    parts_root = os.path.join(output_dir, '.parts')
+    inputs = [('nodes', INPUT_NODES), ('relations', INPUT_RELATIONS), ('kqi', INPUT_KQI)]
+    
+    titles = {
+        'nodes': "\n📦 Traitement des nœuds...",
+        'relations': "\n🔗 Traitement des relations...",
+        'kqi': "\n📊 Traitement des KQI...",
+    }
+    
+    def outputs():
+        if output_format == 'parquet':
+            return (ParquetWriters(os.path.join(output_dir, 'nodes'), schema),
+                    ParquetWriters(os.path.join(output_dir, 'relations'), schema))
+        return None
+    
+    # Avec le contrôle d'intégrité, les relations et KQI attendent l'index complet des nœuds
+    phases = [inputs] if NODE_INDEX is None else [inputs[:1], inputs[1:]]
+    results = {}
+    cache_keys = {}
+    for phase in phases:
+        jobs = {}
+        cached = []
+        with stage('parallel'), ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                    initargs=(NODE_INDEX, VERSIONS)) as pool:
+            for kind, path in phase:
+                if PARSE_CACHE is not None:
+                    cache_keys[kind] = PARSE_CACHE.key(kind, path)
+                    if PARSE_CACHE.lookup(cache_keys[kind]):
+                        cached.append((kind, path))
+                        continue
+                # kqi.csv reste d'un seul tenant : la déduplication KQI_MESURE_ST est globale
+                count = 1 if kind == 'kqi' else workers * CHUNKS_PER_WORKER
+                header, ranges = split_ranges(path, count)
+                if header is not None:
+                    check_header(kind, header, os.path.basename(path))
+                jobs[kind] = [
+                    pool.submit(run_chunk, kind, path, header, start, end,
+                                os.path.join(parts_root, f'{kind}-{index:05d}'), METRICS is not None,
+                                PARSE_CACHE is not None)
+                    for index, (start, end) in enumerate(ranges)
+                    if header is not None
+                ]
+                if METRICS is not None:
+                    METRICS.bytes_read[kind] = METRICS.bytes_read.get(kind, 0) + os.path.getsize(path)
+            # Les entrées déjà en cache sont rejouées ici pendant que les processus travaillent
+            for kind, path in cached:
+                print(titles[kind])
+                with stage(kind):
+                    run_transform(kind, path, output_dir, outputs())
+            for kind, futures in jobs.items():
+                results[kind] = [future.result() for future in futures]
         
-        # Déterminer les colonnes à partir du premier enregistrement
-        fieldnames = list(records[0].keys())
+        for kind, path in phase:
+            if kind in jobs and PARSE_CACHE is not None:
+                store_chunk_cache(cache_keys[kind], kind, path, results[kind])
+        for kind in jobs:
+            for chunk in results[kind]:
+                for name, count in chunk['json_errors'].items():
+                    JSON_ERRORS[name] = JSON_ERRORS.get(name, 0) + count
+                if chunk['rejected']:
+                    merge_counts(REJECTED.setdefault(kind, {}), chunk['rejected'])
+                ROWS_READ[kind] = ROWS_READ.get(kind, 0) + chunk['rows']
+                for name, count in chunk['quarantined'].items():
+                    QUARANTINED[name] = QUARANTINED.get(name, 0) + count
+                if chunk['metrics'] is not None:
+                    METRICS.merge(chunk['metrics'])
+                if chunk['ids'] is not None:
+                    NODE_INDEX.update(chunk['ids'])
+                if chunk['chains'] is not None and CHAINS is not None:
+                    CHAINS.update(chunk['chains'])
+    
+    for kind, _ in inputs:
+        if kind not in results:
+            continue
+        print(titles[kind])
+        chunks = results[kind]
+        with stage('merge'):
+            for subdir in ('nodes', 'relations'):
+                merge_parts(output_dir, subdir, [(chunk['part_dir'], chunk[subdir]) for chunk in chunks],
+                            output_format, schema)
+            # La quarantaine reste en CSV quel que soit le format de sortie
+            merge_parts(output_dir, 'quarantine', [(chunk['part_dir'], chunk['quarantine']) for chunk in chunks],
+                        report=False)
+            merge_parts(output_dir, 'rejets', [(chunk['part_dir'], chunk['rejects']) for chunk in chunks],
+                        report=False)
+    
+    shutil.rmtree(parts_root, ignore_errors=True)
+
+def run_all(workers, output_dir, output_format='csv', schema=None):
+    """Relève les chaînes de versions, traite les trois fichiers d'entrée vers output_dir,
+    puis les chaînes de sous-traitance"""
+    global CHAINS
+    os.makedirs(os.path.join(output_dir, 'nodes'), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, 'relations'), exist_ok=True)
+    shutil.rmtree(os.path.join(output_dir, 'quarantine'), ignore_errors=True)
+    shutil.rmtree(os.path.join(output_dir, 'rejets'), ignore_errors=True)
+    CHAINS = SubcontractingChains()
+    find_versions(INPUT_RELATIONS)
+    
+    def outputs():
+        if output_format == 'parquet':
+            return (ParquetWriters(os.path.join(output_dir, 'nodes'), schema),
+                    ParquetWriters(os.path.join(output_dir, 'relations'), schema))
+        return None
+    
+    if workers > 1:
+        run_parallel(workers, output_dir, output_format, schema)
+    else:
+        print("\n📦 Traitement des nœuds...")
+        with stage('nodes'):
+            run_transform('nodes', INPUT_NODES, output_dir, outputs())
         
-        with open(filepath, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in records:
-                # S'assurer que toutes les colonnes sont présentes
-                for field in fieldnames:
-                    if field not in record:
-                        record[field] = ''
-                writer.writerow(record)
+        print("\n🔗 Traitement des relations...")
+        with stage('relations'):
+            run_transform('relations', INPUT_RELATIONS, output_dir, outputs())
         
-        print(f"✓ {filepath} ({len(records)} enregistrements)")
+        print("\n📊 Traitement des KQI...")
+        with stage('kqi'):
+            run_transform('kqi', INPUT_KQI, output_dir, outputs())
+    
+    print("\n🧭 Fermeture des chaînes de sous-traitance...")
+    write_exposure(encoded_outputs(*(outputs() or (None, TypeWriters(os.path.join(output_dir, 'relations')))))[1],
+                   os.path.join(output_dir, 'quarantine'))
 
-def process_kqi():
-    """Traite le fichier kqi.csv (déjà bien structuré, juste renommer les colonnes)"""
-    records = []
+# ============================================================================
+# CONVERSION TYPÉE (types de schema.kuzu)
+# ============================================================================
+
+def _to_bool(value):
+    return value is True or str(value).lower() in ('true', '1')
+
+def _to_list(value):
+    return json.loads(value) if isinstance(value, str) else list(value)
+
+SCALAR_CONVERTERS = {
+    'STRING': str,
+    # Les valeurs déjà converties à la lecture ne sont pas relues
+    'DATE': lambda value: value if isinstance(value, date) else date.fromisoformat(value),
+    'INT8': int,
+    'INT16': int,
+    'INT32': int,
+    'INT64': int,
+    'DOUBLE': float,
+    'FLOAT': float,
+    'BOOLEAN': _to_bool,
+    'STRING[]': _to_list,
+}
+
+def value_converter(kuzu_type):
+    """Convertit une valeur produite par la transformation vers son type Kuzu ('' devient NULL)"""
+    convert = SCALAR_CONVERTERS[kuzu_type]
     
-    with open(INPUT_KQI, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            record = {
-                'id': row['ID_KQI'],
-                'sous_traitant_id': row['ID_SousTraitant'],
-                'sous_traitant_nom': row['Nom_SousTraitant'],
-                'indicateur': row['Indicateur'],
-                'periode': row['Periode'],
-                'valeur': row['Valeur'],
-                'seuil_alerte': row['Seuil_Alerte'],
-                'seuil_objectif': row['Seuil_Objectif'],
-                'statut': row['Statut'],
-                'tendance': row['Tendance']
-            }
-            records.append(record)
-    
-    filepath = os.path.join(OUTPUT_DIR, 'nodes', 'KQI.csv')
-    with open(filepath, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=records[0].keys())
-        writer.writeheader()
-        writer.writerows(records)
-    
-    print(f"✓ {filepath} ({len(records)} enregistrements)")
-    
-    # Créer les relations KQI → SousTraitant
-    rel_records = []
-    seen = set()
-    for row in records:
-        key = (row['sous_traitant_id'], row['id'])
-        if key not in seen:
-            seen.add(key)
-            rel_records.append({
-                'from': row['id'],
-                'to': row['sous_traitant_id'],
-                'periode': row['periode']
-            })
-    
-    filepath = os.path.join(OUTPUT_DIR, 'relations', 'KQI_MESURE_ST.csv')
-    with open(filepath, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=['from', 'to', 'periode'])
-        writer.writeheader()
-        writer.writerows(rel_records)
-    
-    print(f"✓ {filepath} ({len(rel_records)} enregistrements)")
-
-def generate_import_script():
-    """Génère le script d'import Kuzu"""
-    script = '''-- ============================================================================
--- SCRIPT D'IMPORT KUZU
--- Exécuter après avoir créé le schéma (schema.kuzu)
--- ============================================================================
-
--- Import des nœuds
-COPY SousTraitant FROM "nodes/SousTraitant.csv" (HEADER=true);
-COPY Contrat FROM "nodes/Contrat.csv" (HEADER=true);
-COPY AccordQualite FROM "nodes/AccordQualite.csv" (HEADER=true);
-COPY Audit FROM "nodes/Audit.csv" (HEADER=true);
-COPY Inspection FROM "nodes/Inspection.csv" (HEADER=true);
-COPY Finding FROM "nodes/Finding.csv" (HEADER=true);
-COPY EvenementQualite FROM "nodes/EvenementQualite.csv" (HEADER=true);
-COPY Decision FROM "nodes/Decision.csv" (HEADER=true);
-COPY EvaluationRisque FROM "nodes/EvaluationRisque.csv" (HEADER=true);
-COPY ReunionQualite FROM "nodes/ReunionQualite.csv" (HEADER=true);
-COPY EtudeClinique FROM "nodes/EtudeClinique.csv" (HEADER=true);
-COPY DomaineService FROM "nodes/DomaineService.csv" (HEADER=true);
-COPY ContexteReglementaire FROM "nodes/ContexteReglementaire.csv" (HEADER=true);
-COPY Alerte FROM "nodes/Alerte.csv" (HEADER=true);
-COPY Evenement FROM "nodes/Evenement.csv" (HEADER=true);
-
--- Import des relations
-COPY EST_LIE_AU_CONTRAT FROM "relations/EST_LIE_AU_CONTRAT.csv" (HEADER=true);
-COPY EST_COUVERT_PAR_QA FROM "relations/EST_COUVERT_PAR_QA.csv" (HEADER=true);
-COPY A_VERSION_SUIVANTE FROM "relations/A_VERSION_SUIVANTE.csv" (HEADER=true);
-COPY QA_A_VERSION_SUIVANTE FROM "relations/QA_A_VERSION_SUIVANTE.csv" (HEADER=true);
-COPY EST_SOUS_TRAITANT_DE FROM "relations/EST_SOUS_TRAITANT_DE.csv" (HEADER=true);
-COPY A_ETE_AUDITE_PAR FROM "relations/A_ETE_AUDITE_PAR.csv" (HEADER=true);
-COPY A_ETE_INSPECTE_PAR FROM "relations/A_ETE_INSPECTE_PAR.csv" (HEADER=true);
-COPY GENERE_FINDING FROM "relations/GENERE_FINDING.csv" (HEADER=true);
-COPY INSPECTION_GENERE_FINDING FROM "relations/INSPECTION_GENERE_FINDING.csv" (HEADER=true);
-COPY QE_CONCERNE_ST FROM "relations/QE_CONCERNE_ST.csv" (HEADER=true);
-COPY SURVENU_DANS_ETUDE FROM "relations/SURVENU_DANS_ETUDE.csv" (HEADER=true);
-COPY DECISION_JUSTIFIEE_PAR_AUDIT FROM "relations/DECISION_JUSTIFIEE_PAR_AUDIT.csv" (HEADER=true);
-COPY DECISION_JUSTIFIEE_PAR_QE FROM "relations/DECISION_JUSTIFIEE_PAR_QE.csv" (HEADER=true);
-COPY DECISION_JUSTIFIEE_PAR_INSPECTION FROM "relations/DECISION_JUSTIFIEE_PAR_INSPECTION.csv" (HEADER=true);
-COPY DECISION_JUSTIFIEE_PAR_FINDING FROM "relations/DECISION_JUSTIFIEE_PAR_FINDING.csv" (HEADER=true);
-COPY RESULTE_DE_EVALUATION FROM "relations/RESULTE_DE_EVALUATION.csv" (HEADER=true);
-COPY A_POUR_CONTEXTE FROM "relations/A_POUR_CONTEXTE.csv" (HEADER=true);
-COPY POSSEDE_SERVICE FROM "relations/POSSEDE_SERVICE.csv" (HEADER=true);
-COPY A_FAIT_OBJET_EVALUATION FROM "relations/A_FAIT_OBJET_EVALUATION.csv" (HEADER=true);
-COPY A_ETE_SUIVI_PAR FROM "relations/A_ETE_SUIVI_PAR.csv" (HEADER=true);
-COPY QE_DECLENCHE_ALERTE FROM "relations/QE_DECLENCHE_ALERTE.csv" (HEADER=true);
-COPY AUDIT_DECLENCHE_ALERTE FROM "relations/AUDIT_DECLENCHE_ALERTE.csv" (HEADER=true);
-COPY CAUSE_EVENEMENT FROM "relations/CAUSE_EVENEMENT.csv" (HEADER=true);
-COPY EVT_CONCERNE_ST FROM "relations/EVT_CONCERNE_ST.csv" (HEADER=true);
-COPY IMPLIQUE_ST FROM "relations/IMPLIQUE_ST.csv" (HEADER=true);
-'''
+    def converter(value):
+        if value is None or value == '':
+            return None
+        return convert(value)
+    return converter
+
+def arrow_type(pa, kuzu_type):
+    """Type Arrow correspondant à un type de schema.kuzu"""
+    return {
+        'STRING': pa.string(),
+        'DATE': pa.date32(),
+        'INT8': pa.int8(),
+        'INT16': pa.int16(),
+        'INT32': pa.int32(),
+        'INT64': pa.int64(),
+        'DOUBLE': pa.float64(),
+        'FLOAT': pa.float32(),
+        'BOOLEAN': pa.bool_(),
+        'STRING[]': pa.list_(pa.string()),
+    }[kuzu_type]
+
+def table_columns(entry):
+    """Colonnes (nom, type) attendues par COPY pour une table du schéma"""
+    if entry['kind'] == 'rel':
+        key_type = entry.get('key_type', 'STRING')
+        return [('from', key_type), ('to', key_type)] + entry['columns']
+    return entry['columns']
+
+def to_arrow_table(pa, name, entry, fieldnames, columns):
+    """Construit une table Arrow typée selon le schéma à partir de colonnes brutes.
+
+    Les colonnes absentes du schéma sont ignorées, celles absentes des
+    données sont remplies de NULL.
+    """
+    index = {field: i for i, field in enumerate(fieldnames)}
+    rows = len(columns[0]) if columns else 0
+    arrays = {}
+    for column, kuzu_type in table_columns(entry):
+        convert = value_converter(kuzu_type)
+        if column in index:
+            try:
+                values = [convert(value) for value in columns[index[column]]]
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{name}.{column} : valeur incompatible avec {kuzu_type} ({e})")
+        else:
+            values = [None] * rows
+        arrays[column] = pa.array(values, type=arrow_type(pa, kuzu_type))
+    return pa.table(arrays)
+
+# ============================================================================
+# CHARGEMENT DIRECT DANS KUZU
+# Les enregistrements sont accumulés en colonnes puis chargés par lots
+# (COPY depuis une table Arrow), sans fichiers CSV intermédiaires.
+# ============================================================================
+
+class KuzuLoader:
+    """Destination de transformation chargeant les lots directement dans une base Kuzu"""
+
+    def __init__(self, conn, schema, batch_rows=KUZU_BATCH_ROWS):
+        import pyarrow
+        self.pa = pyarrow
+        self.conn = conn
+        self.schema = schema
+        # batch_rows=None : tout est chargé à la fermeture
+        self.batch_rows = batch_rows
+        self.columns = {}
+        self.fieldnames = {}
+        self.counts = {}
+        self.skipped = {}
+
+    def write_row(self, name, fieldnames, row):
+        if name not in self.schema:
+            self.skipped[name] = self.skipped.get(name, 0) + 1
+            return
+        columns = self.columns.get(name)
+        if columns is None:
+            self.fieldnames[name] = list(fieldnames)
+            columns = self.columns[name] = [[] for _ in fieldnames]
+            self.counts[name] = 0
+        for column, value in zip(columns, row):
+            column.append(value)
+        self.counts[name] += 1
+        if self.batch_rows and len(columns[0]) >= self.batch_rows:
+            self.flush(name)
+
+    def write(self, name, record):
+        fieldnames = self.fieldnames.get(name) or list(record)
+        self.write_row(name, fieldnames, [record.get(field, '') for field in fieldnames])
+
+    def flush(self, name):
+        columns = self.columns[name]
+        if not columns[0]:
+            return
+        batch = to_arrow_table(self.pa, name, self.schema[name], self.fieldnames[name], columns)
+        # Kuzu lit la table Arrow référencée par son nom de variable
+        self.conn.execute(f'COPY {name} FROM batch')
+        self.columns[name] = [[] for _ in columns]
+
+    def close(self, report=True):
+        for name in self.columns:
+            self.flush(name)
+        if report:
+            for name, count in self.counts.items():
+                print(f"✓ {name} ({count} enregistrements chargés)")
+            for name, count in self.skipped.items():
+                print(f"⚠ {name} : table absente de schema.kuzu, {count} enregistrements ignorés")
+
+def schema_statements(path=None):
+    """Instructions CREATE NODE/REL TABLE de schema.kuzu, dans l'ordre du fichier"""
+    with open(path or SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        ddl = re.sub(r'--[^\n]*', '', f.read())
+    # Kuzu ne connaît pas NOT NULL et indexe seul la clé primaire :
+    # la contrainte est retirée et les CREATE INDEX du schéma ne sont pas rejoués
+    ddl = re.sub(r'\s+NOT\s+NULL', '', ddl)
+    return [stmt.strip() + ';' for stmt in ddl.split(';')
+            if re.match(r'\s*CREATE\s+(NODE|REL)\s+TABLE', stmt)]
+
+def kuzu_quarantine_dir(db_path):
+    """Quarantaine du chargement direct, à côté de la base (et non dans son dossier)"""
+    return os.path.normpath(db_path) + '.quarantine'
+
+def kuzu_rejects_dir(db_path):
+    """Lignes rejetées du chargement direct, à côté de la base"""
+    return os.path.normpath(db_path) + '.rejets'
+
+def load_into_kuzu(db_path, schema):
+    """Crée une base Kuzu locale et y charge directement les trois fichiers d'entrée"""
+    try:
+        import kuzu
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise SystemExit("Le chargement direct nécessite les paquets kuzu et pyarrow "
+                         "(pip install kuzu pyarrow)")
+    
+    if os.path.exists(db_path) and os.listdir(db_path):
+        raise SystemExit(f"La base {db_path} existe déjà : le chargement direct part d'une base vide")
+    quarantine_dir = kuzu_quarantine_dir(db_path)
+    rejects_dir = kuzu_rejects_dir(db_path)
+    shutil.rmtree(quarantine_dir, ignore_errors=True)
+    shutil.rmtree(rejects_dir, ignore_errors=True)
+    
+    db = kuzu.Database(db_path)
+    conn = kuzu.Connection(db)
+    
+    print("\n🧱 Création du schéma...")
+    statements = schema_ddl(schema) if ENCODER is not None else schema_statements()
+    for statement in statements:
+        conn.execute(statement)
+    print(f"✓ {len(statements)} tables créées dans {db_path}")
+    
+    # Tous les nœuds sont chargés avant les relations qui les référencent
+    global CHAINS
+    CHAINS = SubcontractingChains()
+    find_versions(INPUT_RELATIONS)
+    
+    print("\n📦 Chargement des nœuds...")
+    with stage('nodes'):
+        run_transform('nodes', INPUT_NODES, None, (KuzuLoader(conn, schema), KuzuLoader(conn, schema)),
+                      quarantine_dir, rejects_dir)
+    
+    print("\n🔗 Chargement des relations...")
+    with stage('relations'):
+        run_transform('relations', INPUT_RELATIONS, None,
+                      (KuzuLoader(conn, schema), KuzuLoader(conn, schema)), quarantine_dir, rejects_dir)
+    
+    print("\n📊 Chargement des KQI...")
+    # Les relations KQI_MESURE_ST attendent que tous les KQI soient chargés
+    with stage('kqi'):
+        run_transform('kqi', INPUT_KQI, None,
+                      (KuzuLoader(conn, schema), KuzuLoader(conn, schema, batch_rows=None)),
+                      quarantine_dir, rejects_dir)
+    
+    print("\n🧭 Fermeture des chaînes de sous-traitance...")
+    write_exposure(encoded_outputs(None, KuzuLoader(conn, schema))[1], quarantine_dir)
+
+# ============================================================================
+# SORTIE PARQUET
+# ============================================================================
+
+class ParquetWriters:
+    """Un fichier Parquet typé selon schema.kuzu par type de sortie, écrit par groupes de lignes"""
+
+    def __init__(self, directory, schema, row_group=PARQUET_ROW_GROUP):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("La sortie Parquet nécessite le paquet pyarrow (pip install pyarrow)")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.directory = directory
+        self.schema = schema
+        self.row_group = row_group
+        self.columns = {}
+        self.fieldnames = {}
+        self.writers = {}
+        self.counts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(report=exc_type is None)
+
+    def write_row(self, name, fieldnames, row):
+        columns = self.columns.get(name)
+        if columns is None:
+            self.fieldnames[name] = list(fieldnames)
+            columns = self.columns[name] = [[] for _ in fieldnames]
+            self.counts[name] = 0
+        for column, value in zip(columns, row):
+            column.append(value)
+        self.counts[name] += 1
+        if len(columns[0]) >= self.row_group:
+            self.flush(name)
+
+    def write(self, name, record):
+        fieldnames = self.fieldnames.get(name) or list(record)
+        self.write_row(name, fieldnames, [record.get(field, '') for field in fieldnames])
+
+    def flush(self, name):
+        columns = self.columns[name]
+        if not columns[0]:
+            return
+        # Table hors schéma : colonnes conservées telles quelles, en chaînes
+        entry = self.schema.get(name) or {
+            'kind': 'node', 'columns': [(field, 'STRING') for field in self.fieldnames[name]]}
+        table = to_arrow_table(self.pa, name, entry, self.fieldnames[name], columns)
+        writer = self.writers.get(name)
+        if writer is None:
+            filepath = os.path.join(self.directory, f'{name}.parquet')
+            writer = self.writers[name] = self.pq.ParquetWriter(filepath, table.schema, compression='zstd')
+        writer.write_table(table)
+        self.columns[name] = [[] for _ in columns]
+
+    def close(self, report=True):
+        try:
+            for name in self.columns:
+                self.flush(name)
+        finally:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers = {}
+        if report:
+            for name, count in self.counts.items():
+                filepath = os.path.join(self.directory, f'{name}.parquet')
+                print(f"✓ {filepath} ({count} enregistrements)")
+
+# ============================================================================
+# SCRIPT D'IMPORT (généré depuis schema.kuzu)
+# Les fichiers produits sont confrontés au schéma avant l'écriture du
+# script : colonnes dans l'ordre du DDL (COPY associe par position),
+# valeurs compatibles avec leur type et extrémités de chaque relation
+# présentes dans les fichiers de nœuds écrits. Seules les tables ayant des
+# données reçoivent un COPY, nœuds d'abord puis relations.
+# ============================================================================
+
+def _check_int(bits):
+    bound = 1 << (bits - 1)
+    
+    def check(value):
+        if not -bound <= int(value) < bound:
+            raise ValueError(f"hors de l'intervalle INT{bits}")
+    return check
+
+def _check_bool(value):
+    if value.lower() not in ('true', 'false'):
+        raise ValueError("attendu true ou false")
+
+def _check_list(value):
+    if not (value.startswith('[') and value.endswith(']')):
+        raise ValueError("liste attendue entre crochets")
+
+# Contrôle d'une valeur CSV non vide par type Kuzu (ValueError si invalide)
+CSV_CHECKS = {
+    'DATE': date.fromisoformat,
+    'INT8': _check_int(8),
+    'INT16': _check_int(16),
+    'INT32': _check_int(32),
+    'INT64': _check_int(64),
+    'DOUBLE': float,
+    'FLOAT': float,
+    'BOOLEAN': _check_bool,
+    'STRING[]': _check_list,
+}
+
+def check_csv_output(path, columns, endpoints=None):
+    """Retourne (nombre de lignes, anomalies, identifiants) d'un CSV produit, confronté aux colonnes du schéma.
+
+    Table de nœuds : identifiants = ensemble des valeurs de la colonne id.
+    Relation : endpoints = (identifiants FROM, identifiants TO) auxquels
+    chaque extrémité est confrontée.
+    """
+    expected = [column for column, _ in columns]
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if header != expected:
+            return 0, [f"colonnes {header} au lieu de {expected}"], None
+        checks = [(position, CSV_CHECKS[kuzu_type]) for position, (_, kuzu_type) in enumerate(columns)
+                  if kuzu_type in CSV_CHECKS]
+        width = len(expected)
+        problems = []
+        rows = 0
+        ids = set() if 'id' in expected and endpoints is None else None
+        key = expected.index('id') if ids is not None else None
+        missing = [0, 0]
+        examples = [None, None]
+        for rows, row in enumerate(reader, 1):
+            if len(row) != width:
+                problems.append(f"ligne {rows + 1} : {len(row)} valeurs au lieu de {width}")
+                break
+            if ids is not None:
+                ids.add(row[key])
+            elif endpoints is not None:
+                for role in (0, 1):
+                    if row[role] not in endpoints[role]:
+                        missing[role] += 1
+                        examples[role] = examples[role] or (rows + 1, row[role])
+            try:
+                for position, check in checks:
+                    if row[position]:
+                        check(row[position])
+            except ValueError:
+                # Détail de la ligne fautive ; une anomalie par colonne suffit à bloquer l'import
+                for position, check in list(checks):
+                    column, kuzu_type = columns[position]
+                    try:
+                        if row[position]:
+                            check(row[position])
+                    except ValueError as e:
+                        problems.append(f"ligne {rows + 1}, {column} = {row[position]!r} : "
+                                        f"pas un {kuzu_type} ({e})")
+                        checks.remove((position, check))
+    problems += endpoint_problems(missing, examples)
+    return rows, problems, ids
+
+def endpoint_problems(missing, examples):
+    """Anomalies des extrémités (FROM, TO) absentes des fichiers de nœuds"""
+    return [f"{count} relation(s) dont l'extrémité {role} est absente des nœuds écrits "
+            f"(ex. ligne {examples[k][0]} : {examples[k][1]!r})"
+            for k, (role, count) in enumerate(zip(('from', 'to'), missing)) if count]
+
+def check_parquet_output(path, name, entry, endpoints=None):
+    """Retourne (nombre de lignes, anomalies, identifiants) d'un fichier Parquet produit (voir check_csv_output)"""
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+    metadata = pyarrow.parquet.read_metadata(path)
+    actual = [(field.name, field.type) for field in metadata.schema.to_arrow_schema()]
+    expected = [(column, arrow_type(pyarrow, kuzu_type)) for column, kuzu_type in table_columns(entry)]
+    if actual != expected:
+        return metadata.num_rows, [f"schéma Parquet {actual} au lieu de {expected}"], None
+    if endpoints is None:
+        if entry['kind'] != 'node':
+            return metadata.num_rows, [], None
+        return metadata.num_rows, [], set(pyarrow.parquet.read_table(path, columns=['id'])['id'].to_pylist())
+    table = pyarrow.parquet.read_table(path, columns=['from', 'to'])
+    missing = [0, 0]
+    examples = [None, None]
+    for role, column in enumerate(('from', 'to')):
+        values = table[column]
+        absent = pyarrow.compute.invert(pyarrow.compute.is_in(
+            values, value_set=pyarrow.array(list(endpoints[role]), values.type)))
+        missing[role] = pyarrow.compute.sum(absent).as_py() or 0
+        if missing[role]:
+            position = pyarrow.compute.index(absent, True).as_py()
+            examples[role] = (position + 1, values[position].as_py())
+    return metadata.num_rows, endpoint_problems(missing, examples), None
+
+def check_output(path, name, entry, endpoints=None):
+    if path.endswith('.parquet'):
+        return check_parquet_output(path, name, entry, endpoints)
+    return check_csv_output(path, table_columns(entry), endpoints)
+
+def check_outputs(schema, output_dir, output_format='csv', workers=1):
+    """Confronte les fichiers de output_dir au schéma (un fichier par processus si workers > 1).
+
+    Retourne ({table: lignes} des tables ayant des données, [anomalies]).
+    """
+    extension = '.parquet' if output_format == 'parquet' else '.csv'
+    files = []
+    for subdir, kind in (('nodes', 'node'), ('relations', 'rel')):
+        directory = os.path.join(output_dir, subdir)
+        filenames = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        for filename in filenames:
+            if not filename.endswith(extension):
+                continue
+            name = filename[:-len(extension)]
+            path = os.path.join(directory, filename)
+            entry = schema.get(name)
+            if entry is None or entry['kind'] != kind:
+                print(f"⚠ {path} : table absente de schema.kuzu, non importée")
+                continue
+            files.append((f'{subdir}/{filename}', path, name, entry))
     
+    def run_checks(jobs):
+        if workers > 1 and len(jobs) > 1:
+            # Les plus gros fichiers d'abord pour équilibrer les processus
+            order = sorted(range(len(jobs)), key=lambda k: -os.path.getsize(jobs[k][0]))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {k: pool.submit(check_output, *jobs[k]) for k in order}
+                return [futures[k].result() for k in range(len(jobs))]
+        return [check_output(*job) for job in jobs]
+    
+    # Nœuds d'abord : leurs identifiants servent au contrôle des extrémités des relations
+    node_files = [file for file in files if file[3]['kind'] == 'node']
+    rel_files = [file for file in files if file[3]['kind'] == 'rel']
+    results = run_checks([(path, name, entry) for _, path, name, entry in node_files])
+    ids = {name: result[2] or set() for (_, _, name, _), result in zip(node_files, results)}
+    results += run_checks([(path, name, entry, (ids.get(entry['from'], set()), ids.get(entry['to'], set())))
+                           for _, path, name, entry in rel_files])
+    
+    counts = {}
+    problems = []
+    for (relpath, _, name, _), (rows, issues, _) in zip(node_files + rel_files, results):
+        problems += [f"{relpath} : {issue}" for issue in issues]
+        if rows:
+            counts[name] = rows
+    
+    # Une relation ne peut être chargée que si ses deux tables de nœuds le sont
+    for name, entry in schema.items():
+        if entry['kind'] == 'rel' and name in counts:
+            for endpoint in (entry['from'], entry['to']):
+                if endpoint not in counts:
+                    problems.append(f"relations/{name}{extension} : {counts[name]} relation(s) "
+                                    f"vers la table {endpoint} sans données")
+    return counts, problems
+
+def generate_import_script(schema, output_format='csv', workers=1):
+    """Génère import.kuzu depuis le schéma, après contrôle des fichiers produits"""
     filepath = os.path.join(OUTPUT_DIR, 'import.kuzu')
+    counts, problems = check_outputs(schema, OUTPUT_DIR, output_format, workers)
+    if problems:
+        for problem in problems:
+            print(f"✗ {problem}")
+        # Un ancien script ne doit pas être rejoué sur les nouveaux fichiers
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise SystemExit(f"import.kuzu non généré : {len(problems)} incohérence(s) avec le schéma")
+    
+    schema_file = 'schema_encoded.kuzu' if ENCODER is not None else 'schema.kuzu'
+    lines = [
+        '-- ============================================================================',
+        "-- SCRIPT D'IMPORT KUZU (généré depuis le schéma)",
+        f'-- Exécuter après avoir créé le schéma ({schema_file})',
+        '-- Les COPY d\'une même étape sont indépendants et peuvent être répartis',
+        '-- sur plusieurs connexions ; une étape attend la fin de la précédente.',
+        '-- ============================================================================',
+    ]
+    for kind, subdir, title in (('node', 'nodes', "Étape 1 : nœuds"),
+                                ('rel', 'relations', "Étape 2 : relations (tables de nœuds chargées)")):
+        tables = [name for name, entry in schema.items() if entry['kind'] == kind]
+        lines += ['', f'-- {title}']
+        for name in tables:
+            if name not in counts:
+                continue
+            if output_format == 'parquet':
+                lines.append(f'COPY {name} FROM "{subdir}/{name}.parquet";')
+            else:
+                lines.append(f'COPY {name} FROM "{subdir}/{name}.csv" (HEADER=true);')
+        empty = [name for name in tables if name not in counts]
+        if empty:
+            lines.append(f"-- Sans données : {', '.join(empty)}")
+    
     with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(script)
+        f.write('\n'.join(lines) + '\n')
+    print(f"✓ {filepath} ({len(counts)} tables)")
+
+def generate_encoded_schema(schema):
+    """Écrit schema_encoded.kuzu, à exécuter à la place de schema.kuzu avant import.kuzu"""
+    lines = [
+        '-- ============================================================================',
+        '-- KG-OVERSIGHT - SCHÉMA KUZU ENCODÉ (transform_to_kuzu.py --encode)',
+        '-- Clés entières : correspondances dans encodage/identifiants/',
+        '-- Colonnes énumérées : dictionnaires dans encodage/dictionnaires/',
+        '-- ============================================================================',
+        '',
+    ] + schema_ddl(schema)
+    filepath = os.path.join(OUTPUT_DIR, 'schema_encoded.kuzu')
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    print(f"✓ {filepath}")
+
+# ============================================================================
+# MODE INCRÉMENTAL
+# manifest.json (à côté de import.kuzu) conserve l'empreinte des entrées et
+# de chaque fichier produit. Un fichier modifié est comparé ligne à ligne à
+# sa version précédente, toujours présente dans le dossier de sortie : les
+# empreintes par clé (id des nœuds, couple from/to des relations) tiennent
+# dans des tableaux numpy de 16 octets par ligne et ne sont jamais stockées.
+# Seuls les fichiers modifiés sont réécrits et import_delta.kuzu rejoue
+# uniquement les différences.
+# ============================================================================
+
+MANIFEST_VERSION = 2
+
+def file_digest(path):
+    """Empreinte SHA-256 d'un fichier, lu par blocs"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def row_hashes(path, subdir):
+    """Retourne (en-tête, clé de chaque ligne, empreinte de chaque ligne) d'un fichier produit.
+
+    Clés et empreintes sont des hachages 64 bits (uint64), dans l'ordre du fichier.
+    """
+    width = 1 if subdir == 'nodes' else 2
+    keys, hashes = array('Q'), array('Q')
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        for row in reader:
+            keys.append(_hash64('\x1f'.join(row[:width])))
+            hashes.append(_hash64('\x1f'.join(row)))
+    return header, np.frombuffer(keys, dtype=np.uint64), np.frombuffer(hashes, dtype=np.uint64)
+
+def key_digests(keys, hashes):
+    """Regroupe les empreintes par clé : (clés triées uniques, empreinte de chaque clé).
+
+    Les relations en double entre deux mêmes nœuds sont additionnées (modulo
+    2**64) : ajouter ou retirer une occurrence change l'empreinte du couple.
+    """
+    if not len(keys):
+        return keys, hashes
+    order = np.argsort(keys, kind='stable')
+    keys, hashes = keys[order], hashes[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[starts], np.add.reduceat(hashes, starts)
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+def write_delta_rows(path, header, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def write_selected_rows(source, path, header, selected, width=None):
+    """Recopie vers path les lignes de source dont selected (un booléen par ligne) est vrai.
+
+    width : ne garder que les premières colonnes (clés des suppressions).
+    """
+    with open(source, 'r', encoding='utf-8', newline='') as f, \
+         open(path, 'w', encoding='utf-8', newline='') as out:
+        reader = csv.reader(f)
+        writer = csv.writer(out)
+        next(reader, None)
+        writer.writerow(header)
+        for row, keep in zip(reader, selected.tolist()):
+            if keep:
+                writer.writerow(row[:width] if width else row)
+
+def first_occurrences(keys, selected):
+    """Restreint selected à la première ligne de chaque clé"""
+    first = np.zeros(len(keys), dtype=bool)
+    first[np.unique(keys, return_index=True)[1]] = True
+    return selected & first
+
+def check_previous(target, entry):
+    """Vérifie que la version précédente d'un fichier produit est celle du manifeste"""
+    if not os.path.exists(target) or file_digest(target) != entry['sha256']:
+        raise SystemExit(f"❌ {target} a changé depuis la dernière exécution : supprimer manifest.json "
+                         "et recharger la base avec import.kuzu")
+
+def diff_output(relpath, staged, target, previous, delta_dir):
+    """Compare un fichier produit à sa version précédente (target) et écrit ses fichiers delta.
+
+    previous : entrée du manifeste de target (None au premier passage).
+    Retourne (entrée du manifeste, changements) où changements vaut None si
+    le fichier est inchangé, sinon {'upserts', 'deletes', 'header'}. Sans
+    delta_dir (premier passage), rien n'est comparé.
+
+    Un nœud modifié est rejoué par MERGE. Pour les relations, la clé est le
+    couple from/to : tout couple modifié est supprimé puis recréé avec
+    chacune de ses occurrences, ce qui conserve les relations en double.
+    """
+    subdir, filename = relpath.split('/')
+    name = filename[:-len('.csv')]
+    entry = {'sha256': file_digest(staged)}
+    if previous is not None and previous['sha256'] == entry['sha256']:
+        return previous, None
+    if delta_dir is None:
+        return entry, {'header': [], 'upserts': 0, 'deletes': 0}
+    if previous is not None:
+        check_previous(target, previous)
+    
+    header, keys, hashes = row_hashes(staged, subdir)
+    unique_keys, digests = key_digests(keys, hashes)
+    if previous is not None:
+        _, old_row_keys, old_hashes = row_hashes(target, subdir)
+    else:
+        old_row_keys = old_hashes = np.zeros(0, dtype=np.uint64)
+    old_keys, old_digests = key_digests(old_row_keys, old_hashes)
+    
+    if len(old_keys):
+        position = np.minimum(np.searchsorted(old_keys, unique_keys), len(old_keys) - 1)
+        known = old_keys[position] == unique_keys
+        unchanged = known & (old_digests[position] == digests)
+    else:
+        known = unchanged = np.zeros(len(unique_keys), dtype=bool)
+    upserted = unique_keys[~unchanged]
+    removed = old_keys[~np.isin(old_keys, unique_keys, assume_unique=True)]
+    if subdir != 'nodes':
+        # Couples modifiés : anciennes occurrences supprimées avant recréation
+        removed = np.concatenate((removed, unique_keys[known & ~unchanged]))
     
+    # Les fichiers delta des relations renomment from/to (mots réservés Cypher)
+    delta_header = header if subdir == 'nodes' else ['source_id', 'cible_id'] + header[2:]
+    os.makedirs(os.path.join(delta_dir, subdir), exist_ok=True)
+    upserts = np.isin(keys, upserted)
+    deletes = first_occurrences(old_row_keys, np.isin(old_row_keys, removed))
+    if upserts.any():
+        write_selected_rows(staged, os.path.join(delta_dir, subdir, f'{name}.csv'), delta_header, upserts)
+    if deletes.any():
+        width = 1 if subdir == 'nodes' else 2
+        write_selected_rows(target, os.path.join(delta_dir, subdir, f'{name}_suppressions.csv'),
+                            delta_header[:width], deletes, width)
+    
+    return entry, {'header': delta_header, 'upserts': int(upserts.sum()), 'deletes': int(deletes.sum())}
+
+def load_with_headers(path, columns, types):
+    """LOAD FROM typé : les valeurs vides des colonnes non STRING sont lues comme NULL"""
+    declared = ', '.join(f'`{column}` {types.get(column, "STRING")}' for column in columns)
+    return f'LOAD WITH HEADERS ({declared}) FROM "{path}" (HEADER=true)'
+
+def generate_delta_script(changes, schema, output_dir):
+    """Génère import_delta.kuzu (LOAD FROM ... MERGE / CREATE / DELETE) à partir des changements"""
+    lines = [
+        '-- ============================================================================',
+        "-- SCRIPT D'IMPORT INCRÉMENTAL KUZU",
+        '-- À rejouer sur une base déjà chargée avec import.kuzu',
+        '-- ============================================================================',
+        '',
+    ]
+    node_upserts, rel_deletes, rel_upserts, node_deletes = [], [], [], []
+    
+    for relpath, change in changes.items():
+        subdir, filename = relpath.split('/')
+        name = filename[:-len('.csv')]
+        table = schema.get(name)
+        if table is None:
+            lines.append(f'-- {name} : table absente de schema.kuzu, delta non rejoué')
+            continue
+        types = {'id': 'STRING', 'source_id': 'STRING', 'cible_id': 'STRING', **dict(table['columns'])}
+        header = change['header']
+        width = 1 if subdir == 'nodes' else 2
+        upsert_load = load_with_headers(f'delta/{subdir}/{name}.csv', header, types)
+        delete_load = load_with_headers(f'delta/{subdir}/{name}_suppressions.csv', header[:width], types)
+        
+        if subdir == 'nodes':
+            columns = [c for c in header[1:] if c in types]
+            assignments = ',\n    '.join(f'n.{c} = {c}' for c in columns)
+            if change['upserts']:
+                node_upserts.append(f"{upsert_load}\nMERGE (n:{name} {{id: id}})\nSET {assignments};")
+            if change['deletes']:
+                node_deletes.append(f"{delete_load}\nMATCH (n:{name} {{id: id}})\nDETACH DELETE n;")
+        else:
+            endpoints = (f"MATCH (a:{table['from']} {{id: source_id}}), (b:{table['to']} {{id: cible_id}})")
+            if change['upserts']:
+                # CREATE et non MERGE : chaque occurrence d'un couple modifié est recréée
+                properties = ', '.join(f'{c}: {c}' for c in header[2:] if c in types)
+                properties = f' {{{properties}}}' if properties else ''
+                rel_upserts.append(f"{upsert_load}\n{endpoints}\nCREATE (a)-[r:{name}{properties}]->(b);")
+            if change['deletes']:
+                rel_deletes.append(f"{delete_load}\n"
+                                   f"MATCH (a:{table['from']} {{id: source_id}})-[r:{name}]->"
+                                   f"(b:{table['to']} {{id: cible_id}})\nDELETE r;")
+    
+    for title, statements in (("Nœuds ajoutés ou modifiés", node_upserts),
+                              ("Relations supprimées", rel_deletes),
+                              ("Relations ajoutées ou modifiées", rel_upserts),
+                              ("Nœuds supprimés", node_deletes)):
+        if statements:
+            lines += ['', f'-- {title}'] + statements
+    
+    filepath = os.path.join(output_dir, 'import_delta.kuzu')
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
     print(f"✓ {filepath}")
 
-def main():
+def run_incremental(workers, schema):
+    """Transforme vers un répertoire temporaire et ne réécrit que les fichiers modifiés"""
+    manifest_path = os.path.join(OUTPUT_DIR, 'manifest.json')
+    manifest = load_manifest(manifest_path)
+    
+    inputs = {
+        kind: {'path': path, 'sha256': file_digest(path)}
+        for kind, path in (('nodes', INPUT_NODES), ('relations', INPUT_RELATIONS), ('kqi', INPUT_KQI))
+    }
+    code = code_version()
+    outputs = manifest['outputs'] if manifest else {}
+    
+    if (manifest and manifest['inputs'] == inputs and manifest['code'] == code
+            and all(os.path.exists(os.path.join(OUTPUT_DIR, relpath)) for relpath in outputs)):
+        print("\n♻️  Entrées inchangées depuis la dernière exécution, aucun fichier réécrit")
+        generate_delta_script({}, schema, OUTPUT_DIR)
+        return
+    
+    staging = os.path.join(OUTPUT_DIR, '.staging')
+    delta_dir = os.path.join(OUTPUT_DIR, 'delta')
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.rmtree(delta_dir, ignore_errors=True)
+    os.makedirs(os.path.join(OUTPUT_DIR, 'nodes'), exist_ok=True)
+    os.makedirs(os.path.join(OUTPUT_DIR, 'relations'), exist_ok=True)
+    run_all(workers, staging)
+    
+    print("\n♻️  Comparaison avec le manifeste...")
+    new_outputs = {}
+    changes = {}
+    replaced, disappeared = [], []
+    for subdir in ('nodes', 'relations'):
+        for filename in sorted(os.listdir(os.path.join(staging, subdir))):
+            relpath = f'{subdir}/{filename}'
+            target = os.path.join(OUTPUT_DIR, relpath)
+            entry, change = diff_output(relpath, os.path.join(staging, relpath), target,
+                                        outputs.get(relpath), delta_dir if manifest else None)
+            new_outputs[relpath] = entry
+            if change is None and os.path.exists(target):
+                continue
+            replaced.append(relpath)
+            if change is not None:
+                changes[relpath] = change
+    
+    # Types disparus de l'export : toutes leurs lignes sont supprimées
+    for relpath, entry in outputs.items():
+        if relpath in new_outputs:
+            continue
+        subdir = relpath.split('/')[0]
+        name = os.path.basename(relpath)[:-len('.csv')]
+        target = os.path.join(OUTPUT_DIR, relpath)
+        header = ['id'] if subdir == 'nodes' else ['source_id', 'cible_id']
+        check_previous(target, entry)
+        _, keys, _ = row_hashes(target, subdir)
+        deletes = first_occurrences(keys, np.ones(len(keys), dtype=bool))
+        if deletes.any():
+            os.makedirs(os.path.join(delta_dir, subdir), exist_ok=True)
+            write_selected_rows(target, os.path.join(delta_dir, subdir, f'{name}_suppressions.csv'),
+                                header, deletes, len(header))
+        changes[relpath] = {'header': header, 'upserts': 0, 'deletes': int(deletes.sum())}
+        disappeared.append(relpath)
+    
+    # Fichiers remplacés une fois toutes les comparaisons faites : les versions
+    # précédentes servent de référence jusque-là
+    for relpath in replaced:
+        target = os.path.join(OUTPUT_DIR, relpath)
+        os.replace(os.path.join(staging, relpath), target)
+        if manifest is None:
+            print(f"✎ {target}")
+        elif relpath in changes:
+            print(f"✎ {target} (+/~{changes[relpath]['upserts']} -{changes[relpath]['deletes']})")
+    for relpath in disappeared:
+        target = os.path.join(OUTPUT_DIR, relpath)
+        os.remove(target)
+        print(f"✗ {target} (-{changes[relpath]['deletes']})")
+    
+    for subdir in ('quarantine', 'rejets'):
+        shutil.rmtree(os.path.join(OUTPUT_DIR, subdir), ignore_errors=True)
+        if os.path.isdir(os.path.join(staging, subdir)):
+            os.replace(os.path.join(staging, subdir), os.path.join(OUTPUT_DIR, subdir))
+    shutil.rmtree(staging, ignore_errors=True)
+    
+    if manifest is None:
+        print("   Premier passage incrémental : charger la base avec import.kuzu")
+    else:
+        print(f"   {len(changes)} fichier(s) modifié(s) sur {len(new_outputs)}")
+        generate_delta_script(changes, schema, OUTPUT_DIR)
+    
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'code': code, 'inputs': inputs, 'outputs': new_outputs}, f)
+    print(f"✓ {manifest_path}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="KG-Oversight - Transformation CSV vers format Kuzu")
+    parser.add_argument('--input-dir', metavar='DOSSIER',
+                        help="dossier contenant nodes, relations et kqi (.csv, .csv.gz, .csv.zst ou .xlsx)")
+    for kind in ('nodes', 'relations', 'kqi'):
+        parser.add_argument(f'--{kind}', metavar='FICHIER',
+                            help=f"fichier {kind} (CSV brut, .gz, .zst ou .xlsx ; remplace --input-dir)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="nombre de processus (1 = traitement séquentiel)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="ne réécrire que les fichiers modifiés et générer import_delta.kuzu")
+    parser.add_argument('--kuzu-db', metavar='DOSSIER',
+                        help="charger directement une base Kuzu locale (sans CSV intermédiaires)")
+    parser.add_argument('--format', choices=('csv', 'parquet'), default='csv',
+                        help="format des fichiers produits (parquet : colonnes typées selon schema.kuzu)")
+    parser.add_argument('--encode', action='store_true',
+                        help="clés entières par table et colonnes énumérées encodées par dictionnaire "
+                             "(correspondances dans encodage/, schéma dans schema_encoded.kuzu)")
+    parser.add_argument('--cache', action='store_true',
+                        help="conserver les lignes lues par fichier d'entrée et les relire tant que "
+                             "l'entrée et le script sont inchangés")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, metavar='DOSSIER',
+                        help=f"dossier du cache de lecture (défaut : {CACHE_DIR})")
+    parser.add_argument('--cache-max-mb', type=int, default=CACHE_MAX_MB, metavar='MO',
+                        help=f"taille maximale du cache, entrées les moins récentes supprimées (défaut : {CACHE_MAX_MB})")
+    parser.add_argument('--max-rejets', type=float, metavar='POURCENT',
+                        help="part maximale de lignes écartées (rejets et quarantaine) au-delà de laquelle "
+                             "l'exécution échoue (défaut : pas de limite)")
+    parser.add_argument('--no-integrity-check', action='store_true',
+                        help="ne pas contrôler les extrémités des relations (économise l'index des identifiants)")
+    parser.add_argument('--metrics', metavar='FICHIER',
+                        help="écrire les mesures de l'exécution (FICHIER.prom : textfile Prometheus, sinon JSON)")
+    parser.add_argument('--profile', metavar='FICHIER',
+                        help="profil cProfile du processus principal (lisible avec pstats ou snakeviz)")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="ajouter aux mesures le pic d'allocation et les principales sources (avec --metrics)")
+    args = parser.parse_args(argv)
+    if args.kuzu_db and (args.incremental or args.workers > 1):
+        parser.error("--kuzu-db ne se combine pas avec --incremental ni --workers")
+    if args.format == 'parquet' and args.incremental:
+        parser.error("--incremental compare des fichiers CSV et ne se combine pas avec --format parquet")
+    if args.incremental and np is None:
+        parser.error("--incremental nécessite numpy (empreintes des lignes)")
+    if args.encode and (args.incremental or args.workers > 1):
+        # Les clés sont attribuées dans l'ordre d'écriture d'un seul processus
+        parser.error("--encode ne se combine pas avec --incremental ni --workers")
+    if args.max_rejets is not None and not 0 <= args.max_rejets <= 100:
+        parser.error("--max-rejets attend un pourcentage entre 0 et 100")
+    if args.tracemalloc and not args.metrics:
+        parser.error("--tracemalloc nécessite --metrics")
+    return args
+
+def main(argv=None):
+    global METRICS
+    args = parse_args(argv)
+    if args.metrics:
+        METRICS = Metrics()
+    if args.tracemalloc:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if args.profile else None
+    
+    try:
+        if profiler is not None:
+            profiler.enable()
+        run(args)
+        if METRICS is not None:
+            METRICS.success = True
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if METRICS is not None:
+            # Écrit aussi en cas d'échec : le suivi voit success = 0
+            if args.tracemalloc:
+                snapshot = tracemalloc.take_snapshot()
+                METRICS.memory = {
+                    'peak_bytes': tracemalloc.get_traced_memory()[1],
+                    'top': [{'line': str(stat.traceback), 'bytes': stat.size}
+                            for stat in snapshot.statistics('lineno')[:10]],
+                }
+                tracemalloc.stop()
+            output = args.kuzu_db or OUTPUT_DIR
+            METRICS.output_bytes = directory_size(output) if os.path.isdir(output) else 0
+            METRICS.write(args.metrics)
+
+def run(args):
+    """Exécute la transformation demandée par les arguments de la ligne de commande"""
+    global NODE_INDEX, ENCODER, PARSE_CACHE, INPUT_NODES, INPUT_RELATIONS, INPUT_KQI
     print("=" * 60)
     print("KG-Oversight - Transformation vers format Kuzu")
     print("=" * 60)
     
-    os.makedirs(os.path.join(OUTPUT_DIR, 'nodes'), exist_ok=True)
-    os.makedirs(os.path.join(OUTPUT_DIR, 'relations'), exist_ok=True)
+    inputs = resolve_inputs(args)
+    INPUT_NODES, INPUT_RELATIONS, INPUT_KQI = inputs['nodes'], inputs['relations'], inputs['kqi']
     
-    print("\n📦 Traitement des nœuds...")
-    process_nodes()
+    schema = load_schema()
+    check_node_specs(schema)
+    NODE_INDEX = None if args.no_integrity_check else NodeIndex(schema)
+    if args.cache:
+        PARSE_CACHE = ParseCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    if args.encode:
+        ENCODER = Encoder(schema)
+        schema = encoded_schema(schema)
     
-    print("\n🔗 Traitement des relations...")
-    process_relations()
+    if args.kuzu_db:
+        load_into_kuzu(args.kuzu_db, schema)
+        report_json_errors()
+        report_quarantine(kuzu_quarantine_dir(args.kuzu_db))
+        report_rejects(kuzu_rejects_dir(args.kuzu_db), args.max_rejets)
+        if ENCODER is not None:
+            ENCODER.write_mappings(os.path.normpath(args.kuzu_db) + f'.{ENCODING_DIR}')
+        print("\n" + "=" * 60)
+        print("✅ Chargement terminé !")
+        print(f"   Base Kuzu : {args.kuzu_db}")
+        print("=" * 60)
+        return
     
-    print("\n📊 Traitement des KQI...")
-    process_kqi()
+    if args.incremental:
+        run_incremental(args.workers, schema)
+    else:
+        run_all(args.workers, OUTPUT_DIR, args.format, schema)
+    report_json_errors()
+    report_quarantine(os.path.join(OUTPUT_DIR, 'quarantine'))
+    report_rejects(os.path.join(OUTPUT_DIR, 'rejets'), args.max_rejets)
+    if ENCODER is not None:
+        print("\n🔢 Tables de correspondance de l'encodage...")
+        ENCODER.write_mappings(os.path.join(OUTPUT_DIR, ENCODING_DIR))
     
     print("\n📝 Génération du script d'import...")
-    generate_import_script()
+    with stage('import_script'):
+        generate_import_script(schema, args.format, args.workers)
+        if ENCODER is not None:
+            generate_encoded_schema(schema)
     
     print("\n" + "=" * 60)
     print("✅ Transformation terminée !")
@@ -529,4 +3618,4 @@ def main():
     print("=" * 60)
 
 if __name__ == '__main__':
-    main()
+    main()
\ No newline at end of file